@@ -0,0 +1,115 @@
+"""Compare the projected AH page parser against full ``response.json()`` decoding.
+
+Usage: python benchmarks/ah_parse.py [page.json[.gz] ...]
+
+Without arguments, synthetic pages shaped like ``/v2/skyblock/auctions`` responses are generated.
+"""
+
+import gzip
+import json
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "calculator")]
+
+import main as calculator  # noqa: E402
+
+ITEM_NAMES = [f"Synthetic Item {i}" for i in range(2000)]
+
+
+def synthetic_page(page: int, total_pages: int, size: int = 1000) -> bytes:
+    rng = random.Random(page)
+    auctions = [
+        {
+            "uuid": uuid.UUID(int=rng.getrandbits(128)).hex,
+            "auctioneer": uuid.UUID(int=rng.getrandbits(128)).hex,
+            "profile_id": uuid.UUID(int=rng.getrandbits(128)).hex,
+            "coop": [uuid.UUID(int=rng.getrandbits(128)).hex],
+            "start": 1700000000000,
+            "end": 1700172800000,
+            "item_name": rng.choice(ITEM_NAMES),
+            "item_lore": "§7Some lore line\n" * 25,
+            "extra": "synthetic extra text " * 5,
+            "categories": ["misc"],
+            "tier": "RARE",
+            "starting_bid": rng.randint(1, 10_000_000),
+            "item_bytes": "H4sIAAAAAAAAA" + "x" * 600,
+            "claimed": False,
+            "claimed_bidders": [],
+            "highest_bid_amount": 0,
+            "last_updated": 1700000000000,
+            "bin": rng.random() < 0.8,
+            "bids": [],
+            "item_uuid": uuid.UUID(int=rng.getrandbits(128)).hex,
+        }
+        for _ in range(size)
+    ]
+    return json.dumps(
+        {
+            "success": True,
+            "page": page,
+            "totalPages": total_pages,
+            "totalAuctions": total_pages * size,
+            "lastUpdated": 1700000000000,
+            "auctions": auctions,
+        }
+    ).encode()
+
+
+def load_pages(paths: list[str]) -> list[bytes]:
+    if not paths:
+        return [synthetic_page(i, 100) for i in range(100)]
+    return [gzip.decompress(p.read_bytes()) if p.suffix == ".gz" else p.read_bytes() for p in map(Path, paths)]
+
+
+def legacy_sweep(pages: list[bytes]) -> dict[str, int]:
+    prices: dict[str, int] = {}
+    for content in pages:
+        page = json.loads(content.decode())
+        for auction in page.get("auctions", []):
+            if (
+                auction["bin"]
+                and prices.get(auction["item_name"], auction["starting_bid"] + 1) > auction["starting_bid"]
+            ):
+                prices[auction["item_name"]] = auction["starting_bid"]
+    return prices
+
+
+def projected_sweep(pages: list[bytes]) -> dict[str, int]:
+    prices: dict[str, int] = {}
+    for content in pages:
+        for _, item_name, price in calculator.parse_auction_page(content).auctions:
+            if prices.get(item_name, price + 1) > price:
+                prices[item_name] = price
+    return prices
+
+
+def measure(name: str, sweep, pages: list[bytes]) -> dict[str, int]:
+    start = time.perf_counter()
+    result = sweep(pages)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    sweep(pages)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<10} {elapsed:8.3f}s  peak {peak / 2**20:8.1f} MiB")
+    return result
+
+
+def main() -> None:
+    pages = load_pages(sys.argv[1:])
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / 2**20:.1f} MiB of JSON")
+    legacy = measure("legacy", legacy_sweep, pages)
+    projected = measure("projected", projected_sweep, pages)
+    assert legacy == projected, "parsers disagree on cheapest BINs"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Time Bazaar order book depth costing: building the depth curves on each Bazaar refresh, and costing every
+forge item at several batch sizes against a top-of-book-only calculation.
+
+Usage: python benchmarks/bazaar_depth.py [scale ...]
+
+Scale 1 is roughly today's market (130 forge items over 1500 Bazaar products with 30 levels per side);
+default scales are 1 10.
+"""
+
+import logging
+import random
+import sys
+import tempfile
+import time
+import typing
+from pathlib import Path
+
+import orjson
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "calculator")]
+
+import main as calculator  # noqa: E402
+import market_data  # noqa: E402
+from costing import DepthCurve  # noqa: E402
+
+from common.http_client import HttpClient  # noqa: E402
+from common.items import ItemRegistry, RegistryItem  # noqa: E402
+
+FORGE_ITEMS = 130
+BAZAAR_PRODUCTS = 1500
+BATCH_SIZES = (1, 4, 16, 64)
+LOOKUPS = 100_000
+
+
+def order_book(rng: random.Random, best: float, step: float) -> list[dict[str, typing.Any]]:
+    return [
+        {"amount": rng.randint(1, 2000), "pricePerUnit": best * step**level, "orders": rng.randint(1, 20)}
+        for level in range(30)
+    ]
+
+
+def synthetic_market(scale: int) -> tuple[dict[str, typing.Any], dict[str, typing.Any], ItemRegistry]:
+    """(forge catalog, Bazaar response, item registry); recipes take up to a few hundred of each material."""
+    rng = random.Random(scale)
+    products: dict[str, typing.Any] = {}
+    for i in range(BAZAAR_PRODUCTS * scale):
+        buy = rng.uniform(1, 20_000)
+        products[f"DEPTH_MATERIAL_{i}"] = {
+            "quick_status": {"buyPrice": buy, "sellPrice": buy * 0.95, "sellMovingWeek": rng.randint(0, 10**7)},
+            "buy_summary": order_book(rng, buy, 1.01),
+            "sell_summary": order_book(rng, buy * 0.95, 0.99),
+        }
+    materials = [f"Depth Material {i}" for i in range(BAZAAR_PRODUCTS * scale)]
+    # The first products are forge items too, so they also sell on the Bazaar
+    forge_items, raw_materials = materials[: FORGE_ITEMS * scale], materials[FORGE_ITEMS * scale :]
+    catalog = {
+        name: {
+            "Duration": rng.choice([0.5, 1, 8, 12, 24]),
+            "Recipe": {m: rng.choice([1, 4, 16, 64, 160, 320]) for m in rng.sample(raw_materials, 3)},
+            "Requirements": {},
+        }
+        for name in forge_items
+    }
+    registry = ItemRegistry(
+        1, [RegistryItem(i + 1, product, name) for i, (product, name) in enumerate(zip(products, materials))], {}
+    )
+    return catalog, {"success": True, "products": products}, registry
+
+
+def timed(fn: typing.Callable[[], typing.Any], repeat: int = 5) -> tuple[float, typing.Any]:
+    best, value = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def run(scale: int, directory: Path) -> None:
+    catalog, bazaar, registry = synthetic_market(scale)
+    ids = {item.name: item.id for item in registry.items()}
+    writer = market_data.FixtureWriter(directory, compresslevel=1)
+    bazaar_key = market_data.fixture_key("GET", calculator.MarketPriceTracker.BAZAAR_URL)
+    writer.write(bazaar_key, 200, {}, orjson.dumps(bazaar))
+    registry_key = market_data.fixture_key("GET", f"{calculator.DB_API_URL}/items")
+    writer.write(registry_key, 200, {}, orjson.dumps(registry.to_json()))
+    logger = logging.getLogger("bazaar-depth")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    print(f"x{scale}: {len(catalog)} forge items, {len(bazaar['products'])} Bazaar products")
+    market = calculator.MarketPriceTracker(logger, HttpClient(market_data.ReplaySession(directory)))
+    market.refresh_registry()
+    refresh, (prices, depth) = timed(market.fetch_bazaar_prices)
+    curves, _ = timed(
+        lambda: [
+            (DepthCurve.from_summary(p["buy_summary"], False), DepthCurve.from_summary(p["sell_summary"], True))
+            for p in bazaar["products"].values()
+        ]
+    )
+    print(f"  {'bazaar refresh':<28} {refresh * 1000:10.1f} ms")
+    print(f"  {'  of which depth curves':<28} {curves * 1000:10.1f} ms")
+
+    curve = next(iter(depth.values())).asks
+    rng = random.Random(0)
+    quantities = [rng.uniform(1, 60_000) for _ in range(LOOKUPS)]
+    lookups, _ = timed(lambda: [curve.average(q) for q in quantities], repeat=3)
+    print(f"  {'depth lookup':<28} {lookups / LOOKUPS * 1e9:10.0f} ns")
+
+    def costed(batch_size: int, book: dict[int, typing.Any]) -> tuple[float, dict[int, int]]:
+        profit_calculator = calculator.ProfitCalculator(logger, market.client, batch_size=batch_size)
+        profit_calculator.calculate_profits(catalog, ids, "benchmark", prices, book, {}, {}, {})  # Builds the graph
+        seconds, (_, samples, _) = timed(
+            lambda: profit_calculator.calculate_profits(catalog, ids, "benchmark", prices, book, {}, {}, {})
+        )
+        return seconds, {item: sample["Cost"] for item, sample in samples.items()}
+
+    top_seconds, top_costs = costed(1, {})
+    print(f"  {'top of book':<28} {top_seconds * 1000:10.1f} ms")
+    total = 0.0
+    for batch_size in BATCH_SIZES:
+        seconds, costs = costed(batch_size, depth)
+        total += seconds
+        increase = sum(costs.values()) / sum(top_costs[item] for item in costs) - 1
+        print(f"  {f'depth, batch {batch_size}':<28} {seconds * 1000:10.1f} ms   cost {increase * 100:+6.1f}%")
+    print(f"  {f'all {len(BATCH_SIZES)} batch sizes':<28} {total * 1000:10.1f} ms")
+
+
+def main() -> None:
+    scales = [int(arg) for arg in sys.argv[1:]] or [1, 10]
+    with tempfile.TemporaryDirectory() as work_dir:
+        for scale in scales:
+            run(scale, Path(work_dir) / f"x{scale}")
+
+
+if __name__ == "__main__":
+    main()
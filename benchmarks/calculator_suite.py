@@ -0,0 +1,235 @@
+"""Run the calculator's full cycle offline and report wall time, peak RSS and per-stage timings.
+
+Usage: python benchmarks/calculator_suite.py [--fixtures DIR] [--work-dir DIR] [--decode-processes N] [scale ...]
+
+Every scale replays synthetic fixtures through calculator.market_data.ReplaySession in a fresh process, so
+peak RSS is per scale. Scale 1 is roughly today's market (130 forge items, 60 AH pages of 1000 auctions, 1500
+Bazaar products); the default scales are 1 10 100. Fixtures are generated once per scale into the work
+directory and reused. With --fixtures, a directory recorded with MARKET_DATA_MODE=record is replayed instead.
+--decode-processes sets AH_DECODE_PROCESSES; the ah sweep stage then includes starting the pool.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import typing
+import uuid
+from pathlib import Path
+
+import orjson
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "calculator")]
+
+import main as calculator  # noqa: E402
+import market_data  # noqa: E402
+
+from common.http_client import HttpClient  # noqa: E402
+from common.items import ItemRegistry, RegistryItem  # noqa: E402
+
+FORGE_ITEMS = 130
+AH_PAGES = 60
+AUCTIONS_PER_PAGE = 1000
+BAZAAR_PRODUCTS = 1500
+AH_ONLY_ITEMS = 400
+ENDED_AUCTIONS = 1000
+
+STAGES = ("catalog", "ah sweep", "bazaar", "sales fetch", "profit loop", "publish")
+
+
+def bazaar_name(i: int) -> tuple[str, str]:
+    """Bazaar product ID and the item's display name."""
+    return f"SYNTH_MATERIAL_{i}", f"Synth Material {i}"
+
+
+def order_book(rng: random.Random, best: float, step: float) -> list[dict[str, typing.Any]]:
+    """The API's 30 best levels of one side, each level step times the previous price."""
+    return [
+        {"amount": rng.randint(1, 5000), "pricePerUnit": best * step**level, "orders": rng.randint(1, 20)}
+        for level in range(30)
+    ]
+
+
+def generate(directory: Path, scale: int) -> None:
+    rng = random.Random(scale)
+    writer = market_data.FixtureWriter(directory, compresslevel=1)
+
+    def put(url: str, body: typing.Any, params: dict[str, int] | None = None) -> None:
+        writer.write(market_data.fixture_key("GET", url, params), 200, {}, orjson.dumps(body))
+
+    materials = [bazaar_name(i)[1] for i in range(BAZAAR_PRODUCTS * scale)]
+    ah_items = [f"Synth Auction Item {i}" for i in range(AH_ONLY_ITEMS * scale)]
+    forge_items = [f"Synth Forge Item {i}" for i in range(FORGE_ITEMS * scale)]
+    # Bazaar products and AH items come from Hypixel's item list; forge items only have wiki names
+    listed = [bazaar_name(i) for i in range(BAZAAR_PRODUCTS * scale)]
+    listed += [(name.upper().replace(" ", "_"), name) for name in ah_items]
+    registry = ItemRegistry(
+        1,
+        [RegistryItem(i + 1, item_id, name) for i, (item_id, name) in enumerate(listed)]
+        + [RegistryItem(len(listed) + i + 1, None, name) for i, name in enumerate(forge_items)],
+        {},
+    )
+    ids = {item.name: item.id for item in registry.items()}
+    put(f"{calculator.DB_API_URL}/items", registry.to_json())
+    catalog = {
+        name: {
+            "Duration": rng.choice([0.5, 1, 8, 12, 24]),
+            "Recipe": {m: rng.randint(1, 16) for m in rng.sample(materials[:200] + ah_items[:50] + forge_items[:i], 3)},
+            "Requirements": {"Heart of the Mountain Tier": rng.randint(1, 10)},
+        }
+        for i, name in enumerate(forge_items)
+    }
+    put(
+        f"{calculator.DB_API_URL}/forge-items",
+        {"items": catalog, "ids": ids, "version": 1, "content_hash": f"synthetic-{scale}", "registry_version": 1},
+    )
+
+    products = {}
+    for i in range(BAZAAR_PRODUCTS * scale):
+        buy = rng.uniform(1, 20_000)
+        products[bazaar_name(i)[0]] = {
+            "quick_status": {"buyPrice": buy, "sellPrice": buy * 0.95, "sellMovingWeek": rng.randint(0, 10**7)},
+            "buy_summary": order_book(rng, buy, 1.01),
+            "sell_summary": order_book(rng, buy * 0.95, 0.99),
+        }
+    put(calculator.MarketPriceTracker.BAZAAR_URL, {"success": True, "products": products})
+
+    # Forge items are sold on the AH, alongside AH-only materials; listings scatter around a per-item price
+    names = forge_items + ah_items
+    base_price = {name: rng.uniform(1e6, 3e7) for name in forge_items}
+    base_price |= {name: rng.uniform(1e3, 1e5) for name in ah_items}
+    pages = AH_PAGES * scale
+    sold: list[str] = []
+    for page in range(pages):
+        auctions = []
+        for _ in range(AUCTIONS_PER_PAGE):
+            auction_id = uuid.UUID(int=rng.getrandbits(128)).hex
+            item_name = rng.choice(names)
+            if len(sold) < ENDED_AUCTIONS and rng.random() < 0.01:
+                sold.append(auction_id)
+            auctions.append(
+                {
+                    "uuid": auction_id,
+                    "auctioneer": uuid.UUID(int=rng.getrandbits(128)).hex,
+                    "item_name": item_name,
+                    "item_lore": "§7Synthetic lore line\n" * 8,
+                    "tier": "RARE",
+                    "starting_bid": int(base_price[item_name] * rng.uniform(0.8, 2)),
+                    "item_bytes": "H4sIAAAAAAAAA" + "x" * 300,
+                    "bin": rng.random() < 0.8,
+                    "bids": [],
+                }
+            )
+        page_body = {
+            "success": True,
+            "page": page,
+            "totalPages": pages,
+            "totalAuctions": pages * AUCTIONS_PER_PAGE,
+            "lastUpdated": 1700000000000,
+            "auctions": auctions,
+        }
+        put(calculator.MarketPriceTracker.AUCTION_HOUSE_URL, page_body, {"page": page})
+
+    ended = [{"auction_id": auction_id, "buyer": "someone", "bin": True} for auction_id in sold]
+    put(calculator.AHSalesTracker.ENDED_URL, {"success": True, "auctions": ended})
+    put(f"{calculator.DB_API_URL}/ah-sales", {"sales": {str(ids[name]): rng.randint(0, 500) for name in forge_items}})
+    put(f"{calculator.DB_API_URL}/ah-sales/oldest", {"oldest_recorded_at": "2024-01-01T00:00:00+00:00"})
+
+
+def run_cycle(directory: str, decode_processes: int, results: typing.Any) -> None:
+    """One full calculator cycle against the replayed fixtures, in its own process."""
+    logger = logging.getLogger("calculator-suite")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    session = market_data.ReplaySession(directory)
+    profit_calculator = calculator.ProfitCalculator(logger, HttpClient(session), ah_decode_processes=decode_processes)
+    market = profit_calculator.market
+    timings: dict[str, float] = {}
+
+    def stage(name: str, fn: typing.Callable[[], typing.Any]) -> typing.Any:
+        start = time.perf_counter()
+        value = fn()
+        timings[name] = time.perf_counter() - start
+        return value
+
+    wall_start = time.perf_counter()
+    catalog = stage(
+        "catalog",
+        lambda: (market.refresh_registry(), session.get(f"{calculator.DB_API_URL}/forge-items").json())[1],
+    )
+    ah_prices = stage("ah sweep", market.fetch_auction_house_prices)
+    bazaar_prices, bazaar_depth = stage("bazaar", market.fetch_bazaar_prices)
+    sales_tracker = calculator.AHSalesTracker(logger, market)
+    ah_weekly_sales, ah_volume_estimated = stage(
+        "sales fetch", lambda: (sales_tracker._poll_once(), profit_calculator.fetch_ah_weekly_sales())[1]
+    )
+    profits, _, uptime_seconds = stage(
+        "profit loop",
+        lambda: profit_calculator.calculate_profits(
+            catalog["items"],
+            catalog["ids"],
+            "benchmark",
+            bazaar_prices,
+            bazaar_depth,
+            ah_prices,
+            ah_weekly_sales,
+            ah_volume_estimated,
+        ),
+    )
+    stage(
+        "publish",
+        lambda: session.post(
+            f"{calculator.WEB_URL}/results",
+            data=orjson.dumps({"profits": profits, "calculated_at": "", "uptime_seconds": uptime_seconds}),
+        ),
+    )
+    wall = time.perf_counter() - wall_start
+    peak_rss_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put({"wall": wall, "peak_rss_mib": peak_rss_kib / 1024, "timings": timings, "items": len(profits)})
+
+
+def report(label: str, directory: Path, decode_processes: int) -> None:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_cycle, args=(str(directory), decode_processes, results))
+    process.start()
+    result = results.get()
+    process.join()
+    print(f"{label}: {result['items']} profitable items")
+    for name in STAGES:
+        print(f"  {name:<14} {result['timings'][name] * 1000:10.1f} ms")
+    print(f"  {'wall':<14} {result['wall'] * 1000:10.1f} ms")
+    print(f"  {'peak RSS':<14} {result['peak_rss_mib']:10.1f} MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scales", nargs="*", type=int, default=[1, 10, 100])
+    parser.add_argument("--fixtures", type=Path, help="replay a recorded fixture directory instead")
+    parser.add_argument("--work-dir", type=Path, default=Path(tempfile.gettempdir()) / "skyforge-calculator-suite")
+    parser.add_argument("--decode-processes", type=int, default=0, help="decode AH pages in this many processes")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        report(f"recording {args.fixtures}", args.fixtures, args.decode_processes)
+        return
+    for scale in args.scales:
+        directory = args.work_dir / f"x{scale}"
+        if not directory.exists():
+            start = time.perf_counter()
+            partial = directory.with_name(f"{directory.name}.partial")
+            shutil.rmtree(partial, ignore_errors=True)
+            generate(partial, scale)
+            partial.rename(directory)
+            print(f"Generated x{scale} fixtures in {time.perf_counter() - start:.1f}s")
+        report(f"x{scale}", directory, args.decode_processes)
+
+
+if __name__ == "__main__":
+    main()
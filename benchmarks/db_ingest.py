@@ -0,0 +1,208 @@
+"""Time forge catalog and AH sale batch ingestion, row-by-row inserts into name-keyed tables against the bulk
+write path keyed by item id, and the 7-day sales read over raw per-poll batches against the hourly buckets.
+
+Usage: python benchmarks/db_ingest.py [scale ...]
+
+Needs a reachable PostgreSQL, configured with the same POSTGRES_* variables as db-api (e.g. the compose
+database with its port published). Everything runs inside a scratch schema that is dropped afterwards.
+Scales are multiples of today's catalog (~130 items) and sale batch (~60 items); default 1 10 100.
+"""
+
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "db-api")]
+
+import db  # noqa: E402
+import psycopg2.extensions  # noqa: E402
+
+from common.types import ForgeItemInfo  # noqa: E402
+
+CATALOG_ITEMS = 130
+SALE_BATCH_ITEMS = 60
+REQUIREMENTS = ["Heart of the Mountain Tier", "Gemstone Collection", "Tungsten Collection", "Umber Collection"]
+
+
+def synthetic_catalog(size: int) -> dict[str, ForgeItemInfo]:
+    rng = random.Random(size)
+    names = [f"Synthetic Item {i}" for i in range(size)]
+    materials = [f"Synthetic Material {i}" for i in range(max(50, size // 2))]
+    return {
+        name: ForgeItemInfo(
+            {
+                "Duration": rng.choice([0.5, 1, 8, 12, 24, 36]),
+                "Recipe": {m: rng.randint(1, 64) for m in rng.sample(materials + names[:i], rng.randint(2, 5))},
+                "Requirements": {r: rng.randint(1, 10) for r in rng.sample(REQUIREMENTS, rng.randint(0, 2))},
+            }
+        )
+        for i, name in enumerate(names)
+    }
+
+
+# The catalog and sale tables as they were before the item registry, keyed by name
+LEGACY_SCHEMA = """
+    CREATE TABLE named_forge_items (
+        name           TEXT PRIMARY KEY,
+        duration_hours REAL NOT NULL
+    );
+    CREATE TABLE named_forge_recipes (
+        item_name TEXT NOT NULL REFERENCES named_forge_items(name) ON DELETE CASCADE,
+        material  TEXT NOT NULL,
+        quantity  INTEGER NOT NULL,
+        PRIMARY KEY (item_name, material)
+    );
+    CREATE TABLE named_forge_requirements (
+        item_name   TEXT NOT NULL REFERENCES named_forge_items(name) ON DELETE CASCADE,
+        requirement TEXT NOT NULL,
+        level       INTEGER NOT NULL,
+        PRIMARY KEY (item_name, requirement)
+    );
+    CREATE TABLE ah_sale_batches (
+        id          SERIAL PRIMARY KEY,
+        item_name   TEXT NOT NULL,
+        quantity    INT  NOT NULL,
+        recorded_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    CREATE INDEX idx_ah_sale_batches_lookup ON ah_sale_batches (item_name, recorded_at);
+"""
+
+
+def legacy_upsert_forge_items(conn: psycopg2.extensions.connection, items: dict[str, ForgeItemInfo]) -> None:
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM named_forge_items")
+        for name, info in items.items():
+            cur.execute(
+                "INSERT INTO named_forge_items (name, duration_hours) VALUES (%s, %s)", (name, info["Duration"])
+            )
+            for material, quantity in info["Recipe"].items():
+                cur.execute(
+                    "INSERT INTO named_forge_recipes (item_name, material, quantity) VALUES (%s, %s, %s)",
+                    (name, material, quantity),
+                )
+            for requirement, level in info["Requirements"].items():
+                cur.execute(
+                    "INSERT INTO named_forge_requirements (item_name, requirement, level) VALUES (%s, %s, %s)",
+                    (name, requirement, level),
+                )
+    conn.commit()
+
+
+def legacy_insert_ah_sale_batch(conn: psycopg2.extensions.connection, sales: dict[str, int]) -> None:
+    with conn.cursor() as cur:
+        for item_name, quantity in sales.items():
+            cur.execute(
+                """
+                INSERT INTO ah_sale_batches (item_name, quantity)
+                SELECT %s, %s WHERE EXISTS (SELECT 1 FROM named_forge_items WHERE name = %s)
+                """,
+                (item_name, quantity, item_name),
+            )
+        cur.execute("DELETE FROM ah_sale_batches WHERE recorded_at < NOW() - INTERVAL '8 days'")
+    conn.commit()
+
+
+def legacy_read_ah_weekly_sales(conn: psycopg2.extensions.connection) -> dict[str, int]:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT item_name, SUM(quantity) FROM ah_sale_batches
+            WHERE recorded_at > NOW() - INTERVAL '7 days'
+            GROUP BY item_name
+        """)
+        result = dict(cur.fetchall())
+    conn.rollback()
+    return result
+
+
+def fill_week_of_sales(conn: psycopg2.extensions.connection, ids: dict[str, int]) -> None:
+    """A week of one-minute sale batches of the items in ids, in both the raw batch table and the hourly buckets."""
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE ah_sale_batches, ah_sales_hourly")
+        cur.execute(
+            """
+            INSERT INTO ah_sale_batches (item_name, quantity, recorded_at)
+            SELECT name, 1 + (random() * 5)::INT, at
+            FROM unnest(%s::TEXT[]) AS name,
+                generate_series(NOW() - INTERVAL '7 days', NOW(), INTERVAL '1 minute') AS at
+            """,
+            (list(ids),),
+        )
+        cur.execute(
+            """
+            INSERT INTO ah_sales_hourly (item, bucket, quantity, first_recorded_at)
+            SELECT ids.item, date_trunc('hour', recorded_at), SUM(quantity), MIN(recorded_at)
+            FROM ah_sale_batches JOIN unnest(%s::TEXT[], %s::INT[]) AS ids (name, item) ON ids.name = item_name
+            GROUP BY ids.item, date_trunc('hour', recorded_at)
+            """,
+            (list(ids), list(ids.values())),
+        )
+        cur.execute("ANALYZE ah_sale_batches")
+        cur.execute("ANALYZE ah_sales_hourly")
+    conn.commit()
+
+
+def timed(label: str, fn, *args, repeat: int = 3) -> float:  # type: ignore[no-untyped-def]
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<28} {best * 1000:10.1f} ms")
+    return best
+
+
+def main() -> None:
+    scales = [int(arg) for arg in sys.argv[1:]] or [1, 10, 100]
+    conn = db.wait_for_db(retries=1)
+    schema = f"bench_{uuid.uuid4().hex[:8]}"
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA {schema}")
+            cur.execute(f"SET search_path TO {schema}")
+        db.init_schema(conn)
+        with conn.cursor() as cur:
+            cur.execute(LEGACY_SCHEMA)
+        conn.commit()
+
+        for scale in scales:
+            catalog = synthetic_catalog(CATALOG_ITEMS * scale)
+            rows = sum(1 + len(info["Recipe"]) + len(info["Requirements"]) for info in catalog.values())
+            print(f"catalog x{scale}: {len(catalog)} items, {rows} rows")
+            legacy = timed("row-by-row upsert", legacy_upsert_forge_items, conn, catalog)
+            bulk = timed("bulk upsert", db.upsert_forge_items, conn, catalog)
+            print(f"  {'speedup':<28} {legacy / bulk:10.1f} x")
+
+            names = list(catalog)
+            _, ids, _ = db.read_forge_items(conn)
+            rng = random.Random(scale)
+            # A quarter of the batch is not in the catalog and must be filtered out
+            sales = {name: rng.randint(1, 20) for name in rng.sample(names, min(len(names), SALE_BATCH_ITEMS * scale))}
+            unknown = range(len(sales) // 3)
+            sales_by_id = {ids[name]: quantity for name, quantity in sales.items()}
+            sales.update({f"Unknown Item {i}": 1 for i in unknown})
+            sales_by_id.update({-1 - i: 1 for i in unknown})
+            print(f"sale batch x{scale}: {len(sales)} items")
+            legacy = timed("row-by-row sale batch", legacy_insert_ah_sale_batch, conn, sales)
+            bulk = timed("bulk sale batch", db.insert_ah_sale_batch, conn, sales_by_id)
+            print(f"  {'speedup':<28} {legacy / bulk:10.1f} x")
+
+        names = list(synthetic_catalog(CATALOG_ITEMS))[:SALE_BATCH_ITEMS]
+        _, ids, _ = db.read_forge_items(conn)
+        fill_week_of_sales(conn, {name: ids[name] for name in names})
+        print(f"weekly sales read: {len(names)} items, one batch per minute for 7 days")
+        legacy = timed("raw batch scan", legacy_read_ah_weekly_sales, conn)
+        bulk = timed("hourly buckets", db.read_ah_weekly_sales, conn)
+        print(f"  {'speedup':<28} {legacy / bulk:10.1f} x")
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
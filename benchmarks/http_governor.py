@@ -0,0 +1,95 @@
+"""Measure how long an ended-auctions poll waits behind a running AH sweep under the shared Hypixel rate limit,
+with request priorities against plain first-come order, and the client's overhead per request.
+
+Usage: python benchmarks/http_governor.py [rate [pages]]
+
+A local server stands in for the Hypixel API. Sweeps use the calculator's 16 fetch workers; default rate 20
+requests per second with a burst of 20, and 120 pages.
+"""
+
+import http.server
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT)]
+
+from common.http_client import HttpClient, Priority, TokenBucket  # noqa: E402
+
+WORKERS = 16
+POLLS = 5
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+def sweep_with_polls(base_url: str, rate: float, pages: int, prioritized: bool) -> list[float]:
+    """Seconds each sales poll took while a sweep of pages was running."""
+    client = HttpClient(pool_size=WORKERS)
+    client.govern(base_url, TokenBucket(rate, rate))
+    page_priority = Priority.BULK if prioritized else Priority.NORMAL
+    poll_priority = Priority.INTERACTIVE if prioritized else Priority.NORMAL
+    waits: list[float] = []
+
+    def poll() -> None:
+        for _ in range(POLLS):
+            time.sleep(pages / rate / (POLLS + 1))
+            start = time.perf_counter()
+            client.get(f"{base_url}/v2/skyblock/auctions_ended", priority=poll_priority)
+            waits.append(time.perf_counter() - start)
+
+    def fetch_page(page: int) -> None:
+        client.get(f"{base_url}/v2/skyblock/auctions", params={"page": page}, priority=page_priority)
+
+    poller = threading.Thread(target=poll)
+    with ThreadPoolExecutor(WORKERS) as executor:
+        poller.start()
+        list(executor.map(fetch_page, range(pages)))
+    poller.join()
+    return waits
+
+
+def main() -> None:
+    rate = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    client = HttpClient()
+    for _ in range(100):
+        client.get(base_url)  # Warm the connection
+    start = time.perf_counter()
+    for _ in range(1000):
+        client.get(base_url)
+    print(f"{'request through client':<28} {(time.perf_counter() - start) * 1000:10.1f} us")
+    session = client.session
+    start = time.perf_counter()
+    for _ in range(1000):
+        session.get(base_url)
+    print(f"{'request through session':<28} {(time.perf_counter() - start) * 1000:10.1f} us")
+
+    print(f"sweep of {pages} pages at {rate:g} requests/s, {POLLS} sales polls during it")
+    for label, prioritized in (("first come", False), ("prioritized", True)):
+        waits = sweep_with_polls(base_url, rate, pages, prioritized)
+        print(f"  {label:<26} mean {statistics.mean(waits) * 1000:8.1f} ms   max {max(waits) * 1000:8.1f} ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Check the crawl's item page parser on saved wiki pages and time it.
+
+Usage: python benchmarks/item_pages.py [page.html ...]
+
+Without arguments, benchmarks/fixtures/item_page.html is used. It is a Refined Mithril page written by hand in the
+markup MediaWiki renders: an infobox table, and section headings whose text sits in mw-headline and edit-section spans.
+Its Forge page summary is given a stale recipe, so the crawl's merge must replace it with the page's own.
+"""
+
+import hashlib
+import logging
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "scraper")]
+
+import main as scraper  # noqa: E402
+from crawler import CachedPage, article_body  # noqa: E402
+
+FIXTURE = Path(__file__).resolve().parent / "fixtures" / "item_page.html"
+FIXTURE_PATH = "/Refined_Mithril"
+STALE_SUMMARY: scraper.ForgePageItem = {
+    "Name & Rarity": "Refined Mithril",
+    "Duration": "6 hours",
+    "Recipe Tree": ["150  Enchanted Mithril"],
+    "Requirements": "Heart of the Mountain Tier 2",
+    "Page": FIXTURE_PATH,
+}
+
+
+class SavedPages:
+    """Stands in for WikiCrawler, answering every crawl with the saved pages."""
+
+    def __init__(self, pages: dict[str, bytes]) -> None:
+        self._pages = {
+            url: CachedPage(url, article, hashlib.sha256(article).hexdigest(), None, None)
+            for url, article in pages.items()
+        }
+
+    def crawl(self, urls):
+        return {url: self._pages[url] for url in urls if url in self._pages}
+
+
+def main() -> None:
+    logger = logging.getLogger("item_pages")
+    paths = [Path(path) for path in sys.argv[1:]] or [FIXTURE]
+    articles = [article_body(path.read_bytes()) for path in paths]
+    parser = scraper.ForgeWikiParser(logger)
+
+    start = time.perf_counter()
+    parsed = [parser._parse_item_page(article) for article in articles]
+    elapsed = time.perf_counter() - start
+    for path, info in zip(paths, parsed):
+        print(f"{path.name}: {info}")
+    print(f"{len(articles)} pages parsed in {elapsed * 1000:.1f} ms")
+
+    if not sys.argv[1:]:
+        url = scraper.ForgeWikiParser.FORGE_URL.rsplit("/", 1)[0] + FIXTURE_PATH
+        parser = scraper.ForgeWikiParser(logger, SavedPages({url: articles[0]}))  # type: ignore[arg-type]
+        parser._summary = [STALE_SUMMARY]
+        forge_info = {"Refined Mithril": {"Duration": 6.0, "Recipe": {"Enchanted Mithril": 150}, "Requirements": {}}}
+        parser._merge_item_pages(parser._crawler, forge_info)  # type: ignore[arg-type]
+        print(f"Forge page recipe {{'Enchanted Mithril': 150}}, after the crawl {forge_info['Refined Mithril']}")
+        assert forge_info["Refined Mithril"]["Recipe"] == {"Enchanted Mithril": 160}, "the item page did not refine"
+        assert parser.item_ids == {"Refined Mithril": "REFINED_MITHRIL"}
+
+
+if __name__ == "__main__":
+    main()
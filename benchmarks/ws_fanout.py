@@ -0,0 +1,170 @@
+"""Load test for the web service's WebSocket fan-out.
+
+Usage: python benchmarks/ws_fanout.py [--clients 2000] [--slow 50] [--rounds 10]
+
+Starts the web app in a child process, connects simulated browsers (plus some that never read), posts results and
+reports how long /results takes to return and the p50/p99 delay until every reading client has the update.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import uvicorn
+import websockets
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "web")]
+os.chdir(tempfile.mkdtemp())
+os.mkdir("static")
+
+import main as web  # noqa: E402
+
+web.logger.setLevel(logging.WARNING)
+
+PORT = 8765
+sent_at: dict[int, float] = {}
+latencies: dict[int, list[float]] = {}
+remaining: dict[int, int] = {}
+delivered: dict[int, asyncio.Event] = {}
+
+
+def make_rows(count: int = 150) -> list[dict]:
+    return [
+        {
+            "Rank": 0,
+            "Name": f"Item {i}",
+            "Cost": 5000 + i,
+            "Sell Value": 10_000_000,
+            "Profit": 1000 + i,
+            "Duration": 12.0,
+            "Chained Duration": 12.0,
+            "Profit per Hour": 100 + i,
+            "Weekly Volume": 1000,
+            "Volume Estimated": False,
+            "Selling Market": "Bazaar",
+            "Recipe Markets": {"Material A": "Bazaar", "Material B": "AH"},
+            "Recipe": {"Material A": 160, "Material B": 2},
+            "Requirements": {"Heart of the Mountain Tier": 4},
+        }
+        for i in range(count)
+    ]
+
+
+def results(rows: list[dict], rng: random.Random, changes: int = 10) -> bytes:
+    """Move a handful of rows, as a typical price refresh does, and encode the payload."""
+    for row in rng.sample(rows, changes):
+        row["Cost"] = rng.randint(1000, 10_000_000)
+        row["Profit per Hour"] = rng.randint(100, 400)
+    rows.sort(key=lambda row: row["Profit per Hour"], reverse=True)
+    for rank, row in enumerate(rows, 1):
+        row["Rank"] = rank
+    return json.dumps({"profits": rows, "calculated_at": "2026-01-01T00:00:00+00:00"}).encode()
+
+
+async def reader(ready: asyncio.Event, connected: list[int]) -> None:
+    async with websockets.connect(f"ws://127.0.0.1:{PORT}/ws", max_size=None) as ws:
+        connected[0] += 1
+        if connected[0] == connected[1]:
+            ready.set()
+        async for raw in ws:
+            data = json.loads(raw)
+            version = data.get("version")
+            if version in sent_at:
+                latencies[version].append(time.perf_counter() - sent_at[version])
+                remaining[version] -= 1
+                if remaining[version] == 0:
+                    delivered[version].set()
+            if version is not None:
+                await ws.send(json.dumps({"type": "ack", "version": version}))
+
+
+async def stalled() -> None:
+    ws = await websockets.connect(f"ws://127.0.0.1:{PORT}/ws", max_size=None, max_queue=1)
+    ws.transport.pause_reading()  # Never reads again, like a frozen browser tab
+    await asyncio.Event().wait()
+
+
+def post(body: bytes) -> None:
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{PORT}/results", body, {"Content-Type": "application/json"}, method="POST"
+    )
+    urllib.request.urlopen(request).read()
+
+
+def percentile(values: list[float], q: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(q * len(values)))]
+
+
+def serve() -> None:
+    uvicorn.run(web.app, host="127.0.0.1", port=PORT, log_level="warning")
+
+
+async def run(clients: int, slow: int, rounds: int) -> None:
+    server = multiprocessing.Process(target=serve, daemon=True)
+    server.start()
+    while True:
+        try:
+            await asyncio.to_thread(urllib.request.urlopen, f"http://127.0.0.1:{PORT}/docs")
+            break
+        except OSError:
+            await asyncio.sleep(0.1)
+
+    ready = asyncio.Event()
+    connected = [0, clients]
+    tasks = [asyncio.create_task(stalled()) for _ in range(slow)]
+    for batch in range(0, clients, 200):
+        tasks += [asyncio.create_task(reader(ready, connected)) for _ in range(min(200, clients - batch))]
+        await asyncio.sleep(0.2)
+    await ready.wait()
+    print(f"{clients} reading clients and {slow} stalled clients connected")
+
+    rng = random.Random(0)
+    rows = make_rows()
+    post_times: list[float] = []
+    for round_no in range(rounds):
+        body = results(rows, rng)
+        version = round_no + 1
+        latencies[version], remaining[version], delivered[version] = [], clients, asyncio.Event()
+        sent_at[version] = start = time.perf_counter()
+        await asyncio.to_thread(post, body)
+        post_times.append(time.perf_counter() - start)
+        await asyncio.wait_for(delivered[version].wait(), 60)
+        values = latencies[version]
+        print(
+            f"v{version}: POST {post_times[-1] * 1000:7.1f}ms  "
+            f"p50 {percentile(values, 0.5) * 1000:7.1f}ms  p99 {percentile(values, 0.99) * 1000:7.1f}ms"
+        )
+        await asyncio.sleep(0.5)
+
+    all_values = [value for version in latencies for value in latencies[version]]
+    print(
+        f"overall: POST median {statistics.median(post_times) * 1000:.1f}ms  "
+        f"delivery p50 {percentile(all_values, 0.5) * 1000:.1f}ms  p99 {percentile(all_values, 0.99) * 1000:.1f}ms"
+    )
+    for task in tasks:
+        task.cancel()
+    server.terminate()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--slow", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.slow, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import bisect
+import itertools
+import logging
+import typing
+
+import numpy as np
+
+from common.types import ForgeItemInfo
+
+
+class DepthCurve(typing.NamedTuple):
+    """One side of a Bazaar order book as cumulative sums, best price first, so filling any quantity is a
+    binary search over its price levels.
+    """
+
+    amounts: tuple[int, ...]  # Units available up to and including each level
+    costs: tuple[float, ...]  # Coins for those units
+    prices: tuple[float, ...]  # Unit price at each level
+
+    @classmethod
+    def from_summary(cls, summary: list[dict[str, typing.Any]], descending: bool) -> "DepthCurve | None":
+        """Curve from an API order summary; descending puts the highest price first, for buy orders."""
+        levels = sorted(
+            ((level["pricePerUnit"], level["amount"]) for level in summary if level["amount"] > 0),
+            reverse=descending,
+        )
+        if not levels:
+            return None
+        prices = tuple(price for price, _ in levels)
+        return cls(
+            tuple(itertools.accumulate(amount for _, amount in levels)),
+            tuple(itertools.accumulate(price * amount for price, amount in levels)),
+            prices,
+        )
+
+    def total(self, quantity: float) -> float:
+        """Coins to fill quantity units. The API lists only the best levels, so anything deeper is assumed to
+        fill at the worst listed price.
+        """
+        level = bisect.bisect_left(self.amounts, quantity)
+        if level == len(self.amounts):
+            return self.costs[-1] + (quantity - self.amounts[-1]) * self.prices[-1]
+        if level == 0:
+            return quantity * self.prices[0]
+        return self.costs[level - 1] + (quantity - self.amounts[level - 1]) * self.prices[level]
+
+    def average(self, quantity: float) -> float:
+        return self.total(quantity) / quantity
+
+
+class MarketDepth(typing.NamedTuple):
+    asks: DepthCurve | None  # Sell offers, walked by insta-buys
+    bids: DepthCurve | None  # Buy orders, walked by insta-sells
+
+
+class PricingResult(typing.NamedTuple):
+    cost: np.ndarray  # (items, scenarios) cheapest ingredient cost, inf if some ingredient is unobtainable
+    duration: np.ndarray  # (items, scenarios) hours along the chosen path, forged intermediates in parallel slots
+    forged: np.ndarray  # (edges, scenarios) True where a recipe edge forges its material instead of buying it
+
+
+class RecipeGraph:
+    """Forge recipes compiled into a sparse item x material quantity matrix, ordered by recipe depth.
+    Built once per forge-data version; pricing every item under any number of price scenarios is then a
+    handful of vectorized passes, one per recipe depth.
+
+    Nodes are every item and raw material; the first len(items) nodes are the forge items, in evaluation order.
+    node_ids holds each node's item registry id, which market prices are keyed by.
+    """
+
+    def __init__(
+        self, forge_info: dict[str, ForgeItemInfo], item_ids: dict[str, int], version: str, logger: logging.Logger
+    ) -> None:
+        self.version = version
+        self._forge_info = forge_info
+        self._logger = logger
+
+        # Depth-first topological sort; depth = 1 + deepest forgeable material, so sorting by depth stays topological
+        self._forged_materials: dict[str, list[str]] = {}
+        self._depth: dict[str, int] = {}
+        visiting: set[str] = set()
+        for item_name in forge_info:
+            self._visit(item_name, visiting)
+        self.items: list[str] = sorted(self._forged_materials, key=self._depth.__getitem__)
+
+        self.nodes: list[str] = list(self.items)
+        self._index = index = {name: i for i, name in enumerate(self.nodes)}
+        rows: list[int] = []
+        materials: list[int] = []
+        quantities: list[int] = []
+        forged: list[bool] = []
+        for row, item_name in enumerate(self.items):
+            for material, quantity in forge_info[item_name]["Recipe"].items():
+                if material not in index:
+                    index[material] = len(self.nodes)
+                    self.nodes.append(material)
+                rows.append(row)
+                materials.append(index[material])
+                quantities.append(quantity)
+                forged.append(material in self._forged_materials[item_name])
+
+        self.node_ids: list[int] = [item_ids.get(name, -1) for name in self.nodes]  # -1 for unregistered names
+
+        # Recipe edges, grouped by item in evaluation order
+        self._edge_rows = np.array(rows, dtype=np.intp)
+        self.edge_materials = np.array(materials, dtype=np.intp)
+        self.edge_quantities = np.array(quantities, dtype=np.float64)
+        self._edge_forged = np.array(forged, dtype=bool)
+        self._durations = np.array([forge_info[name]["Duration"] for name in self.items], dtype=np.float64)
+
+        # Contiguous (row_start, row_end, edge_start, edge_end) ranges per recipe depth
+        self._levels: list[tuple[int, int, int, int]] = []
+        row_start = edge_start = 0
+        while row_start < len(self.items):
+            depth = self._depth[self.items[row_start]]
+            row_end = row_start
+            while row_end < len(self.items) and self._depth[self.items[row_end]] == depth:
+                row_end += 1
+            edge_end = int(np.searchsorted(self._edge_rows, row_end))
+            self._levels.append((row_start, row_end, edge_start, edge_end))
+            row_start, edge_start = row_end, edge_end
+
+    def _visit(self, item_name: str, visiting: set[str]) -> None:
+        if item_name in self._forged_materials:
+            return
+        visiting.add(item_name)
+        forged: list[str] = []
+        for material in self._forge_info[item_name]["Recipe"]:
+            if material not in self._forge_info:
+                continue
+            if material in visiting:
+                self._logger.warning(f"Recipe cycle between {item_name} and {material}, treating it as bought.")
+                continue
+            self._visit(material, visiting)
+            forged.append(material)
+        visiting.discard(item_name)
+        self._forged_materials[item_name] = forged
+        self._depth[item_name] = 1 + max((self._depth[material] for material in forged), default=-1)
+
+    def evaluate(self, buy: np.ndarray, edge_buy: np.ndarray | None = None) -> PricingResult:
+        """Cost every item under each price scenario, forging intermediates whenever that is cheaper.
+        buy is a (nodes, scenarios) array of unit buy prices, with inf where a node cannot be bought.
+        edge_buy optionally overrides the unit price each recipe edge buys its material at, as an
+        (edges, scenarios) array, for prices that depend on the quantity bought.
+        """
+        scenarios = buy.shape[1]
+        forge_cost = np.full((len(self.nodes), scenarios), np.inf)  # Unit cost of forging, inf for raw materials
+        cost = np.zeros((len(self.items), scenarios))
+        duration = np.zeros((len(self.nodes), scenarios))
+        forged = np.zeros((len(self.edge_materials), scenarios), dtype=bool)
+
+        for row_start, row_end, edge_start, edge_end in self._levels:
+            rows = self._edge_rows[edge_start:edge_end] - row_start
+            materials = self.edge_materials[edge_start:edge_end]
+            edge_forged = self._edge_forged[edge_start:edge_end, None]
+
+            bought = buy[materials] if edge_buy is None else edge_buy[edge_start:edge_end]
+            forge = np.where(edge_forged, forge_cost[materials], np.inf)
+            uses_forge = forge < bought
+            prices = np.where(uses_forge, forge, bought)
+            level_cost = np.zeros((row_end - row_start, scenarios))
+            np.add.at(level_cost, rows, self.edge_quantities[edge_start:edge_end, None] * prices)
+
+            chained = np.where(uses_forge, duration[materials], 0.0)
+            level_duration = np.zeros_like(level_cost)
+            np.maximum.at(level_duration, rows, chained)
+
+            cost[row_start:row_end] = level_cost
+            duration[row_start:row_end] = self._durations[row_start:row_end, None] + level_duration
+            forged[edge_start:edge_end] = uses_forge
+            forge_cost[row_start:row_end] = level_cost
+
+        return PricingResult(cost, duration[: len(self.items)], forged)
+
+    def path(self, forged: np.ndarray, markets: list[str]) -> tuple[list[dict[str, str]], list[dict[str, int]]]:
+        """Recipe markets and merged requirements per item for one scenario's per-edge forge choices, the same
+        ones its cost was built from. markets holds the market each node would be bought from.
+        """
+        item_markets: list[dict[str, str]] = []
+        item_requirements: list[dict[str, int]] = []
+        edge = 0  # Edges are laid out item by item in recipe order, as they are walked here
+        for item_name in self.items:
+            info = self._forge_info[item_name]
+            recipe_markets: dict[str, str] = {}
+            requirements = dict(info["Requirements"])
+            for material in info["Recipe"]:
+                node = self._index[material]
+                uses_forge = forged[edge]
+                edge += 1
+                if uses_forge:
+                    recipe_markets[material] = "Forge"
+                    for requirement, level in item_requirements[node].items():
+                        requirements[requirement] = max(requirements.get(requirement, 0), level)
+                else:
+                    recipe_markets[material] = markets[node]
+            item_markets.append(recipe_markets)
+            item_requirements.append(requirements)
+        return item_markets, item_requirements
@@ -1,24 +1,58 @@
+import array
+import collections
 import logging
 import math
+import multiprocessing
 import os
 import sys
 import threading
 import time
 import typing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timezone
 
+import market_data
+import numpy as np
+import orjson
 import requests
+from costing import DepthCurve, MarketDepth, RecipeGraph
+from sortedcontainers import SortedList
 
-from common.types import ForgeItemInfo, ForgeProfit
+from common import metrics
+from common.http_client import HttpClient, Priority, TokenBucket
+from common.items import ItemRegistry
+from common.services import DbApi, HttpDbApi, HttpWebApi, WebApi
+from common.types import ForgeItemInfo, ForgeProfit, PriceSample
 
-DB_API_URL = "http://db-api:5000"
-WEB_URL = "http://web:8000"
+DB_API_URL = os.getenv("DB_API_URL", "http://db-api:5000")
+WEB_URL = os.getenv("WEB_URL", "http://web:8000")
+HYPIXEL_API_URL = os.getenv("HYPIXEL_API_URL", "https://api.hypixel.net")
 
+# Counted per page and per sweep, never per auction, so the parse loop stays free of instrumentation
+AH_SWEEP_SECONDS = metrics.histogram(
+    "calculator_ah_sweep_seconds", "Wall time of full Auction House sweeps", buckets=(1, 2, 5, 10, 20, 30, 60, 120)
+)
+AH_SWEEPS = metrics.counter("calculator_ah_sweeps_total", "Auction House sweeps by outcome", ("outcome",))
+AH_PAGES = metrics.counter("calculator_ah_pages_total", "Auction House pages by outcome", ("outcome",))
+AH_BIN_AUCTIONS = metrics.counter("calculator_ah_bin_auctions_total", "BIN auctions decoded from fetched pages")
+AH_LIVE_BINS = metrics.gauge("calculator_ah_live_bins", "BIN auctions in the live snapshot")
+AUCTION_ID_MAP_ENTRIES = metrics.gauge("calculator_auction_id_map_entries", "Retired auctions in the ID map")
+AUCTION_ID_MAP_BYTES = metrics.gauge("calculator_auction_id_map_bytes", "Approximate size of the auction ID map")
+AH_SALES_RECORDED = metrics.counter("calculator_ah_sales_recorded_total", "AH sales sent to db-api")
+POLL_SECONDS = metrics.histogram("calculator_poll_seconds", "Duration of market input polls", ("input",))
+POLL_FAILURES = metrics.counter("calculator_poll_failures_total", "Failed market input polls", ("input",))
+PROFIT_SECONDS = metrics.histogram("calculator_profit_calculation_seconds", "Duration of profit calculations")
+PUBLISH_FAILURES = metrics.counter("calculator_publish_failures_total", "Failed result publishes", ("target",))
+AH_UNRESOLVED_BINS = metrics.counter(
+    "calculator_ah_unresolved_bins_total", "BIN auctions skipped because their item is not in the item registry"
+)
 
-def wait_for_api(logger: logging.Logger, retries: int = 10, delay: int = 5) -> None:
+
+def wait_for_api(logger: logging.Logger, client: HttpClient, retries: int = 10, delay: int = 5) -> None:
     for attempt in range(retries):
         try:
-            requests.get(f"{DB_API_URL}/health", timeout=10)
+            client.get(f"{DB_API_URL}/health", timeout=10)
             return
         except requests.exceptions.ConnectionError:
             if attempt < retries - 1:
@@ -28,123 +62,478 @@ def wait_for_api(logger: logging.Logger, retries: int = 10, delay: int = 5) -> N
                 raise RuntimeError(f"Could not connect to db-api after {retries} attempts")
 
 
+class AuctionPage(typing.NamedTuple):
+    total_pages: int
+    total_auctions: int
+    last_updated: int
+    auctions: list[tuple[bytes, str, int]]  # BIN auctions only, as (16-byte uuid, item_name, starting_bid)
+
+
+def parse_auction_page(content: bytes) -> AuctionPage:
+    """Decode a raw AH page, keeping only the fields the tracker reads.
+    Full auction dicts (lore, bids, NBT bytes) never outlive this call.
+    """
+    page = orjson.loads(content)
+    return AuctionPage(
+        page["totalPages"],
+        page["totalAuctions"],
+        page["lastUpdated"],
+        [(bytes.fromhex(a["uuid"]), a["item_name"], a["starting_bid"]) for a in page.get("auctions", ()) if a["bin"]],
+    )
+
+
+class PackedAuctionPage(typing.NamedTuple):
+    """The BIN auctions of one AH page resolved to item ids and packed into flat buffers, which is all that crosses
+    the process boundary when pages are decoded in a process pool.
+    """
+
+    total_pages: int
+    total_auctions: int
+    last_updated: int
+    uuids: bytes  # 16 bytes per auction
+    item_ids: array.array  # "i", one per auction
+    prices: array.array  # "q", one starting bid per auction
+    unresolved: int  # BIN auctions dropped because the item registry does not know their item
+
+
+def pack_auction_page(content: bytes, resolve: typing.Callable[[str], int | None]) -> PackedAuctionPage:
+    page = parse_auction_page(content)
+    uuids = bytearray()
+    item_ids = array.array("i")
+    prices = array.array("q")
+    unresolved = 0
+    for uuid, item_name, price in page.auctions:
+        item_id = resolve(item_name)
+        if item_id is None:
+            unresolved += 1  # No forge recipe can use it, and it is priced again once the registry knows it
+            continue
+        uuids += uuid
+        item_ids.append(item_id)
+        prices.append(price)
+    return PackedAuctionPage(
+        page.total_pages, page.total_auctions, page.last_updated, bytes(uuids), item_ids, prices, unresolved
+    )
+
+
+_decode_registry: ItemRegistry | None = None  # Set in each decode pool process by its initializer
+
+
+def _init_decode_worker(registry: dict[str, typing.Any]) -> None:
+    global _decode_registry
+    _decode_registry = ItemRegistry.from_json(registry)
+
+
+def _decode_in_worker(content: bytes) -> PackedAuctionPage:
+    assert _decode_registry is not None
+    return pack_auction_page(content, _decode_registry.resolve_listing)
+
+
+class _IdMapGeneration:
+    """Auctions retired during one generation window.
+    The open generation is a dict; once sealed it is packed into a sorted uuid blob plus an item-id array.
+    """
+
+    REMOVED = -1
+
+    def __init__(self, started_at: float) -> None:
+        self.started_at = started_at
+        self.sealed_at: float | None = None
+        self.live = 0
+        self._open: dict[bytes, int] | None = {}
+        self._uuids = b""
+        self._item_ids = array.array("i")
+
+    def add(self, uuid: bytes, item_id: int) -> None:
+        assert self._open is not None
+        if uuid not in self._open:
+            self.live += 1
+        self._open[uuid] = item_id
+
+    def pop(self, uuid: bytes) -> int | None:
+        if self._open is not None:
+            item_id = self._open.pop(uuid, None)
+        else:
+            item_id = None
+            lo, hi = 0, len(self._item_ids)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                key = self._uuids[mid * 16 : mid * 16 + 16]
+                if key < uuid:
+                    lo = mid + 1
+                elif key > uuid:
+                    hi = mid
+                else:
+                    if self._item_ids[mid] != self.REMOVED:
+                        item_id = self._item_ids[mid]
+                        self._item_ids[mid] = self.REMOVED
+                    break
+        if item_id is not None:
+            self.live -= 1
+        return item_id
+
+    def seal(self, now: float) -> None:
+        assert self._open is not None
+        entries = sorted(self._open.items())
+        self._uuids = b"".join(uuid for uuid, _ in entries)
+        self._item_ids = array.array("i", (item_id for _, item_id in entries))
+        self._open = None
+        self.sealed_at = now
+
+    @property
+    def nbytes(self) -> int:
+        if self._open is not None:
+            return sys.getsizeof(self._open) + len(self._open) * sys.getsizeof(bytes(16))
+        return len(self._uuids) + self._item_ids.itemsize * len(self._item_ids)
+
+
+class AuctionIdMap:
+    """Compact uuid -> item id store for recently retired auctions.
+    Entries are grouped into fixed-length generations, so expiry drops whole generations instead of scanning entries.
+    """
+
+    def __init__(self, generation_seconds: float) -> None:
+        self._generation_seconds = generation_seconds
+        self._generations: collections.deque[_IdMapGeneration] = collections.deque()
+
+    def __len__(self) -> int:
+        return sum(generation.live for generation in self._generations)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(generation.nbytes for generation in self._generations)
+
+    def add(self, uuid: bytes, item_id: int, now: float) -> None:
+        current = self._generations[-1] if self._generations else None
+        if current is None or current.sealed_at is not None or now - current.started_at >= self._generation_seconds:
+            if current is not None and current.sealed_at is None:
+                current.seal(now)
+            current = _IdMapGeneration(now)
+            self._generations.append(current)
+        current.add(uuid, item_id)
+
+    def pop(self, uuid: bytes) -> int | None:
+        for generation in reversed(self._generations):
+            item_id = generation.pop(uuid)
+            if item_id is not None:
+                return item_id
+        return None
+
+    def prune(self, cutoff: float, now: float) -> int:
+        """Drop every sealed generation whose newest entry is older than cutoff. Returns the entries dropped.
+        An open generation whose window has ended is sealed first, so entries expire even when adds stop.
+        """
+        current = self._generations[-1] if self._generations else None
+        if current is not None and current.sealed_at is None and now - current.started_at >= self._generation_seconds:
+            current.seal(now)
+        pruned = 0
+        while self._generations and (sealed_at := self._generations[0].sealed_at) is not None and sealed_at < cutoff:
+            pruned += self._generations.popleft().live
+        return pruned
+
+
+class AuctionHouseSnapshot:
+    """Live BIN auctions carried across AH sweeps, indexed by uuid and by item for cheapest-BIN lookups."""
+
+    def __init__(self) -> None:
+        self.last_updated: int | None = None
+        self._auctions: dict[bytes, tuple[int, int]] = {}  # uuid -> (item_id, starting_bid)
+        self._prices: dict[int, SortedList] = {}  # item_id -> sorted live BIN prices
+
+    def __len__(self) -> int:
+        return len(self._auctions)
+
+    def __contains__(self, uuid: bytes) -> bool:
+        return uuid in self._auctions
+
+    def uuids(self) -> list[bytes]:
+        return list(self._auctions)
+
+    def add(self, uuid: bytes, item_id: int, price: int) -> None:
+        self._auctions[uuid] = (item_id, price)
+        self._prices.setdefault(item_id, SortedList()).add(price)
+
+    def remove(self, uuid: bytes) -> int | None:
+        """Drop an auction from the snapshot and return its item id, or None if it is not live."""
+        entry = self._auctions.pop(uuid, None)
+        if entry is None:
+            return None
+        item_id, price = entry
+        prices = self._prices[item_id]
+        prices.remove(price)
+        if not prices:
+            del self._prices[item_id]
+        return item_id
+
+    def cheapest(self) -> dict[int, int]:
+        return {item_id: prices[0] for item_id, prices in self._prices.items()}
+
+
 class MarketPriceTracker:
-    BAZAAR_URL = "https://api.hypixel.net/v2/skyblock/bazaar"
-    AUCTION_HOUSE_URL = "https://api.hypixel.net/v2/skyblock/auctions"
+    BAZAAR_URL = f"{HYPIXEL_API_URL}/v2/skyblock/bazaar"
+    AUCTION_HOUSE_URL = f"{HYPIXEL_API_URL}/v2/skyblock/auctions"
     HEADERS = {"Content-Type": "application/json"}
 
-    def __init__(self, logger: logging.Logger) -> None:
+    PAGE_TIMEOUT = 15
+    PAGE_RETRIES = 2
+    BAZAAR_RETRIES = 2
+    ID_MAP_GENERATION = 60
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        client: HttpClient,
+        ah_workers: int = 16,
+        registry_cache: str | None = None,
+        decode_processes: int = 0,
+        db_api: DbApi | None = None,
+    ) -> None:
         self._logger = logger
-        self._auction_id_map: dict[str, tuple[str, float]] = {}  # auction_id -> (item_name, inserted_at)
-        self._auction_id_map_lock = threading.Lock()
+        self._db_api = db_api if db_api is not None else HttpDbApi(client, DB_API_URL)
+        # Every price and sale is keyed by item registry id; the registry is replaced whole when db-api's changes
+        self._registry = ItemRegistry.empty()
+        self._registry_etag: str | None = None
+        self._registry_cache = registry_cache
+        if registry_cache is not None and (cached := ItemRegistry.load(registry_cache)) is not None:
+            self._registry, self._registry_etag = cached
+            logger.info(f"Loaded item registry version {self._registry.version} ({len(self._registry)} items).")
+        self._snapshot = AuctionHouseSnapshot()
+        # Auctions that dropped out of the snapshot, kept so late auctions_ended entries still resolve
+        self._auction_id_map = AuctionIdMap(self.ID_MAP_GENERATION)
+        # Auctions sold since the running sweep started; its pages may still list them, so it must not re-add them
+        self._sold_during_sweep: set[bytes] = set()
+        self._auction_id_map_lock = threading.Lock()  # guards the snapshot, the ID map and the sold set
+        # Shared by every poller; its connection pools should hold a connection per AH fetch worker
+        self._client = client
+        self._client.session.headers.update(self.HEADERS)
+        self._ah_executor = ThreadPoolExecutor(max_workers=ah_workers, thread_name_prefix="ah-fetch")
+        # With decode processes, fetch threads hand page bodies to a pool holding a copy of the item registry
+        self._decode_processes = decode_processes
+        self._decode_pool: ProcessPoolExecutor | None = None
+        self._decode_pool_version: int | None = None  # Registry version the pool's processes were started with
+
+    def _page_decoder(self) -> typing.Callable[[bytes], PackedAuctionPage]:
+        """Decoder for the pages of one sweep: in the fetch thread, or in the process pool when one is configured.
+        The pool is restarted whenever the item registry changed, or a worker died, since the last sweep.
+        """
+        registry = self._registry
+        if not self._decode_processes:
+            return lambda content: pack_auction_page(content, registry.resolve_listing)
+        if self._decode_pool is None or self._decode_pool_version != registry.version:
+            if self._decode_pool is not None:
+                self._decode_pool.shutdown(wait=False, cancel_futures=True)
+            self._decode_pool = ProcessPoolExecutor(
+                self._decode_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_decode_worker,
+                initargs=(registry.to_json(),),
+            )
+            self._decode_pool_version = registry.version
+            self._logger.info(f"Started {self._decode_processes} AH decode processes (registry {registry.version}).")
+        pool = self._decode_pool
 
-    def fetch_auction_house_prices(self) -> dict[str, int]:
-        response = requests.get(self.AUCTION_HOUSE_URL, headers=self.HEADERS)
+        def decode(content: bytes) -> PackedAuctionPage:
+            try:
+                return pool.submit(_decode_in_worker, content).result()
+            except BrokenProcessPool:
+                self._decode_pool_version = None
+                raise
+
+        return decode
+
+    def _fetch_auction_page(self, page: int, decode: typing.Callable[[bytes], PackedAuctionPage]) -> PackedAuctionPage:
+        """Fetch and decode a single AH page. Pages are bulk traffic: they yield to every other Hypixel request."""
+        start = time.perf_counter()
+        response = self._client.get(
+            self.AUCTION_HOUSE_URL,
+            params={"page": page},
+            timeout=self.PAGE_TIMEOUT,
+            priority=Priority.BULK,
+            retries=self.PAGE_RETRIES,
+        )
         response.raise_for_status()
-        auction_house = response.json()
-        pages = auction_house["totalPages"]
-        items = auction_house["totalAuctions"]
+        data = decode(response.content)
+        self._logger.debug(f"Fetched AH page {page} in {time.perf_counter() - start:.2f}s")
+        return data
+
+    @property
+    def registry(self) -> ItemRegistry:
+        return self._registry
+
+    def refresh_registry(self) -> bool:
+        """Fetch db-api's item registry unless the copy in use is current, saving it to the disk cache.
+        Returns whether the registry changed.
+        """
+        fetched = self._db_api.get_items(self._registry_etag)
+        if fetched is None:
+            return False
+        registry, self._registry_etag = fetched
+        if registry.version == self._registry.version:
+            return False
+        self._registry = registry
+        if self._registry_cache is not None:
+            registry.save(self._registry_cache, self._registry_etag)
+        self._logger.info(f"Loaded item registry version {registry.version} ({len(registry)} items) from db-api.")
+        return True
+
+    def fetch_auction_house_prices(self) -> dict[int, int]:
+        sweep_start = time.perf_counter()
+        with self._auction_id_map_lock:
+            self._sold_during_sweep.clear()
+        decode = self._page_decoder()
+        first_page = self._fetch_auction_page(0, decode)
+        pages = first_page.total_pages
+        items = first_page.total_auctions
+        last_updated = first_page.last_updated
+
+        if last_updated == self._snapshot.last_updated:
+            AH_SWEEPS.labels("unchanged").inc()
+            self._logger.info("Auction House unchanged since last sweep, reusing snapshot.")
+            return self._cheapest_bins()
 
         self._logger.info(f"Starting Auction House processing, {pages} pages found with a total of {items} auctions:")
-        prices: dict[str, int] = {}
-        new_id_map: dict[str, str] = {}
+        live: dict[bytes, tuple[int, int]] = {}
+        fetched_pages = AH_PAGES.labels("fetched")
+
+        def aggregate(page: PackedAuctionPage) -> None:
+            uuids = page.uuids
+            live.update(zip([uuids[i : i + 16] for i in range(0, len(uuids), 16)], zip(page.item_ids, page.prices)))
+            fetched_pages.inc()
+            AH_BIN_AUCTIONS.inc(len(page.item_ids) + page.unresolved)
+            AH_UNRESOLVED_BINS.inc(page.unresolved)
 
-        for i in range(pages):
+        aggregate(first_page)
+        futures = {self._ah_executor.submit(self._fetch_auction_page, i, decode): i for i in range(1, pages)}
+        skipped = 0
+        for future in as_completed(futures):
             try:
-                page_response = requests.get(self.AUCTION_HOUSE_URL, headers=self.HEADERS, params={"page": i})
-                page_response.raise_for_status()
-                page = page_response.json()
+                aggregate(future.result())
             except Exception as e:
-                self._logger.warning(f"Skipping AH page {i}: {e}")
-                continue
-            for auction in page.get("auctions", []):
-                item_name = auction["item_name"]
-                new_id_map[auction["uuid"]] = item_name
-                current_price = prices.get(item_name, -1)
-                new_price = auction["starting_bid"]
-                if auction["bin"] and (current_price == -1 or current_price > new_price):
-                    prices[item_name] = new_price
+                skipped += 1
+                self._logger.warning(f"Skipping AH page {futures[future]}: {e}")
 
-        self._update_auction_id_map(new_id_map)
+        added, removed = self._apply_sweep(live, complete=skipped == 0)
+        if not skipped:
+            self._snapshot.last_updated = last_updated
 
-        self._logger.info("Auction House processing complete.")
+        prices = self._cheapest_bins()
+        AH_PAGES.labels("skipped").inc(skipped)
+        AH_SWEEPS.labels("partial" if skipped else "complete").inc()
+        AH_SWEEP_SECONDS.observe(time.perf_counter() - sweep_start)
+        AH_LIVE_BINS.set(len(self._snapshot))
+        self._logger.info(
+            f"Auction House processing complete in {time.perf_counter() - sweep_start:.2f}s "
+            f"({pages - skipped}/{pages} pages, +{added}/-{removed} auctions, {len(self._snapshot)} live BINs)."
+        )
         return prices
 
-    def _update_auction_id_map(self, new_entries: dict[str, str]) -> None:
-        """Accumulate new uuid→item_name entries with a timestamp (called from main thread)."""
+    @property
+    def ah_last_updated(self) -> int | None:
+        """lastUpdated (epoch ms) of the last complete AH sweep."""
+        return self._snapshot.last_updated
+
+    def _cheapest_bins(self) -> dict[int, int]:
+        with self._auction_id_map_lock:
+            return self._snapshot.cheapest()
+
+    def _apply_sweep(self, live: dict[bytes, tuple[int, int]], complete: bool) -> tuple[int, int]:
+        """Apply the difference between a sweep and the snapshot. Returns (added, removed).
+        Auctions are only removed after a complete sweep, so a skipped page never evicts live listings.
+        Removed auctions move to the ID map so a sale reported shortly after still resolves; auctions sold while
+        the sweep ran are not re-added even if one of its pages still listed them.
+        """
         now = time.monotonic()
         with self._auction_id_map_lock:
-            for uuid, name in new_entries.items():
-                self._auction_id_map[uuid] = (name, now)
+            sold = self._sold_during_sweep
+            removed = [uuid for uuid in self._snapshot.uuids() if uuid not in live] if complete else []
+            for uuid in removed:
+                item_id = self._snapshot.remove(uuid)
+                if item_id is not None:
+                    self._auction_id_map.add(uuid, item_id, now)
+            added = 0
+            for uuid, (item_id, price) in live.items():
+                if uuid not in self._snapshot and uuid not in sold:
+                    self._snapshot.add(uuid, item_id, price)
+                    added += 1
+            sold.clear()
+        return added, len(removed)
 
-    def resolve_and_remove(self, auction_ids: list[str]) -> dict[str, str]:
-        """Look up item names for the given auction IDs, remove matched entries, and return {uuid: item_name}."""
-        result: dict[str, str] = {}
+    def resolve_and_remove(self, auction_ids: list[str]) -> dict[str, int]:
+        """Look up items for the given auction IDs, evicting them from the snapshot or the ID map,
+        and return {uuid: item_id}.
+        """
+        result: dict[str, int] = {}
         with self._auction_id_map_lock:
             for auction_id in auction_ids:
-                entry = self._auction_id_map.pop(auction_id, None)
-                if entry:
-                    result[auction_id] = entry[0]
+                uuid = bytes.fromhex(auction_id)
+                self._sold_during_sweep.add(uuid)
+                item_id = self._snapshot.remove(uuid)
+                if item_id is None:
+                    item_id = self._auction_id_map.pop(uuid)
+                if item_id is not None:
+                    result[auction_id] = item_id
         return result
 
     def prune_auction_id_map(self, max_age_seconds: float) -> int:
         """Remove entries older than max_age_seconds. Returns the number of entries pruned."""
-        cutoff = time.monotonic() - max_age_seconds
+        now = time.monotonic()
+        with self._auction_id_map_lock:
+            return self._auction_id_map.prune(now - max_age_seconds, now)
+
+    def auction_id_map_stats(self) -> tuple[int, int]:
+        """Returns (entries, approximate bytes) held by the auction ID map."""
         with self._auction_id_map_lock:
-            stale = [k for k, (_, ts) in self._auction_id_map.items() if ts < cutoff]
-            for k in stale:
-                del self._auction_id_map[k]
-        return len(stale)
+            return len(self._auction_id_map), self._auction_id_map.nbytes
 
-    def fetch_bazaar_prices(self) -> dict[str, dict[str, int]]:
-        self._logger.info("Starting Bazaar processing...")
-        bazaar = requests.get(self.BAZAAR_URL, headers=self.HEADERS).json()
-        prices: dict[str, dict[str, int]] = {"Coins": {"Buy Price": 1, "Sell Price": 1, "Weekly Volume": 0}}
+    @property
+    def client(self) -> HttpClient:
+        return self._client
+
+    @property
+    def db_api(self) -> DbApi:
+        return self._db_api
+
+    def fetch_bazaar_prices(self) -> tuple[dict[int, dict[str, int]], dict[int, MarketDepth]]:
+        """Returns (prices, depth) by item id: top-of-book prices and weekly volume, and each product's order book
+        depth. Products the item registry cannot place are skipped.
+        """
+        self._logger.debug("Starting Bazaar processing...")
+        response = self._client.get(self.BAZAAR_URL, retries=self.BAZAAR_RETRIES)
+        response.raise_for_status()
+        bazaar = orjson.loads(response.content)
+        registry = self._registry
+        prices: dict[int, dict[str, int]] = {}
+        depth: dict[int, MarketDepth] = {}
+        coins = registry.resolve("Coins")
+        if coins is not None:
+            prices[coins] = {"Buy Price": 1, "Sell Price": 1, "Weekly Volume": 0}
 
         for product in bazaar["products"]:
-            item_name = self._convert_name(product)
-            qs = bazaar["products"][product]["quick_status"]
-            prices[item_name] = {
+            item_id = registry.resolve_product(product)
+            if item_id is None:
+                continue
+            info = bazaar["products"][product]
+            qs = info["quick_status"]
+            prices[item_id] = {
                 "Buy Price": qs["buyPrice"],
                 "Sell Price": qs["sellPrice"],
                 "Weekly Volume": qs["sellMovingWeek"],
             }
+            # buy_summary lists the sell offers an insta-buy fills from, sell_summary the buy orders
+            book = MarketDepth(
+                DepthCurve.from_summary(info.get("buy_summary", []), descending=False),
+                DepthCurve.from_summary(info.get("sell_summary", []), descending=True),
+            )
+            if book.asks is not None or book.bids is not None:
+                depth[item_id] = book
 
-        self._logger.info("Bazaar processing complete.")
-        return prices
-
-    def _convert_name(self, bazaar_name: str) -> str:
-        if bazaar_name == "DRILL_ENGINE":
-            return "Drill Motor"
-        if bazaar_name == "FUEL_TANK":
-            return "Fuel Canister"
-        if bazaar_name == "HAY_BLOCK":
-            return "Hay Bale"
-        if bazaar_name == "ENCHANTED_HAY_BLOCK":
-            return "Enchanted Hay Bale"
-        if bazaar_name == "ENCHANTED_COAL_BLOCK":
-            return "Enchanted Block Of Coal"
-        if bazaar_name == "GOBLIN_EGG_BLUE":
-            return "Blue Goblin Egg"
-        if bazaar_name == "GOBLIN_EGG_GREEN":
-            return "Green Goblin Egg"
-        if bazaar_name == "GOBLIN_EGG_RED":
-            return "Red Goblin Egg"
-        if bazaar_name == "GOBLIN_EGG_YELLOW":
-            return "Yellow Goblin Egg"
-        if bazaar_name == "MITHRIL_ORE":
-            return "Mithril"
-
-        converted_name = bazaar_name
-        if bazaar_name.endswith("GEM"):
-            converted_name = bazaar_name.replace("GEM", "GEMSTONE")
-
-        return " ".join([part.capitalize() for part in converted_name.split(":")[0].split("_")])
+        self._logger.debug("Bazaar processing complete.")
+        return prices, depth
 
 
 class AHSalesTracker:
-    ENDED_URL = "https://api.hypixel.net/v2/skyblock/auctions_ended"
+    ENDED_URL = f"{HYPIXEL_API_URL}/v2/skyblock/auctions_ended"
     POLL_INTERVAL = 60
+    RETRIES = 2
 
     def __init__(self, logger: logging.Logger, market: MarketPriceTracker, map_ttl: float = 1200.0) -> None:
         self._logger = logger
@@ -153,24 +542,34 @@ class AHSalesTracker:
 
     def _poll_once(self) -> None:
         try:
-            response = requests.get(self.ENDED_URL, timeout=10)
+            response = self._market.client.get(
+                self.ENDED_URL, timeout=10, priority=Priority.INTERACTIVE, retries=self.RETRIES
+            )
             response.raise_for_status()
             auctions = response.json().get("auctions", [])
 
             sold_ids = [a["auction_id"] for a in auctions if a.get("buyer") and a.get("bin")]
             resolved = self._market.resolve_and_remove(sold_ids)
 
-            sales: dict[str, int] = {}
-            for item_name in resolved.values():
-                sales[item_name] = sales.get(item_name, 0) + 1
+            sales: dict[int, int] = {}
+            for item_id in resolved.values():
+                sales[item_id] = sales.get(item_id, 0) + 1
 
+            prune_start = time.perf_counter()
             pruned = self._market.prune_auction_id_map(self._map_ttl)
-            if pruned:
-                self._logger.info(f"Pruned {pruned} stale entries from auction ID map.")
+            prune_ms = (time.perf_counter() - prune_start) * 1000
+            entries, nbytes = self._market.auction_id_map_stats()
+            AUCTION_ID_MAP_ENTRIES.set(entries)
+            AUCTION_ID_MAP_BYTES.set(nbytes)
+            self._logger.log(
+                logging.INFO if pruned else logging.DEBUG,
+                f"Pruned {pruned} stale entries from auction ID map in {prune_ms:.2f}ms "
+                f"({entries} entries, {nbytes / 1024:.0f} KiB).",
+            )
 
             if sales:
-                r = requests.post(f"{DB_API_URL}/ah-sales", json={"sales": sales}, timeout=10)
-                r.raise_for_status()
+                self._market.db_api.post_ah_sales(sales)
+                AH_SALES_RECORDED.inc(sum(sales.values()))
                 self._logger.info(f"Recorded {sum(sales.values())} AH sales across {len(sales)} items.")
         except Exception as e:
             self._logger.warning(f"AH sales poll failed: {e}")
@@ -181,202 +580,472 @@ class AHSalesTracker:
             time.sleep(self.POLL_INTERVAL)
 
 
+class PricingScenario(typing.NamedTuple):
+    name: str
+    buy_key: str  # Bazaar price paid per ingredient
+    sell_key: str  # Bazaar price received for the product
+    taxed: bool
+
+
 class ProfitCalculator:
-    def __init__(self, logger: logging.Logger) -> None:
+    BAZAAR_TAX = 0.0125
+    AH_TAX = 0.01
+    # The first scenario drives the ranking; the others are reported alongside it
+    PRICING_SCENARIOS = [
+        PricingScenario("Insta-buy / Insta-sell", "Buy Price", "Sell Price", False),
+        PricingScenario("Buy Order / Sell Offer", "Sell Price", "Buy Price", False),
+        PricingScenario("Insta-buy / Insta-sell, after tax", "Buy Price", "Sell Price", True),
+    ]
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        client: HttpClient,
+        ah_workers: int = 16,
+        batch_size: int = 1,
+        registry_cache: str | None = None,
+        ah_decode_processes: int = 0,
+        db_api: DbApi | None = None,
+    ) -> None:
         self._logger = logger
-        self._market = MarketPriceTracker(logger)
+        self._market = MarketPriceTracker(logger, client, ah_workers, registry_cache, ah_decode_processes, db_api)
+        self._batch_size = batch_size  # Units of each item forged and sold at once, e.g. one per forge slot
         self._start_time = time.time()  # Track uptime for volume estimation
+        self._recipe_graph: RecipeGraph | None = None
+        self._ah_sales_etag: str | None = None  # Reuse the last sales totals while db-api answers 304
+        self._ah_sales_data: dict[int, int] = {}
 
     @property
     def market(self) -> MarketPriceTracker:
         return self._market
 
-    def calculate_profits(self, forge_info: dict[str, ForgeItemInfo]) -> tuple[list[ForgeProfit], int | None]:
-        """Calculate profits for all forge items.
-        Returns (profits_list, uptime_seconds).
-        """
-        auction_house_prices = self._market.fetch_auction_house_prices()
-        bazaar_prices = self._market.fetch_bazaar_prices()
+    def _get_recipe_graph(
+        self, forge_info: dict[str, ForgeItemInfo], item_ids: dict[str, int], forge_version: str
+    ) -> RecipeGraph:
+        if self._recipe_graph is None or self._recipe_graph.version != forge_version:
+            self._recipe_graph = RecipeGraph(forge_info, item_ids, forge_version, self._logger)
+            self._logger.info(f"Built recipe graph for forge data version {forge_version[:12]}.")
+        return self._recipe_graph
 
-        # Calculate uptime for UI display
+    def fetch_ah_weekly_sales(self) -> tuple[dict[int, int], dict[int, bool]]:
+        """Fetch 7-day AH sales volumes, extrapolated while less than a week of data exists.
+        Returns (weekly_sales, volume_estimated). Errors reaching db-api are raised, so the poller keeps publishing
+        the last good volumes instead of empty ones.
+        """
         uptime_seconds = int(time.time() - self._start_time)
 
-        ah_weekly_sales: dict[str, int] = {}
-        ah_volume_estimated: dict[str, bool] = {}
+        ah_weekly_sales: dict[int, int] = {}
+        ah_volume_estimated: dict[int, bool] = {}
 
-        try:
-            # Fetch actual data span from database
-            oldest_response = requests.get(f"{DB_API_URL}/ah-sales/oldest", timeout=10)
-            oldest_response.raise_for_status()
-            oldest_recorded_at_str = oldest_response.json().get("oldest_recorded_at")
-
-            # Determine if we need to extrapolate based on actual data collection span
-            # But use uptime to determine if we should show the "estimated" flag
-            data_span_seconds = 604800  # Default to 7 days if we have full data
-            is_estimated = uptime_seconds < 604800  # Show estimated flag if tool hasn't been up 7 days
-
-            if oldest_recorded_at_str:
-                oldest_dt = datetime.fromisoformat(oldest_recorded_at_str)
-                now_dt = datetime.now(timezone.utc)
-                data_span_seconds = max(1, int((now_dt - oldest_dt).total_seconds()))
-                self._logger.info(
-                    f"AH data collection: oldest record at {oldest_recorded_at_str}, "
-                    f"span = {data_span_seconds}s ({data_span_seconds / 86400:.2f} days)"
-                )
-            else:
-                self._logger.info("No AH records in database yet, will not extrapolate")
+        # Fetch actual data span from database
+        oldest_recorded_at_str = self._market.db_api.get_ah_sales_oldest()
+
+        # Determine if we need to extrapolate based on actual data collection span
+        # But use uptime to determine if we should show the "estimated" flag
+        data_span_seconds = 604800  # Default to 7 days if we have full data
+        is_estimated = uptime_seconds < 604800  # Show estimated flag if tool hasn't been up 7 days
 
+        if oldest_recorded_at_str:
+            oldest_dt = datetime.fromisoformat(oldest_recorded_at_str)
+            now_dt = datetime.now(timezone.utc)
+            data_span_seconds = max(1, int((now_dt - oldest_dt).total_seconds()))
             self._logger.info(
-                f"Tool uptime: {uptime_seconds}s ({uptime_seconds / 86400:.2f} days), "
-                f"is_estimated flag = {is_estimated}"
+                f"AH data collection: oldest record at {oldest_recorded_at_str}, "
+                f"span = {data_span_seconds}s ({data_span_seconds / 86400:.2f} days)"
             )
+        else:
+            self._logger.info("No AH records in database yet, will not extrapolate")
 
-            response = requests.get(f"{DB_API_URL}/ah-sales", timeout=10)
-            response.raise_for_status()
-            ah_sales_data = response.json().get("sales", {})
+        self._logger.info(
+            f"Tool uptime: {uptime_seconds}s ({uptime_seconds / 86400:.2f} days), is_estimated flag = {is_estimated}"
+        )
+
+        fetched = self._market.db_api.get_ah_sales(self._ah_sales_etag)
+        if fetched is None:
+            ah_sales_data = self._ah_sales_data
+            self._logger.info(f"AH sales data unchanged ({len(ah_sales_data)} items)")
+        else:
+            ah_sales_data, self._ah_sales_etag = fetched
+            self._ah_sales_data = ah_sales_data
             self._logger.info(f"Fetched {len(ah_sales_data)} items from AH sales data")
 
-            # Raw sales are just item_name -> total_quantity
-            for item_name, total_quantity in ah_sales_data.items():
-                if is_estimated:
-                    # Extrapolate volume based on actual data collection span
-                    volume = int(total_quantity * 604800 / data_span_seconds)
-                    self._logger.debug(
-                        f"  {item_name}: raw_qty={total_quantity}, "
-                        f"extrapolated={volume} (qty × 604800 / {data_span_seconds})"
-                    )
-                else:
-                    volume = total_quantity
-                ah_weekly_sales[item_name] = volume
-                ah_volume_estimated[item_name] = is_estimated
-        except Exception as e:
-            self._logger.warning(f"Could not fetch AH weekly sales: {e}")
-            ah_weekly_sales = {}
-            ah_volume_estimated = {}
+        # Raw sales are just item_id -> total_quantity
+        for item_id, total_quantity in ah_sales_data.items():
+            if is_estimated:
+                # Extrapolate volume based on actual data collection span
+                volume = int(total_quantity * 604800 / data_span_seconds)
+                self._logger.debug(
+                    f"  item {item_id}: raw_qty={total_quantity}, "
+                    f"extrapolated={volume} (qty × 604800 / {data_span_seconds})"
+                )
+            else:
+                volume = total_quantity
+            ah_weekly_sales[item_id] = volume
+            ah_volume_estimated[item_id] = is_estimated
+        return ah_weekly_sales, ah_volume_estimated
+
+    @staticmethod
+    def _bazaar_price(
+        bazaar_info: dict[str, int], key: str, insta_key: str, curve: DepthCurve | None, quantity: int
+    ) -> float:
+        """Unit price at key; insta trades (key == insta_key) walk the order book for quantity units when its
+        depth is known.
+        """
+        if key == insta_key and curve is not None:
+            return curve.average(quantity)
+        return bazaar_info.get(key, -1)
+
+    def calculate_profits(
+        self,
+        forge_info: dict[str, ForgeItemInfo],
+        item_ids: dict[str, int],
+        forge_version: str,
+        bazaar_prices: dict[int, dict[str, int]],
+        bazaar_depth: dict[int, MarketDepth],
+        auction_house_prices: dict[int, int],
+        ah_weekly_sales: dict[int, int],
+        ah_volume_estimated: dict[int, bool],
+    ) -> tuple[list[ForgeProfit], dict[int, PriceSample], int | None]:
+        """Calculate profits for all forge items from the given market inputs.
+        Market inputs are keyed by item id; item_ids gives the id of every item and material name in forge_info.
+        Insta-buys and insta-sells of Bazaar products are priced along bazaar_depth at the quantity traded per
+        batch; products without depth fall back to the top-of-book price.
+        Returns (profits_list, price_samples, uptime_seconds); price_samples covers every priced item by id,
+        profitable or not, for the price history.
+        """
+        # Calculate uptime for UI display
+        uptime_seconds = int(time.time() - self._start_time)
 
         self._logger.info("Starting final profit calculations...")
         items_profit: list[ForgeProfit] = []
+        graph = self._get_recipe_graph(forge_info, item_ids, forge_version)
+        scenarios = self.PRICING_SCENARIOS
 
-        for item_name in forge_info.keys():
-            item_cost = 0
-            is_craftable = True
-            is_sellable = True
-            recipe_markets: dict[str, str] = {}
-
-            for material in forge_info[item_name]["Recipe"].keys():
-                material_bazaar_info = bazaar_prices.get(material)
-                if material_bazaar_info:
-                    material_price = material_bazaar_info.get("Buy Price", -1)
-                    recipe_markets[material] = "Bazaar"
-                else:
-                    material_price = auction_house_prices.get(material, -1)
-                    recipe_markets[material] = "AH"
-                if material_price < 0:
-                    is_craftable = False
-                item_cost += forge_info[item_name]["Recipe"][material] * material_price
-
-            item_bazaar_info = bazaar_prices.get(item_name)
-            if item_bazaar_info:
-                item_sell_price = item_bazaar_info.get("Sell Price", -1)
-                weekly_volume = item_bazaar_info.get("Weekly Volume", 0)
-                volume_source = "Bazaar"
+        # Fill (node, scenario) buy and (item, scenario) sell price matrices; -1 marks a missing price
+        buy = np.empty((len(graph.nodes), len(scenarios)))
+        sell = np.empty((len(graph.items), len(scenarios)))
+        markets: list[str] = []
+        batch = self._batch_size
+        for node, item_id in enumerate(graph.node_ids):
+            bazaar_info = bazaar_prices.get(item_id)
+            if bazaar_info:
+                markets.append("Bazaar")
+                depth = bazaar_depth.get(item_id, MarketDepth(None, None))
+                buy[node] = [
+                    self._bazaar_price(bazaar_info, scenario.buy_key, "Buy Price", depth.asks, batch)
+                    for scenario in scenarios
+                ]
+                if node < len(graph.items):
+                    sell[node] = [
+                        self._bazaar_price(bazaar_info, scenario.sell_key, "Sell Price", depth.bids, batch)
+                        for scenario in scenarios
+                    ]
+                    sell[node] *= [1 - self.BAZAAR_TAX if scenario.taxed else 1 for scenario in scenarios]
+            else:
+                markets.append("AH")
+                buy[node] = auction_house_prices.get(item_id, -1)
+                if node < len(graph.items):
+                    sell[node] = auction_house_prices.get(item_id, -1)
+                    sell[node] *= [1 - self.AH_TAX if scenario.taxed else 1 for scenario in scenarios]
+        buy[buy < 0] = np.inf
+        sell[sell < 0] = np.nan
+
+        # Each recipe edge insta-buys quantity x batch units of its material, deeper into the book than one unit
+        edge_buy = buy[graph.edge_materials]
+        insta_buy = [i for i, scenario in enumerate(scenarios) if scenario.buy_key == "Buy Price"]
+        edge_quantities = (graph.edge_quantities * batch).tolist()
+        for edge, node in enumerate(graph.edge_materials.tolist()):
+            depth = bazaar_depth.get(graph.node_ids[node])
+            if depth is not None and depth.asks is not None:
+                edge_buy[edge, insta_buy] = depth.asks.average(edge_quantities[edge])
+
+        result = graph.evaluate(buy, edge_buy)
+        profit = sell - result.cost
+        profit_per_hour = profit / result.duration
+        recipe_markets, requirements = graph.path(result.forged[:, 0], markets)
+        price_samples: dict[int, PriceSample] = {
+            graph.node_ids[row]: {
+                "Cost": math.ceil(result.cost[row, 0]),
+                "Sell Value": math.ceil(sell[row, 0]),
+                "Profit": math.ceil(profit[row, 0]),
+            }
+            for row in np.flatnonzero(np.isfinite(profit[:, 0]))
+            if graph.node_ids[row] >= 0
+        }
+
+        for row in np.flatnonzero(np.isfinite(profit[:, 0]) & (profit[:, 0] > 0)):
+            item_name, item_id = graph.items[row], graph.node_ids[row]
+            if markets[row] == "Bazaar":
+                weekly_volume = bazaar_prices[item_id].get("Weekly Volume", 0)
                 volume_estimated = False
             else:
-                item_sell_price = auction_house_prices.get(item_name, -1)
-                weekly_volume = ah_weekly_sales.get(item_name, 0)
-                volume_source = "AH"
-                volume_estimated = ah_volume_estimated.get(item_name, False)
-            if item_sell_price < 0:
-                is_sellable = False
-
-            if is_craftable and is_sellable and item_sell_price > item_cost:
-                items_profit.append(
-                    {
-                        "Rank": 0,
-                        "Name": item_name,
-                        "Cost": math.ceil(item_cost),
-                        "Sell Value": math.ceil(item_sell_price),
-                        "Profit": math.ceil(item_sell_price - item_cost),
-                        "Duration": forge_info[item_name]["Duration"],
-                        "Profit per Hour": math.ceil((item_sell_price - item_cost) / forge_info[item_name]["Duration"]),
-                        "Weekly Volume": weekly_volume,
-                        "Volume Estimated": volume_estimated,
-                        "Selling Market": volume_source,
-                        "Recipe Markets": recipe_markets,
-                        "Recipe": forge_info[item_name]["Recipe"],
-                        "Requirements": forge_info[item_name]["Requirements"],
-                    }
-                )
+                weekly_volume = ah_weekly_sales.get(item_id, 0)
+                volume_estimated = ah_volume_estimated.get(item_id, False)
+
+            items_profit.append(
+                {
+                    "Rank": 0,
+                    "Name": item_name,
+                    "Cost": math.ceil(result.cost[row, 0]),
+                    "Sell Value": math.ceil(sell[row, 0]),
+                    "Profit": math.ceil(profit[row, 0]),
+                    "Duration": forge_info[item_name]["Duration"],
+                    "Chained Duration": float(result.duration[row, 0]),
+                    "Profit per Hour": math.ceil(profit_per_hour[row, 0]),
+                    "Scenario Profit per Hour": {
+                        scenario.name: math.ceil(profit_per_hour[row, i])
+                        for i, scenario in enumerate(scenarios)
+                        if np.isfinite(profit_per_hour[row, i])
+                    },
+                    "Weekly Volume": weekly_volume,
+                    "Volume Estimated": volume_estimated,
+                    "Selling Market": markets[row],
+                    "Recipe Markets": recipe_markets[row],
+                    "Recipe": forge_info[item_name]["Recipe"],
+                    "Requirements": requirements[row],
+                }
+            )
 
         return (
             [
                 typing.cast(ForgeProfit, {**item, "Rank": i + 1})
                 for i, item in enumerate(sorted(items_profit, key=lambda x: x["Profit per Hour"], reverse=True))
             ],
+            price_samples,
             uptime_seconds,
         )
 
 
-def main() -> None:
-    formatter = logging.Formatter("%(asctime)s - calculator - %(levelname)s - %(message)s")
+class PriceStore:
+    """Latest value of each market input with a version that is bumped on every change.
+    Pollers publish into it; the recompute scheduler waits on it.
+    """
 
-    logger = logging.getLogger("calculator")
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    logger.setLevel(logging.INFO)
+    def __init__(self) -> None:
+        self._changed = threading.Condition()
+        self._values: dict[str, typing.Any] = {}
+        self._versions: dict[str, int] = {}
 
-    refresh_time = int(os.getenv("REFRESH_TIME", "120"))
+    def publish(self, key: str, value: typing.Any) -> None:
+        with self._changed:
+            self._values[key] = value
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._changed.notify_all()
 
-    logger.info("Waiting for db-api...")
-    wait_for_api(logger)
-    logger.info("db-api ready. Checking for existing forge data...")
+    def wait_for_change(
+        self, seen: dict[str, int], required: tuple[str, ...]
+    ) -> tuple[dict[str, typing.Any], dict[str, int]]:
+        """Block until every required input is present and any input differs from the versions in seen.
+        Returns (values, versions).
+        """
+
+        def ready() -> bool:
+            return all(key in self._versions for key in required) and any(
+                seen.get(key) != version for key, version in self._versions.items()
+            )
+
+        with self._changed:
+            self._changed.wait_for(ready)
+            return dict(self._values), dict(self._versions)
 
-    while True:
-        r = requests.get(f"{DB_API_URL}/forge-items", timeout=30)
-        if r.json().get("items"):
-            break
-        logger.info("DB is empty, waiting for first scrape... retrying in 10s...")
-        time.sleep(10)
 
-    logger.info("Forge data available. Starting calculations.")
-    calculator = ProfitCalculator(logger)
+class MarketPollers:
+    """Independent pollers for each profit input, each on its own cadence.
+    An input is only published to the PriceStore when its value actually changed.
+    """
+
+    AH_UPDATE_PERIOD = 60  # Hypixel rebuilds the AH snapshot roughly once a minute
+    AH_POLL_MARGIN = 3
+    SALES_POLL_INTERVAL = 60
+    MIN_POLL_DELAY = 5
+    RETRY_DELAY = 10
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        calculator: ProfitCalculator,
+        store: PriceStore,
+        ah_max_interval: float,
+        bazaar_interval: float,
+        forge_interval: float,
+    ) -> None:
+        self._logger = logger
+        self._calculator = calculator
+        self._store = store
+        self._ah_max_interval = ah_max_interval
+        self._bazaar_interval = bazaar_interval
+        self._forge_interval = forge_interval
+        self._latest: dict[str, typing.Any] = {}
+
+    def start(self) -> None:
+        for name, poll in (
+            ("forge", self._poll_forge),
+            ("bazaar", self._poll_bazaar),
+            ("ah", self._poll_auction_house),
+            ("ah-sales", self._poll_ah_sales),
+        ):
+            threading.Thread(target=self._run, args=(name, poll), daemon=True, name=f"{name}-poller").start()
+
+    def _run(self, name: str, poll: typing.Callable[[], float]) -> None:
+        poll_seconds = POLL_SECONDS.labels(name)
+        while True:
+            try:
+                with poll_seconds.time():
+                    delay = poll()
+            except Exception as e:
+                POLL_FAILURES.labels(name).inc()
+                self._logger.warning(f"{name} poll failed: {e}")
+                delay = self.RETRY_DELAY
+            time.sleep(delay)
+
+    def _publish_if_changed(self, key: str, value: typing.Any) -> None:
+        if self._latest.get(key) != value:
+            self._latest[key] = value
+            self._store.publish(key, value)
+
+    def _poll_forge(self) -> float:
+        # New catalog names are registered before the catalog that uses them is served, so refresh the registry first
+        self._calculator.market.refresh_registry()
+        # Conditional read: None means the catalog we already parsed (and its recipe graph) is still current
+        fetched = self._calculator.market.db_api.get_forge_items(self._latest.get("forge_etag"))
+        if fetched is None:
+            return self._forge_interval
+        data, self._latest["forge_etag"] = fetched
+        # Names and ids are read through the registry, so a new registry version is a new catalog version too
+        forge_version = f"{data['content_hash']}/{data['registry_version']}"
+        if data["content_hash"] is not None and forge_version == self._latest.get("forge_version"):
+            return self._forge_interval  # Only the scrape time moved
+        forge_info: dict[str, ForgeItemInfo] = {
+            name: typing.cast(ForgeItemInfo, info) for name, info in data["items"].items()
+        }
+        if not forge_info:
+            self._logger.info("No forge data in database yet, retrying in 10s...")
+            return self.RETRY_DELAY
+        self._latest["forge_version"] = forge_version
+        self._logger.info(f"Loaded {len(forge_info)} forge items from DB (catalog version {data['version']}).")
+        self._store.publish("forge", (forge_info, data["ids"], forge_version))
+        return self._forge_interval
+
+    def _poll_bazaar(self) -> float:
+        self._publish_if_changed("bazaar", self._calculator.market.fetch_bazaar_prices())  # (prices, depth)
+        return self._bazaar_interval
+
+    def _poll_auction_house(self) -> float:
+        self._publish_if_changed("ah", self._calculator.market.fetch_auction_house_prices())
+        last_updated = self._calculator.market.ah_last_updated
+        if last_updated is None:
+            return self.MIN_POLL_DELAY
+        # Wake up just after Hypixel is due to publish the next snapshot
+        next_update = last_updated / 1000 + self.AH_UPDATE_PERIOD + self.AH_POLL_MARGIN
+        return min(max(next_update - time.time(), self.MIN_POLL_DELAY), self._ah_max_interval)
+
+    def _poll_ah_sales(self) -> float:
+        self._publish_if_changed("ah_sales", self._calculator.fetch_ah_weekly_sales())
+        return self.SALES_POLL_INTERVAL
+
+
+def create_client(logger: logging.Logger) -> HttpClient:
+    """The client for Hypixel and db-api reads, which can be recorded to or replayed from fixtures, with the
+    Hypixel rate limit applied.
+    """
+    ah_workers = int(os.getenv("AH_FETCH_WORKERS", "16"))
+    hypixel_rate_limit = float(os.getenv("HYPIXEL_RATE_LIMIT", "20"))
+    hypixel_rate_burst = float(os.getenv("HYPIXEL_RATE_BURST", "60"))
+    market_data_mode = os.getenv("MARKET_DATA_MODE", "live")
+    market_data_dir = os.getenv("MARKET_DATA_DIR", "fixtures")
+
+    session = market_data.open_session(market_data_mode, market_data_dir)
+    client = HttpClient(session, pool_size=ah_workers)
+    if hypixel_rate_limit:
+        client.govern(HYPIXEL_API_URL, TokenBucket(hypixel_rate_limit, hypixel_rate_burst))
+    if market_data_mode != "live":
+        logger.info(f"Market data mode: {market_data_mode} ({market_data_dir}).")
+    return client
+
+
+def run(logger: logging.Logger, client: HttpClient, db_api: DbApi, web_api: WebApi) -> None:
+    """Poll the markets and publish profits whenever an input changed, forever."""
+    refresh_time = int(os.getenv("REFRESH_TIME", "120"))
+    ah_workers = int(os.getenv("AH_FETCH_WORKERS", "16"))
+    ah_decode_processes = int(os.getenv("AH_DECODE_PROCESSES", "0"))
+    bazaar_poll_interval = int(os.getenv("BAZAAR_POLL_INTERVAL", "20"))
+    forge_poll_interval = int(os.getenv("FORGE_POLL_INTERVAL", "60"))
+    forge_batch_size = int(os.getenv("FORGE_BATCH_SIZE", "1"))
+    item_registry_cache = os.getenv("ITEM_REGISTRY_CACHE", "item-registry.json")
+
+    calculator = ProfitCalculator(
+        logger, client, ah_workers, forge_batch_size, item_registry_cache, ah_decode_processes, db_api
+    )
+    try:
+        calculator.market.refresh_registry()  # Before the first poll prices anything
+    except Exception as e:
+        logger.warning(f"Could not load the item registry, using version {calculator.market.registry.version}: {e}")
+    store = PriceStore()
+    MarketPollers(logger, calculator, store, refresh_time, bazaar_poll_interval, forge_poll_interval).start()
 
     sales_tracker = AHSalesTracker(logger, calculator.market, map_ttl=refresh_time * 10)
     t = threading.Thread(target=sales_tracker.run, daemon=True, name="ah-sales-tracker")
     t.start()
     logger.info("AH sales tracker thread started.")
 
+    seen: dict[str, int] = {}
     while True:
-        response = requests.get(f"{DB_API_URL}/forge-items", timeout=30)
-        response.raise_for_status()
-        forge_info: dict[str, ForgeItemInfo] = {
-            name: typing.cast(ForgeItemInfo, info) for name, info in response.json()["items"].items()
-        }
-        if not forge_info:
-            logger.info("No forge data in database yet, retrying in 10s...")
-            time.sleep(10)
-            continue
+        values, versions = store.wait_for_change(seen, required=("forge", "bazaar", "ah"))
+        changed = [key for key, version in versions.items() if seen.get(key) != version]
+        seen = versions
+        logger.info(f"Inputs changed ({', '.join(sorted(changed))}). Calculating profits...")
 
-        logger.info(f"Loaded {len(forge_info)} forge items from DB. Calculating profits...")
-        profits, uptime_seconds = calculator.calculate_profits(forge_info)
+        forge_info, item_ids, forge_version = values["forge"]
+        bazaar_prices, bazaar_depth = values["bazaar"]
+        ah_weekly_sales, ah_volume_estimated = values.get("ah_sales", ({}, {}))
+        with PROFIT_SECONDS.time():
+            profits, price_samples, uptime_seconds = calculator.calculate_profits(
+                forge_info,
+                item_ids,
+                forge_version,
+                bazaar_prices,
+                bazaar_depth,
+                values["ah"],
+                ah_weekly_sales,
+                ah_volume_estimated,
+            )
+        calculated_at = datetime.now(timezone.utc).isoformat()
 
         try:
-            requests.post(
-                f"{WEB_URL}/results",
-                json={
-                    "profits": profits,
-                    "calculated_at": datetime.now(timezone.utc).isoformat(),
-                    "uptime_seconds": uptime_seconds,
-                },
-                timeout=10,
-            )
+            web_api.post_results(profits, calculated_at, uptime_seconds)
             logger.info("Pushed results to web service.")
         except Exception as e:
+            PUBLISH_FAILURES.labels("web").inc()
             logger.warning(f"Could not push results to web service: {e}")
 
-        logger.info(f"Done. Sleeping {refresh_time}s...")
-        time.sleep(refresh_time)
+        try:
+            db_api.post_history(calculated_at, price_samples)
+        except Exception as e:
+            PUBLISH_FAILURES.labels("history").inc()
+            logger.warning(f"Could not record price history: {e}")
+
+
+def main() -> None:
+    formatter = logging.Formatter("%(asctime)s - calculator - %(levelname)s - %(message)s")
+
+    logger = logging.getLogger("calculator")
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+    metrics_port = int(os.getenv("METRICS_PORT", "9100"))
+    if metrics_port:
+        metrics.serve(metrics_port)
+        logger.info(f"Serving metrics on port {metrics_port}.")
+
+    client = create_client(logger)
+    web_client = HttpClient(pool_size=1)  # Results always go to the live web service, even when replaying
+
+    logger.info("Waiting for db-api...")
+    wait_for_api(logger, client)
+    logger.info("db-api ready. Starting market pollers.")
+    run(logger, client, HttpDbApi(client, DB_API_URL), HttpWebApi(web_client, WEB_URL))
 
 
 if __name__ == "__main__":
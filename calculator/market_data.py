@@ -0,0 +1,177 @@
+"""Where the calculator's HTTP data comes from: the live endpoints, the live endpoints while recording every
+response to compressed fixtures, or those fixtures replayed offline (in-process or from a stand-in server).
+
+Usage: python market_data.py serve <fixtures-dir> [port]
+"""
+
+import gzip
+import http
+import http.server
+import json
+import logging
+import sys
+import threading
+import typing
+import urllib.parse
+from pathlib import Path
+
+import requests
+import requests.structures
+
+INDEX_FILE = "index.jsonl"
+KEPT_HEADERS = ("Content-Type", "ETag")
+
+
+def fixture_key(method: str, url: str, params: typing.Any = None) -> str:
+    """Host-independent request identity: method, path and sorted query string."""
+    parsed = urllib.parse.urlsplit(url)
+    query = urllib.parse.parse_qsl(parsed.query) + list((params or {}).items())
+    encoded = urllib.parse.urlencode(sorted((str(k), str(v)) for k, v in query))
+    return f"{method.upper()} {parsed.path}" + (f"?{encoded}" if encoded else "")
+
+
+class FixtureEntry(typing.NamedTuple):
+    status: int
+    headers: dict[str, str]
+    file: str
+
+
+class FixtureWriter:
+    """Appends gzipped responses to a fixture directory. Recording the same request again adds to its sequence."""
+
+    def __init__(self, directory: str | Path, compresslevel: int = 6) -> None:
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._compresslevel = compresslevel
+        self._lock = threading.Lock()
+        with (self._directory / INDEX_FILE).open("a+") as index:
+            index.seek(0)
+            self._count = sum(1 for _ in index)
+
+    def write(self, key: str, status: int, headers: typing.Mapping[str, str], content: bytes) -> None:
+        with self._lock:
+            name = f"{self._count:06d}.gz"
+            self._count += 1
+            (self._directory / name).write_bytes(gzip.compress(content, compresslevel=self._compresslevel))
+            kept = {header: headers[header] for header in KEPT_HEADERS if header in headers}
+            with (self._directory / INDEX_FILE).open("a") as index:
+                index.write(json.dumps({"key": key, "status": status, "headers": kept, "file": name}) + "\n")
+
+
+class FixtureStore:
+    """Recorded responses by request key. Each request replays its recordings in order, then repeats the last."""
+
+    def __init__(self, directory: str | Path) -> None:
+        self._directory = Path(directory)
+        self._entries: dict[str, list[FixtureEntry]] = {}
+        self._positions: dict[str, int] = {}
+        self._lock = threading.Lock()
+        with (self._directory / INDEX_FILE).open() as index:
+            for line in index:
+                record = json.loads(line)
+                self._entries.setdefault(record["key"], []).append(
+                    FixtureEntry(record["status"], record["headers"], record["file"])
+                )
+
+    def next(self, key: str) -> tuple[FixtureEntry, bytes] | None:
+        entries = self._entries.get(key)
+        if not entries:
+            return None
+        with self._lock:
+            position = self._positions.get(key, 0)
+            self._positions[key] = min(position + 1, len(entries) - 1)
+        entry = entries[position]
+        return entry, gzip.decompress((self._directory / entry.file).read_bytes())
+
+
+class RecordingSession(requests.Session):
+    """Live session that also records every GET response to a fixture directory."""
+
+    def __init__(self, directory: str | Path) -> None:
+        super().__init__()
+        self._writer = FixtureWriter(directory)
+
+    def request(  # type: ignore[override]
+        self, method: str, url: str, *args: typing.Any, **kwargs: typing.Any
+    ) -> requests.Response:
+        response = super().request(method, url, *args, **kwargs)
+        if method.upper() == "GET":
+            key = fixture_key(method, url, kwargs.get("params"))
+            self._writer.write(key, response.status_code, response.headers, response.content)
+        return response
+
+
+class ReplaySession(requests.Session):
+    """Offline session serving recorded responses from disk. Writes (POST/PUT) are accepted and discarded;
+    requests that were never recorded get a 404.
+    """
+
+    def __init__(self, directory: str | Path) -> None:
+        super().__init__()
+        self._store = FixtureStore(directory)
+
+    def request(  # type: ignore[override]
+        self, method: str, url: str, *args: typing.Any, **kwargs: typing.Any
+    ) -> requests.Response:
+        response = requests.Response()
+        response.url = url
+        response.request = requests.Request(method, url).prepare()
+        if method.upper() != "GET":
+            response.status_code, response._content = 200, b"{}"
+        elif (recorded := self._store.next(fixture_key(method, url, kwargs.get("params")))) is None:
+            response.status_code, response._content = 404, b"{}"
+        else:
+            entry, response._content = recorded
+            response.status_code = entry.status
+            response.headers = requests.structures.CaseInsensitiveDict(entry.headers)
+        response.reason = http.HTTPStatus(response.status_code).phrase
+        return response
+
+
+def open_session(mode: str, directory: str | Path) -> requests.Session:
+    """Session for MARKET_DATA_MODE: "live", "record" (live + fixtures in directory) or "replay"."""
+    if mode == "record":
+        return RecordingSession(directory)
+    if mode == "replay":
+        return ReplaySession(directory)
+    if mode != "live":
+        raise ValueError(f"Unknown market data mode {mode!r}")
+    return requests.Session()
+
+
+def serve(directory: str | Path, port: int) -> None:
+    """Stand-in for the Hypixel API and db-api: point HYPIXEL_API_URL and DB_API_URL here."""
+    store = FixtureStore(directory)
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            recorded = store.next(fixture_key("GET", self.path))
+            entry, content = recorded if recorded else (FixtureEntry(404, {}, ""), b"{}")
+            self.send_response(entry.status)
+            for header, value in entry.headers.items():
+                self.send_header(header, value)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        do_PUT = do_POST
+
+        def log_message(self, format: str, *args: typing.Any) -> None:
+            logging.getLogger("market-data").debug(format % args)
+
+    with http.server.ThreadingHTTPServer(("0.0.0.0", port), Handler) as server:
+        print(f"Replaying {directory} on port {port}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "serve":
+        sys.exit(__doc__)
+    serve(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 8899)
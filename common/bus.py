@@ -0,0 +1,31 @@
+"""Request/reply between the components of one process, for the embedded mode.
+
+Components call each other through topics instead of HTTP routes. Arguments and results are passed as they are,
+without serialization, so callers must not mutate what they send or receive. Plain handlers run in the calling
+thread; coroutine handlers run on the bus's event loop, so components calling them must run in other threads.
+"""
+
+import asyncio
+import inspect
+import typing
+
+from common import metrics
+
+CALL_SECONDS = metrics.histogram("bus_call_seconds", "Duration of in-process bus calls", ("topic",))
+
+
+class Bus:
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._handlers: dict[str, typing.Callable[..., typing.Any]] = {}
+
+    def serve(self, topic: str, handler: typing.Callable[..., typing.Any]) -> None:
+        self._handlers[topic] = handler
+
+    def call(self, topic: str, *args: typing.Any) -> typing.Any:
+        """Run topic's handler with args and return its result, raising whatever it raised."""
+        handler = self._handlers[topic]
+        with CALL_SECONDS.labels(topic).time():
+            if inspect.iscoroutinefunction(handler):
+                return asyncio.run_coroutine_threadsafe(handler(*args), self._loop).result()
+            return handler(*args)
@@ -0,0 +1,199 @@
+"""Outbound HTTP shared by everything one service calls: keep-alive connection pools per host, a token bucket per
+rate-limited host, request priorities, a retry budget with jittered backoff, and per-endpoint latency metrics.
+
+Every poller of a service sends through the same HttpClient, so they share the rate limit of a host such as the
+Hypixel API. While its bucket is empty, waiting requests are admitted in priority order: a sales poll goes ahead of
+the pages of a running AH sweep instead of queueing behind them.
+"""
+
+import enum
+import heapq
+import itertools
+import random
+import threading
+import time
+import typing
+import urllib.parse
+
+import requests
+import requests.adapters
+
+from common import metrics
+
+REQUEST_SECONDS = metrics.histogram(
+    "http_client_request_seconds", "Latency of outbound HTTP requests by endpoint", ("host", "endpoint")
+)
+REQUESTS = metrics.counter(
+    "http_client_requests_total", "Outbound HTTP requests by endpoint and outcome", ("host", "endpoint", "outcome")
+)
+RETRIES = metrics.counter("http_client_retries_total", "Outbound HTTP retries by endpoint", ("host", "endpoint"))
+RETRIES_DENIED = metrics.counter(
+    "http_client_retries_denied_total", "Retries not sent because the retry budget was spent", ("host",)
+)
+GOVERNOR_WAIT_SECONDS = metrics.histogram(
+    "http_client_governor_wait_seconds", "Time requests waited for a rate limit token", ("host", "priority")
+)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+class Priority(enum.IntEnum):
+    """Order requests waiting on a rate-limited host are admitted in, lowest first."""
+
+    INTERACTIVE = 0  # Small polls whose data goes stale quickly, e.g. ended auctions
+    NORMAL = 1
+    BULK = 2  # One of many requests of a larger job, e.g. the pages of an AH sweep
+
+
+class TokenBucket:
+    """rate requests per second with bursts of up to burst. Waiting callers get tokens in priority order, then in
+    arrival order; only the first in line sleeps on the refill, the rest wait to be woken.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._waiting: list[tuple[int, int]] = []  # Heap of (priority, ticket)
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+
+    def acquire(self, priority: Priority = Priority.NORMAL) -> float:
+        """Take a token, blocking until one is free for this caller. Returns the seconds waited."""
+        start = time.monotonic()
+        entry = (int(priority), next(self._tickets))
+        with self._condition:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+                    self._updated = now
+                    first = self._waiting[0] == entry
+                    if first and self._tokens >= 1:
+                        self._tokens -= 1
+                        return now - start
+                    self._condition.wait((1 - self._tokens) / self._rate if first else None)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()  # Whoever is first in line now takes over the refill wait
+
+
+class RetryBudget:
+    """Caps retries at a fraction of traffic. Every request deposits ratio and every retry withdraws one, up to a
+    balance of reserve, so isolated failures always retry but a failing host sees at most ratio extra load.
+    """
+
+    def __init__(self, ratio: float = 0.2, reserve: float = 20) -> None:
+        self._ratio = ratio
+        self._reserve = reserve
+        self._balance = reserve
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._balance = min(self._reserve, self._balance + self._ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+class HttpClient:
+    """A requests.Session shared by a service's pollers, plus the rate limits of the hosts they call.
+    The session can be any requests.Session, such as the calculator's recording or replaying ones.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session | None = None,
+        pool_size: int = 10,
+        timeout: float = 30,
+        backoff: float = 0.5,
+        max_backoff: float = 30,
+        budget: RetryBudget | None = None,
+    ) -> None:
+        self.session = session if session is not None else requests.Session()
+        # The adapter keeps one keep-alive pool of up to pool_size connections per host
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._timeout = timeout
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._budget = budget if budget is not None else RetryBudget()
+        self._governors: dict[str, TokenBucket] = {}
+
+    def govern(self, base_url: str, bucket: TokenBucket) -> None:
+        """Send every request to base_url's host through bucket."""
+        self._governors[urllib.parse.urlsplit(base_url).netloc] = bucket
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        priority: Priority = Priority.NORMAL,
+        retries: int = 0,
+        **kwargs: typing.Any,
+    ) -> requests.Response:
+        """Send a request, retrying connection errors, timeouts and retryable statuses up to retries times while
+        the retry budget allows. Returns the last response whatever its status; raises the last connection error.
+        """
+        parsed = urllib.parse.urlsplit(url)
+        host, endpoint = parsed.netloc, parsed.path or "/"
+        governor = self._governors.get(host)
+        kwargs.setdefault("timeout", self._timeout)
+        self._budget.deposit()
+        for attempt in range(retries + 1):
+            if governor is not None:
+                GOVERNOR_WAIT_SECONDS.labels(host, priority.name.lower()).observe(governor.acquire(priority))
+            start = time.perf_counter()
+            response: requests.Response | None = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except _TRANSIENT_ERRORS as e:
+                error = e
+            REQUEST_SECONDS.labels(host, endpoint).observe(time.perf_counter() - start)
+            REQUESTS.labels(host, endpoint, "error" if response is None else f"{response.status_code // 100}xx").inc()
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                return response
+            if attempt == retries or not self._retry(host, endpoint, attempt, response):
+                if response is None:
+                    raise error
+                return response
+        raise RuntimeError("Unreachable")
+
+    def _retry(self, host: str, endpoint: str, attempt: int, response: requests.Response | None) -> bool:
+        """Sleep before retry attempt + 1 if the budget allows one. A Retry-After answer is honoured as given,
+        other delays are drawn uniformly up to the exponential backoff.
+        """
+        if not self._budget.withdraw():
+            RETRIES_DENIED.labels(host).inc()
+            return False
+        RETRIES.labels(host, endpoint).inc()
+        retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+        if retry_after.isdigit():
+            delay = min(float(retry_after), self._max_backoff)
+        else:
+            delay = random.uniform(0, min(self._max_backoff, self._backoff * 2**attempt))
+        time.sleep(delay)
+        return True
+
+    def get(self, url: str, **kwargs: typing.Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: typing.Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs: typing.Any) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
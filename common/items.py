@@ -0,0 +1,144 @@
+"""Canonical integer ids for SkyBlock items, shared by every service.
+
+db-api owns the registry: ids are assigned once, in its items table, and are never reused or renumbered. An item
+has at most one Hypixel item id, which is also its Bazaar product id, and one display name. The scraper
+registers Hypixel's item list and the item ids wiki pages name; any other name the forge catalog uses gets an id
+of its own. Other services work on a copy of the registry, versioned by db-api, and resolve each distinct name
+their sources use (Bazaar product ids, AH item_name variants, wiki names) once.
+"""
+
+import json
+import re
+import typing
+from pathlib import Path
+
+FORMAT = 1  # Layout of to_json(), bumped when it changes so stale disk caches are refetched
+
+_FORMATTING = re.compile(r"§.")  # Minecraft colour and style codes
+_DECORATION = re.compile(r"^\s*\[Lvl \d+\]|[✪➊➋➌➍➎]")  # Pet levels and dungeon stars on AH listings
+_SPACES = re.compile(r"\s+")
+
+
+def display_name(name: str) -> str:
+    """name without formatting codes, with whitespace collapsed."""
+    return _SPACES.sub(" ", _FORMATTING.sub("", name)).strip()
+
+
+def normalize(name: str) -> str:
+    """The form names are matched in: display_name() without listing decorations, case folded."""
+    return display_name(_DECORATION.sub("", display_name(name))).casefold()
+
+
+def product_name(product_id: str) -> str:
+    """Display name guessed from a Bazaar product id, for products missing from Hypixel's item list."""
+    if product_id.endswith("GEM"):
+        product_id = product_id.replace("GEM", "GEMSTONE")
+    return " ".join(part.capitalize() for part in product_id.split(":")[0].split("_"))
+
+
+class RegistryItem(typing.NamedTuple):
+    id: int
+    item_id: str | None  # Hypixel item id, None for names only the forge catalog uses
+    name: str
+
+
+class ItemRegistry:
+    """One version of the registry. Names resolve through normalize(); explicit aliases take precedence over
+    display names, and among items sharing a display name the oldest wins. Lookups are memoized per name.
+    """
+
+    def __init__(self, version: int, items: typing.Iterable[RegistryItem], aliases: typing.Mapping[str, int]) -> None:
+        self.version = version
+        self._items = {item.id: item for item in sorted(items)}
+        self._by_item_id = {item.item_id: item.id for item in self._items.values() if item.item_id}
+        self._by_name: dict[str, int] = {}
+        for item in self._items.values():
+            self._by_name.setdefault(normalize(item.name), item.id)
+        self._by_name.update(aliases)
+        self._aliases = dict(aliases)
+        self._resolved: dict[str, int | None] = {}
+        self._listings: dict[str, int | None] = {}
+        self._products: dict[str, int | None] = {}
+
+    @classmethod
+    def empty(cls) -> "ItemRegistry":
+        return cls(0, (), {})
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def items(self) -> list[RegistryItem]:
+        return list(self._items.values())
+
+    def name(self, item: int) -> str:
+        return self._items[item].name
+
+    def item_id(self, item: int) -> str | None:
+        return self._items[item].item_id
+
+    def by_item_id(self, item_id: str) -> int | None:
+        return self._by_item_id.get(item_id)
+
+    def resolve(self, name: str) -> int | None:
+        """The item a display or wiki name refers to."""
+        try:
+            return self._resolved[name]
+        except KeyError:
+            item = self._resolved[name] = self._by_name.get(normalize(name))
+            return item
+
+    def resolve_listing(self, item_name: str) -> int | None:
+        """The item an AH listing is for. Listings carry their reforge as a leading word, so a name that does not
+        resolve is retried without it; catalog names never are, as "Red Goblin Egg" is not a "Goblin Egg".
+        """
+        try:
+            return self._listings[item_name]
+        except KeyError:
+            key = normalize(item_name)
+            item = self._by_name.get(key)
+            if item is None and " " in key:
+                item = self._by_name.get(key.split(" ", 1)[1])
+            self._listings[item_name] = item
+            return item
+
+    def resolve_product(self, product_id: str) -> int | None:
+        """The item a Bazaar product is; ids missing from Hypixel's item list fall back to a guessed name."""
+        try:
+            return self._products[product_id]
+        except KeyError:
+            item = self._by_item_id.get(product_id)
+            if item is None:
+                item = self.resolve(product_name(product_id))
+            self._products[product_id] = item
+            return item
+
+    def to_json(self) -> dict[str, typing.Any]:
+        return {
+            "format": FORMAT,
+            "version": self.version,
+            "items": [list(item) for item in self._items.values()],
+            "aliases": self._aliases,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, typing.Any]) -> "ItemRegistry":
+        if data.get("format") != FORMAT:
+            raise ValueError(f"Unsupported item registry format {data.get('format')}")
+        return cls(data["version"], (RegistryItem(*item) for item in data["items"]), data["aliases"])
+
+    def save(self, path: str | Path, etag: str | None = None) -> None:
+        """Write the registry, and the ETag it was served with, to path."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_suffix(".partial")
+        partial.write_text(json.dumps({"etag": etag, "registry": self.to_json()}, separators=(",", ":")))
+        partial.replace(path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> tuple["ItemRegistry", str | None] | None:
+        """The registry saved at path and its ETag, or None if there is no readable copy."""
+        try:
+            data = json.loads(Path(path).read_text())
+            return cls.from_json(data["registry"]), data["etag"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
@@ -0,0 +1,344 @@
+"""Counters, gauges and histograms rendered in the Prometheus text exposition format.
+
+Metrics register in a process-wide registry when they are created. Services with an HTTP server expose
+render() on /metrics; the others call serve() to start a small one on a background thread. Processes that share
+one endpoint (gunicorn workers) call share() so every worker's metrics are summed into each scrape.
+"""
+
+import bisect
+import contextlib
+import http.server
+import json
+import os
+import threading
+import time
+import typing
+from pathlib import Path
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+T = typing.TypeVar("T")
+
+
+class _CounterValue:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def get(self) -> float:
+        return self._value
+
+
+class _GaugeValue(_CounterValue):
+    def __init__(self) -> None:
+        super().__init__()
+        self._function: typing.Callable[[], float] | None = None
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = value
+
+    def set_function(self, function: typing.Callable[[], float]) -> None:
+        """Read the value from function at collection time instead of storing it."""
+        self._function = function
+
+    def get(self) -> float:
+        return self._function() if self._function is not None else self._value
+
+
+class _HistogramValue:
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)  # Per bucket, not cumulative; the last one is +Inf
+        self._sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextlib.contextmanager
+    def time(self) -> typing.Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def get(self) -> tuple[list[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _Metric(typing.Generic[T]):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple[str, ...], T] = {}
+        self._lock = threading.Lock()
+        self._unlabelled = None if labelnames else self.labels()
+
+    def _new_child(self) -> T:
+        raise NotImplementedError
+
+    def labels(self, *values: typing.Any) -> T:
+        """The time series for one combination of label values, in labelnames order."""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self) -> T:
+        if self._unlabelled is None:
+            raise ValueError(f"{self.name} has labels {self.labelnames}; use .labels()")
+        return self._unlabelled
+
+    def collect(self) -> list[tuple[list[str], typing.Any]]:
+        with self._lock:
+            children = list(self._children.items())
+        return [(list(key), child.get()) for key, child in children]  # type: ignore[attr-defined]
+
+    def describe(self) -> dict[str, typing.Any]:
+        return {"type": self.type_name, "help": self.documentation, "labelnames": list(self.labelnames)}
+
+
+class Counter(_Metric[_CounterValue]):
+    type_name = "counter"
+
+    def _new_child(self) -> _CounterValue:
+        return _CounterValue()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default().inc(amount)
+
+
+class Gauge(_Metric[_GaugeValue]):
+    type_name = "gauge"
+
+    def _new_child(self) -> _GaugeValue:
+        return _GaugeValue()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._default().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def set_function(self, function: typing.Callable[[], float]) -> None:
+        self._default().set_function(function)
+
+
+class Histogram(_Metric[_HistogramValue]):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def time(self) -> typing.ContextManager[None]:
+        return self._default().time()
+
+    def describe(self) -> dict[str, typing.Any]:
+        return {**super().describe(), "buckets": list(self.buckets)}
+
+
+class Registry:
+    SHARE_INTERVAL = 5  # Seconds between writes of this process's snapshot when shared
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric[typing.Any]] = {}
+        self._lock = threading.Lock()
+        self._share_dir: Path | None = None
+
+    def register(self, metric: _Metric[typing.Any]) -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def snapshot(self) -> dict[str, dict[str, typing.Any]]:
+        """Every metric's description and current samples, as plain JSON-compatible data."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: {**metric.describe(), "samples": metric.collect()} for metric in metrics}
+
+    def share(self, directory: str | Path) -> None:
+        """Publish this process's snapshot to directory every SHARE_INTERVAL seconds, and render the sum of all
+        snapshots found there. The directory is per deployment; stale files are removed with clear_shared().
+        """
+        self._share_dir = Path(directory)
+        self._share_dir.mkdir(parents=True, exist_ok=True)
+        self._write_shared()
+
+        def loop() -> None:
+            while True:
+                time.sleep(self.SHARE_INTERVAL)
+                self._write_shared()
+
+        threading.Thread(target=loop, daemon=True, name="metrics-share").start()
+
+    def _write_shared(self) -> None:
+        assert self._share_dir is not None
+        path = self._share_dir / f"{os.getpid()}.json"
+        partial = path.with_suffix(".partial")
+        partial.write_text(json.dumps(self.snapshot()))
+        partial.replace(path)
+
+    def _shared_snapshots(self) -> list[dict[str, dict[str, typing.Any]]]:
+        assert self._share_dir is not None
+        self._write_shared()
+        snapshots = []
+        for path in self._share_dir.glob("*.json"):
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue  # Removed or replaced mid-read; its process is gone or will be read next scrape
+        return snapshots
+
+    def render(self) -> str:
+        snapshots = self._shared_snapshots() if self._share_dir is not None else [self.snapshot()]
+        return _render(_merge(snapshots))
+
+
+def clear_shared(directory: str | Path, pid: int | None = None) -> None:
+    """Remove one process's shared snapshot, or every snapshot when pid is None."""
+    for path in Path(directory).glob("*.json" if pid is None else f"{pid}.json"):
+        path.unlink(missing_ok=True)
+
+
+def _merge(snapshots: list[dict[str, dict[str, typing.Any]]]) -> dict[str, dict[str, typing.Any]]:
+    """Sum samples with the same name and labels across process snapshots."""
+    merged: dict[str, dict[str, typing.Any]] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                if metric["type"] != "histogram":
+                    target["samples"][key] = target["samples"].get(key, 0) + value
+                elif key not in target["samples"]:
+                    target["samples"][key] = (list(value[0]), value[1])
+                else:
+                    counts, total = target["samples"][key]
+                    target["samples"][key] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+    return merged
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: list[str], values: typing.Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _render(metrics: dict[str, dict[str, typing.Any]]) -> str:
+    lines: list[str] = []
+    for name in sorted(metrics):
+        metric = metrics[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for labels, value in sorted(metric["samples"].items()):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(metric['labelnames'], labels)} {_format_value(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip([*metric["buckets"], float("inf")], counts):
+                cumulative += count
+                le = _format_labels(metric["labelnames"], labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{name}_bucket{le} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(metric['labelnames'], labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(metric['labelnames'], labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    metric = Counter(name, documentation, labelnames)
+    REGISTRY.register(metric)
+    return metric
+
+
+def gauge(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+    metric = Gauge(name, documentation, labelnames)
+    REGISTRY.register(metric)
+    return metric
+
+
+def histogram(
+    name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+) -> Histogram:
+    metric = Histogram(name, documentation, labelnames, buckets)
+    REGISTRY.register(metric)
+    return metric
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def serve(port: int) -> http.server.ThreadingHTTPServer:
+    """Serve GET /metrics on port from a daemon thread, for services without an HTTP server of their own."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: typing.Any) -> None:
+            pass
+
+    server = http.server.ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-server").start()
+    return server
@@ -0,0 +1,148 @@
+"""What the calculator and scraper need from db-api and web, and two ways of reaching them: over HTTP between
+containers, or over the in-process bus in the embedded mode.
+
+Reads that db-api answers conditionally take the ETag the caller holds and return None while it is current, so a
+caller keeps reusing what it already parsed the same way with either transport.
+"""
+
+import typing
+
+from common.bus import Bus
+from common.http_client import HttpClient
+from common.items import ItemRegistry
+from common.types import ForgeItemInfo, ForgeProfit, PriceSample
+
+
+class DbApi(typing.Protocol):
+    def get_items(self, etag: str | None) -> tuple[ItemRegistry, str | None] | None:
+        """The item registry and its ETag, or None if etag is current."""
+        ...
+
+    def put_items(self, listed: dict[str, str], aliases: dict[str, str]) -> dict[str, typing.Any]:
+        """Register Hypixel's item list and wiki aliases; returns the registry version and change counts."""
+        ...
+
+    def get_forge_items(self, etag: str | None) -> tuple[dict[str, typing.Any], str | None] | None:
+        """The forge catalog (items, ids and its version fields) and its ETag, or None if etag is current."""
+        ...
+
+    def put_forge_items(self, items: dict[str, ForgeItemInfo]) -> dict[str, typing.Any]:
+        """Sync the forge catalog; returns the catalog version and change counts."""
+        ...
+
+    def post_ah_sales(self, sales: dict[int, int]) -> None: ...
+
+    def get_ah_sales(self, etag: str | None) -> tuple[dict[int, int], str | None] | None:
+        """7-day AH sales by item and their ETag, or None if etag is current."""
+        ...
+
+    def get_ah_sales_oldest(self) -> str | None: ...
+
+    def post_history(self, recorded_at: str, samples: dict[int, PriceSample]) -> None: ...
+
+
+class WebApi(typing.Protocol):
+    def post_results(self, profits: list[ForgeProfit], calculated_at: str, uptime_seconds: int) -> None: ...
+
+
+class HttpDbApi:
+    def __init__(self, client: HttpClient, base_url: str) -> None:
+        self._client = client
+        self._base_url = base_url
+
+    def _get(self, path: str, etag: str | None, timeout: float) -> tuple[typing.Any, str | None] | None:
+        headers = {"If-None-Match": etag} if etag else {}
+        response = self._client.get(f"{self._base_url}{path}", headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        return response.json(), response.headers.get("ETag")
+
+    def _send(self, method: str, path: str, body: typing.Any, timeout: float) -> typing.Any:
+        response = self._client.request(method, f"{self._base_url}{path}", json=body, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def get_items(self, etag: str | None) -> tuple[ItemRegistry, str | None] | None:
+        fetched = self._get("/items", etag, timeout=30)
+        return None if fetched is None else (ItemRegistry.from_json(fetched[0]), fetched[1])
+
+    def put_items(self, listed: dict[str, str], aliases: dict[str, str]) -> dict[str, typing.Any]:
+        return self._send("PUT", "/items", {"items": listed, "aliases": aliases}, timeout=30)
+
+    def get_forge_items(self, etag: str | None) -> tuple[dict[str, typing.Any], str | None] | None:
+        return self._get("/forge-items", etag, timeout=30)
+
+    def put_forge_items(self, items: dict[str, ForgeItemInfo]) -> dict[str, typing.Any]:
+        return self._send("PUT", "/forge-items", {"items": items}, timeout=30)
+
+    def post_ah_sales(self, sales: dict[int, int]) -> None:
+        self._send("POST", "/ah-sales", {"sales": sales}, timeout=10)
+
+    def get_ah_sales(self, etag: str | None) -> tuple[dict[int, int], str | None] | None:
+        fetched = self._get("/ah-sales", etag, timeout=10)
+        if fetched is None:
+            return None
+        data, etag = fetched
+        return {int(item): total for item, total in data.get("sales", {}).items()}, etag
+
+    def get_ah_sales_oldest(self) -> str | None:
+        response = self._client.get(f"{self._base_url}/ah-sales/oldest", timeout=10)
+        response.raise_for_status()
+        return response.json().get("oldest_recorded_at")
+
+    def post_history(self, recorded_at: str, samples: dict[int, PriceSample]) -> None:
+        self._send("POST", "/history", {"recorded_at": recorded_at, "samples": samples}, timeout=10)
+
+
+class HttpWebApi:
+    def __init__(self, client: HttpClient, base_url: str) -> None:
+        self._client = client
+        self._base_url = base_url
+
+    def post_results(self, profits: list[ForgeProfit], calculated_at: str, uptime_seconds: int) -> None:
+        response = self._client.post(
+            f"{self._base_url}/results",
+            json={"profits": profits, "calculated_at": calculated_at, "uptime_seconds": uptime_seconds},
+            timeout=10,
+        )
+        response.raise_for_status()
+
+
+class BusDbApi:
+    """DbApi over the bus; the embedded mode serves each method under the topic db-api/<method>."""
+
+    def __init__(self, bus: Bus) -> None:
+        self._bus = bus
+
+    def get_items(self, etag: str | None) -> tuple[ItemRegistry, str | None] | None:
+        return self._bus.call("db-api/get_items", etag)
+
+    def put_items(self, listed: dict[str, str], aliases: dict[str, str]) -> dict[str, typing.Any]:
+        return self._bus.call("db-api/put_items", listed, aliases)
+
+    def get_forge_items(self, etag: str | None) -> tuple[dict[str, typing.Any], str | None] | None:
+        return self._bus.call("db-api/get_forge_items", etag)
+
+    def put_forge_items(self, items: dict[str, ForgeItemInfo]) -> dict[str, typing.Any]:
+        return self._bus.call("db-api/put_forge_items", items)
+
+    def post_ah_sales(self, sales: dict[int, int]) -> None:
+        self._bus.call("db-api/post_ah_sales", sales)
+
+    def get_ah_sales(self, etag: str | None) -> tuple[dict[int, int], str | None] | None:
+        return self._bus.call("db-api/get_ah_sales", etag)
+
+    def get_ah_sales_oldest(self) -> str | None:
+        return self._bus.call("db-api/get_ah_sales_oldest")
+
+    def post_history(self, recorded_at: str, samples: dict[int, PriceSample]) -> None:
+        self._bus.call("db-api/post_history", recorded_at, samples)
+
+
+class BusWebApi:
+    def __init__(self, bus: Bus) -> None:
+        self._bus = bus
+
+    def post_results(self, profits: list[ForgeProfit], calculated_at: str, uptime_seconds: int) -> None:
+        self._bus.call("web/results", profits, calculated_at, uptime_seconds)
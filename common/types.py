@@ -7,6 +7,7 @@ ForgePageItem = typing.TypedDict(
         "Duration": str,
         "Recipe Tree": list[str],
         "Requirements": str,
+        "Page": str | None,  # Path of the item's own wiki article
     },
 )
 
@@ -28,7 +29,9 @@ ForgeProfit = typing.TypedDict(
         "Sell Value": int,
         "Profit": int,
         "Duration": float,
+        "Chained Duration": float,
         "Profit per Hour": int,
+        "Scenario Profit per Hour": dict[str, int],
         "Weekly Volume": int,
         "Volume Estimated": bool,
         "Selling Market": str,
@@ -37,3 +40,12 @@ ForgeProfit = typing.TypedDict(
         "Requirements": dict[str, int],
     },
 )
+
+PriceSample = typing.TypedDict(
+    "PriceSample",
+    {
+        "Cost": int,
+        "Sell Value": int,
+        "Profit": int,
+    },
+)
@@ -1,9 +1,115 @@
+import contextlib
+import hashlib
+import json
 import os
+import threading
 import time
+import typing
+from datetime import datetime, timedelta, timezone
 
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
 
-from common.types import ForgeItemInfo
+from common import metrics
+from common.items import ItemRegistry, RegistryItem, display_name, normalize
+from common.types import ForgeItemInfo, PriceSample
+
+T = typing.TypeVar("T")
+
+OPERATION_SECONDS = metrics.histogram(
+    "db_api_operation_seconds", "Duration of pooled database operations", ("operation",)
+)
+OPERATION_RETRIES = metrics.counter("db_api_operation_retries_total", "Operations retried on a fresh connection")
+CONNECTIONS_IN_USE = metrics.gauge("db_api_connections_in_use", "Pooled connections currently borrowed")
+CONNECTIONS_DISCARDED = metrics.counter("db_api_connections_discarded_total", "Broken or stale connections closed")
+
+AH_SALES_PRUNE_INTERVAL = 3600  # Seconds between prunes of sales buckets older than 8 days
+_last_ah_sales_prune: float | None = None
+
+
+class HistoryTier(typing.NamedTuple):
+    name: str
+    width: timedelta  # Bucket size; zero keeps every cycle as its own row
+    retention: timedelta
+    nominal_width: timedelta  # Typical spacing of points, used to pick a tier for a range query
+
+
+# Every sample is folded into each tier as it is recorded, so coarser tiers never need a rollup job
+HISTORY_TIERS = (
+    HistoryTier("raw", timedelta(0), timedelta(days=1), timedelta(seconds=20)),
+    HistoryTier("5m", timedelta(minutes=5), timedelta(days=14), timedelta(minutes=5)),
+    HistoryTier("1h", timedelta(hours=1), timedelta(days=180), timedelta(hours=1)),
+    HistoryTier("1d", timedelta(days=1), timedelta(days=5 * 365), timedelta(days=1)),
+)
+HISTORY_METRICS = {"cost": "Cost", "sell_value": "Sell Value", "profit": "Profit"}  # Column prefix -> sample key
+# Per-metric aggregate columns and how a new sample merges into an existing bucket
+_HISTORY_STATS = {
+    "sum": "price_history.{column} + EXCLUDED.{column}",
+    "sq_sum": "price_history.{column} + EXCLUDED.{column}",
+    "min": "LEAST(price_history.{column}, EXCLUDED.{column})",
+    "max": "GREATEST(price_history.{column}, EXCLUDED.{column})",
+}
+_HISTORY_COLUMNS = [f"{metric}_{stat}" for metric in HISTORY_METRICS for stat in _HISTORY_STATS]
+HISTORY_PRUNE_INTERVAL = 3600
+_last_history_prune: float | None = None
+
+# Tables that keyed items by name before the item registry, and their name columns
+_NAME_KEYED_TABLES = {
+    "forge_items": ("name",),
+    "forge_recipes": ("item_name", "material"),
+    "forge_requirements": ("item_name",),
+    "ah_sales_hourly": ("item_name",),
+    "ah_sale_batches": ("item_name",),
+    "price_history": ("item_name",),
+}
+_HISTORY_AGGREGATES = {"sum": "SUM", "sq_sum": "SUM", "min": "MIN", "max": "MAX"}
+_MERGED_HISTORY = ", ".join(
+    f"{_HISTORY_AGGREGATES[stat]}(l.{metric}_{stat})" for metric in HISTORY_METRICS for stat in _HISTORY_STATS
+)
+# How each set-aside table is copied into its item-keyed replacement, through the legacy_names mapping
+_LEGACY_COPIES = {
+    "forge_items": """
+        INSERT INTO forge_items (item, duration_hours, content_hash)
+        SELECT DISTINCT ON (n.item) n.item, l.duration_hours, to_jsonb(l) ->> 'content_hash'
+        FROM legacy_forge_items l JOIN legacy_names n ON n.name = l.name
+        ORDER BY n.item
+    """,
+    "forge_recipes": """
+        INSERT INTO forge_recipes (item, material, quantity)
+        SELECT i.item, m.item, MAX(l.quantity)
+        FROM legacy_forge_recipes l
+        JOIN legacy_names i ON i.name = l.item_name
+        JOIN legacy_names m ON m.name = l.material
+        GROUP BY i.item, m.item
+    """,
+    "forge_requirements": """
+        INSERT INTO forge_requirements (item, requirement, level)
+        SELECT n.item, l.requirement, MAX(l.level)
+        FROM legacy_forge_requirements l JOIN legacy_names n ON n.name = l.item_name
+        GROUP BY n.item, l.requirement
+    """,
+    "ah_sales_hourly": """
+        INSERT INTO ah_sales_hourly (item, bucket, quantity, first_recorded_at)
+        SELECT n.item, l.bucket, SUM(l.quantity), MIN(l.first_recorded_at)
+        FROM legacy_ah_sales_hourly l JOIN legacy_names n ON n.name = l.item_name
+        GROUP BY n.item, l.bucket
+    """,
+    "ah_sale_batches": """
+        INSERT INTO ah_sales_hourly (item, bucket, quantity, first_recorded_at)
+        SELECT n.item, date_trunc('hour', l.recorded_at), SUM(l.quantity), MIN(l.recorded_at)
+        FROM legacy_ah_sale_batches l JOIN legacy_names n ON n.name = l.item_name
+        GROUP BY n.item, date_trunc('hour', l.recorded_at)
+        ON CONFLICT (item, bucket) DO NOTHING
+    """,
+    "price_history": f"""
+        INSERT INTO price_history (tier, item, bucket, samples, {", ".join(_HISTORY_COLUMNS)})
+        SELECT l.tier, n.item, l.bucket, SUM(l.samples), {_MERGED_HISTORY}
+        FROM legacy_price_history l JOIN legacy_names n ON n.name = l.item_name
+        GROUP BY l.tier, n.item, l.bucket
+    """,
+}
 
 
 def _get_dsn() -> str:
@@ -14,6 +120,38 @@ def _get_dsn() -> str:
     return f"host={host} dbname={dbname} user={user} password={password}"
 
 
+class CatalogVersion(typing.NamedTuple):
+    version: int  # Bumped on every scrape that changed the catalog
+    content_hash: str | None  # Hash of every item's id and content hash, None while the catalog is empty
+    last_scraped_at: str | None
+    registry_version: int  # Item registry the catalog's names were read from
+
+
+class CatalogSync(typing.NamedTuple):
+    catalog: CatalogVersion
+    inserted: int
+    updated: int
+    deleted: int
+
+
+class RegistrySync(typing.NamedTuple):
+    version: int
+    inserted: int
+    updated: int  # Items renamed, given their Hypixel id, or bound to a different alias
+
+
+def item_hash(info: ForgeItemInfo) -> str:
+    canonical = {"Duration": float(info["Duration"]), "Recipe": info["Recipe"], "Requirements": info["Requirements"]}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def catalog_hash(item_hashes: dict[int, str]) -> str | None:
+    if not item_hashes:
+        return None
+    listing = "".join(f"{item}\0{item_hashes[item]}\n" for item in sorted(item_hashes))
+    return hashlib.sha256(listing.encode()).hexdigest()
+
+
 def wait_for_db(retries: int = 10, delay: int = 3) -> psycopg2.extensions.connection:
     dsn = _get_dsn()
     for attempt in range(retries):
@@ -29,126 +167,544 @@ def wait_for_db(retries: int = 10, delay: int = 3) -> psycopg2.extensions.connec
     raise RuntimeError("Unreachable")
 
 
+class _PooledConnection(psycopg2.extensions.connection):
+    """A connection that notes whether the operation holding it has called commit(), after which its work may
+    already be applied even if the call failed.
+    """
+
+    committed = False
+
+    def commit(self) -> None:
+        self.committed = True
+        super().commit()
+
+
+class ConnectionPool:
+    """Thread-safe pool of database connections for one server process.
+    Connections are checked before they are handed out: closed ones, ones left mid-transaction and ones idle for
+    longer than IDLE_CHECK seconds that no longer answer a ping are replaced with fresh ones.
+    """
+
+    IDLE_CHECK = 30
+
+    def __init__(self, min_connections: int, max_connections: int) -> None:
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            min_connections, max_connections, _get_dsn(), connection_factory=_PooledConnection
+        )
+        self._last_used: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def _healthy(self, conn: psycopg2.extensions.connection) -> bool:
+        if conn.closed or conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        with self._lock:
+            last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < self.IDLE_CHECK:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn: psycopg2.extensions.connection) -> None:
+        CONNECTIONS_DISCARDED.inc()
+        with self._lock:
+            self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    @contextlib.contextmanager
+    def connection(self) -> typing.Iterator[_PooledConnection]:
+        """Borrow a healthy connection. Uncommitted work is rolled back on return; broken connections are dropped."""
+        conn = self._pool.getconn()
+        while not self._healthy(conn):
+            self._discard(conn)
+            conn = self._pool.getconn()
+        conn.committed = False
+        CONNECTIONS_IN_USE.inc()
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self._discard(conn)
+            raise
+        except BaseException:
+            self._release(conn)
+            raise
+        finally:
+            CONNECTIONS_IN_USE.dec()
+        self._release(conn)
+
+    def _release(self, conn: psycopg2.extensions.connection) -> None:
+        if conn.closed:
+            self._discard(conn)
+            return
+        # End read-only transactions so pooled connections never sit idle in a transaction
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                self._discard(conn)
+                return
+        with self._lock:
+            self._last_used[id(conn)] = time.monotonic()
+        self._pool.putconn(conn)
+
+    def run(self, operation: typing.Callable[..., T], *args: typing.Any) -> T:
+        """Run operation(conn, *args) on a pooled connection. If the connection was lost before the operation
+        called commit(), the server rolled its work back, so it is retried once on a fresh connection. Other
+        errors, like serialization failures, cancelled queries or losing the connection during or after a
+        commit, are raised: a retry would wait on the same failure, or apply a write twice.
+        """
+        with OPERATION_SECONDS.labels(operation.__name__).time():
+            conn: _PooledConnection | None = None
+            try:
+                with self.connection() as conn:
+                    return operation(conn, *args)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                # Errors the server reported carry a SQLSTATE; a lost connection has none
+                reported = e.pgcode is not None or isinstance(
+                    e, (psycopg2.extensions.TransactionRollbackError, psycopg2.extensions.QueryCanceledError)
+                )
+                if reported or (conn is not None and conn.committed):
+                    raise
+                OPERATION_RETRIES.inc()
+            with self.connection() as conn:
+                return operation(conn, *args)
+
+    def close(self) -> None:
+        self._pool.closeall()
+
+
 def init_schema(conn: psycopg2.extensions.connection) -> None:
     with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                id      INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                item_id TEXT UNIQUE,
+                name    TEXT NOT NULL
+            )
+        """)
+        # Normalized names bound to an item explicitly, overriding what their display name would resolve to
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS item_aliases (
+                alias TEXT PRIMARY KEY,
+                item  INTEGER NOT NULL REFERENCES items(id)
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS item_registry (
+                id      BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                version BIGINT NOT NULL DEFAULT 0
+            )
+        """)
+        cur.execute("INSERT INTO item_registry DEFAULT VALUES ON CONFLICT (id) DO NOTHING")
+        # Tables from before the item registry are set aside and copied back keyed by item id once it exists
+        cur.execute(
+            """
+            SELECT DISTINCT table_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = ANY(%s) AND column_name IN ('name', 'item_name')
+            """,
+            (list(_NAME_KEYED_TABLES),),
+        )
+        found = {row[0] for row in cur.fetchall()}
+        legacy = [table for table in _NAME_KEYED_TABLES if table in found]
+        for table in legacy:
+            cur.execute(f"CREATE TEMP TABLE legacy_{table} ON COMMIT DROP AS SELECT * FROM {table}")
+        if legacy:
+            cur.execute(f"DROP TABLE {', '.join(legacy)} CASCADE")
+
         cur.execute("""
             CREATE TABLE IF NOT EXISTS forge_items (
-                name TEXT PRIMARY KEY,
-                duration_hours REAL NOT NULL
+                item           INTEGER PRIMARY KEY REFERENCES items(id),
+                duration_hours REAL NOT NULL,
+                content_hash   TEXT
             )
         """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS forge_catalog (
+                id              BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                last_scraped_at TIMESTAMPTZ
+            )
+        """)
+        cur.execute("ALTER TABLE forge_catalog ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0")
+        cur.execute("ALTER TABLE forge_catalog ADD COLUMN IF NOT EXISTS content_hash TEXT")
+        cur.execute("INSERT INTO forge_catalog DEFAULT VALUES ON CONFLICT (id) DO NOTHING")
         cur.execute("""
             CREATE TABLE IF NOT EXISTS forge_recipes (
-                item_name TEXT NOT NULL REFERENCES forge_items(name) ON DELETE CASCADE,
-                material  TEXT NOT NULL,
-                quantity  INTEGER NOT NULL,
-                PRIMARY KEY (item_name, material)
+                item     INTEGER NOT NULL REFERENCES forge_items(item) ON DELETE CASCADE,
+                material INTEGER NOT NULL REFERENCES items(id),
+                quantity INTEGER NOT NULL,
+                PRIMARY KEY (item, material)
             )
         """)
         cur.execute("""
             CREATE TABLE IF NOT EXISTS forge_requirements (
-                item_name   TEXT NOT NULL REFERENCES forge_items(name) ON DELETE CASCADE,
+                item        INTEGER NOT NULL REFERENCES forge_items(item) ON DELETE CASCADE,
                 requirement TEXT NOT NULL,
                 level       INTEGER NOT NULL,
-                PRIMARY KEY (item_name, requirement)
+                PRIMARY KEY (item, requirement)
+            )
+        """)
+        # Sales are rolled up per item and hour as they arrive; first_recorded_at keeps the exact start of data
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS ah_sales_hourly (
+                item              INTEGER NOT NULL,
+                bucket            TIMESTAMPTZ NOT NULL,
+                quantity          INT NOT NULL,
+                first_recorded_at TIMESTAMPTZ NOT NULL,
+                PRIMARY KEY (item, bucket)
             )
         """)
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS ah_sale_batches (
-                id          SERIAL PRIMARY KEY,
-                item_name   TEXT NOT NULL,
-                quantity    INT  NOT NULL,
-                recorded_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            CREATE INDEX IF NOT EXISTS idx_ah_sales_hourly_bucket
+                ON ah_sales_hourly (bucket)
+        """)
+        # One row per tier, item and bucket; every metric keeps sum, sum of squares, min and max of its samples
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS price_history (
+                tier              TEXT NOT NULL,
+                item              INTEGER NOT NULL,
+                bucket            TIMESTAMPTZ NOT NULL,
+                samples           INT NOT NULL,
+                cost_sum          DOUBLE PRECISION NOT NULL,
+                cost_sq_sum       DOUBLE PRECISION NOT NULL,
+                cost_min          BIGINT NOT NULL,
+                cost_max          BIGINT NOT NULL,
+                sell_value_sum    DOUBLE PRECISION NOT NULL,
+                sell_value_sq_sum DOUBLE PRECISION NOT NULL,
+                sell_value_min    BIGINT NOT NULL,
+                sell_value_max    BIGINT NOT NULL,
+                profit_sum        DOUBLE PRECISION NOT NULL,
+                profit_sq_sum     DOUBLE PRECISION NOT NULL,
+                profit_min        BIGINT NOT NULL,
+                profit_max        BIGINT NOT NULL,
+                PRIMARY KEY (tier, item, bucket)
             )
         """)
         cur.execute("""
-            CREATE INDEX IF NOT EXISTS idx_ah_sale_batches_lookup
-                ON ah_sale_batches (item_name, recorded_at)
+            CREATE INDEX IF NOT EXISTS idx_price_history_retention
+                ON price_history (tier, bucket)
         """)
+        if legacy:
+            _copy_legacy_tables(cur, legacy)
     conn.commit()
 
 
+def _copy_legacy_tables(cur: psycopg2.extensions.cursor, tables: list[str]) -> None:
+    """Copy name-keyed tables set aside by init_schema into their replacements, registering every name they use.
+    Rows of names that now resolve to the same item are merged; raw per-poll sale batches are folded into hours.
+    """
+    names: set[str] = set()
+    for table in tables:
+        for column in _NAME_KEYED_TABLES[table]:
+            cur.execute(f"SELECT DISTINCT {column} FROM legacy_{table}")
+            names.update(row[0] for row in cur.fetchall())
+    cur.execute("SELECT version FROM item_registry FOR UPDATE")
+    ids = _register_names(cur, names)
+    cur.execute("CREATE TEMP TABLE legacy_names (name TEXT PRIMARY KEY, item INTEGER NOT NULL) ON COMMIT DROP")
+    psycopg2.extras.execute_values(cur, "INSERT INTO legacy_names (name, item) VALUES %s", list(ids.items()))
+    for table in tables:
+        cur.execute(_LEGACY_COPIES[table])
+    if "forge_items" in tables:
+        # Catalog hashes now cover item ids; items from before content hashes have none and are rewritten next sync
+        cur.execute("SELECT item, content_hash FROM forge_items")
+        hashes: dict[int, str | None] = dict(cur.fetchall())
+        complete = {item: content_hash for item, content_hash in hashes.items() if content_hash is not None}
+        new_hash = catalog_hash(complete) if len(complete) == len(hashes) else None
+        cur.execute("UPDATE forge_catalog SET content_hash = %s", (new_hash,))
+
+
+def _read_item_registry(cur: psycopg2.extensions.cursor) -> ItemRegistry:
+    cur.execute("SELECT version FROM item_registry")
+    version: int = cur.fetchone()[0]
+    cur.execute("SELECT id, item_id, name FROM items")
+    registered = [RegistryItem(*row) for row in cur.fetchall()]
+    cur.execute("SELECT alias, item FROM item_aliases")
+    return ItemRegistry(version, registered, dict(cur.fetchall()))
+
+
+def read_item_registry(conn: psycopg2.extensions.connection) -> ItemRegistry:
+    with conn.cursor() as cur:
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        return _read_item_registry(cur)
+
+
+def read_registry_version(conn: psycopg2.extensions.connection) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM item_registry")
+        version: int = cur.fetchone()[0]
+        return version
+
+
+def _register_names(cur: psycopg2.extensions.cursor, names: typing.Collection[str]) -> dict[str, int]:
+    """Item ids of names, adding an item for each name the registry cannot resolve.
+    The caller holds the item_registry row lock.
+    """
+    registry = _read_item_registry(cur)
+    ids: dict[str, int] = {}
+    unknown: dict[str, str] = {}  # Normalized name -> display name
+    for name in names:
+        item = registry.resolve(name)
+        if item is not None:
+            ids[name] = item
+        else:
+            unknown.setdefault(normalize(name), display_name(name))
+    if unknown:
+        added = psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO items (name) VALUES %s RETURNING id, name",
+            [(name,) for name in unknown.values()],
+            fetch=True,
+        )
+        by_name = {normalize(name): item for item, name in added}
+        for name in names:
+            if name not in ids:
+                ids[name] = by_name[normalize(name)]
+        cur.execute("UPDATE item_registry SET version = version + 1")
+    return ids
+
+
+def upsert_items(
+    conn: psycopg2.extensions.connection,
+    listed: dict[str, str],
+    aliases: dict[str, str],
+) -> RegistrySync:
+    """Register Hypixel's item list ({item_id: name}) and the names wiki pages give items ({name: item_id}).
+    A listed item whose name the forge catalog registered before the list had it takes over that name's id, so
+    nothing stored against the id has to move. The registry version is bumped whenever anything changed.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM item_registry FOR UPDATE")
+        registry = _read_item_registry(cur)
+        new: list[tuple[str, str]] = []
+        renamed: list[tuple[int, str]] = []
+        adopted: dict[int, tuple[int, str, str]] = {}
+        for item_id, listed_name in listed.items():
+            name = display_name(listed_name)
+            item = registry.by_item_id(item_id)
+            if item is not None:
+                if registry.name(item) != name:
+                    renamed.append((item, name))
+                continue
+            item = registry.resolve(name)
+            if item is not None and registry.item_id(item) is None and item not in adopted:
+                adopted[item] = (item, item_id, name)
+            else:
+                new.append((item_id, name))
+        psycopg2.extras.execute_values(
+            cur, "UPDATE items SET name = v.name FROM (VALUES %s) AS v (id, name) WHERE items.id = v.id", renamed
+        )
+        psycopg2.extras.execute_values(
+            cur,
+            "UPDATE items SET item_id = v.item_id, name = v.name FROM (VALUES %s) AS v (id, item_id, name) "
+            "WHERE items.id = v.id",
+            list(adopted.values()),
+        )
+        psycopg2.extras.execute_values(cur, "INSERT INTO items (item_id, name) VALUES %s", new, page_size=1000)
+
+        cur.execute("SELECT item_id, id FROM items WHERE item_id IS NOT NULL")
+        by_item_id: dict[str, int] = dict(cur.fetchall())
+        cur.execute("SELECT alias, item FROM item_aliases")
+        stored: dict[str, int] = dict(cur.fetchall())
+        rebound: dict[str, int] = {}
+        for name, item_id in aliases.items():
+            item = by_item_id.get(item_id)
+            if item is not None and stored.get(normalize(name)) != item:
+                rebound[normalize(name)] = item
+        psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO item_aliases (alias, item) VALUES %s ON CONFLICT (alias) DO UPDATE SET item = EXCLUDED.item",
+            list(rebound.items()),
+        )
+
+        updated = len(renamed) + len(adopted) + len(rebound)
+        version = registry.version
+        if new or updated:
+            cur.execute("UPDATE item_registry SET version = version + 1 RETURNING version")
+            version = cur.fetchone()[0]
+    conn.commit()
+    return RegistrySync(version, len(new), updated)
+
+
 def upsert_forge_items(
     conn: psycopg2.extensions.connection,
     items: dict[str, ForgeItemInfo],
-) -> None:
+) -> CatalogSync:
+    """Sync the forge catalog to items, touching only the items whose content hash changed.
+    Item and material names are stored as item ids, registering names the item registry does not know yet; names
+    that resolve to the same item keep the last one's content.
+    The catalog version is bumped whenever anything changed; an identical scrape only records its time.
+    """
     with conn.cursor() as cur:
-        cur.execute("DELETE FROM forge_items")
-        for name, info in items.items():
-            cur.execute(
-                "INSERT INTO forge_items (name, duration_hours) VALUES (%s, %s)",
-                (name, info["Duration"]),
-            )
-            for material, quantity in info["Recipe"].items():
-                cur.execute(
-                    "INSERT INTO forge_recipes (item_name, material, quantity) VALUES (%s, %s, %s)",
-                    (name, material, quantity),
-                )
-            for requirement, level in info["Requirements"].items():
-                cur.execute(
-                    "INSERT INTO forge_requirements (item_name, requirement, level) VALUES (%s, %s, %s)",
-                    (name, requirement, level),
-                )
+        # Locking the catalog row serializes concurrent syncs, the registry row concurrent registrations
+        cur.execute("SELECT version, content_hash FROM forge_catalog FOR UPDATE")
+        version, current_hash = cur.fetchone()
+        cur.execute("SELECT version FROM item_registry FOR UPDATE")
+        ids = _register_names(cur, {*items, *(material for info in items.values() for material in info["Recipe"])})
+        cur.execute("SELECT version FROM item_registry")
+        registry_version: int = cur.fetchone()[0]
+        by_id = {ids[name]: info for name, info in items.items()}
+        hashes = {item: item_hash(info) for item, info in by_id.items()}
+        new_catalog_hash = catalog_hash(hashes)
+        if current_hash == new_catalog_hash:
+            cur.execute("UPDATE forge_catalog SET last_scraped_at = NOW() RETURNING last_scraped_at")
+            last_scraped_at = cur.fetchone()[0]
+            conn.commit()
+            catalog = CatalogVersion(version, current_hash, last_scraped_at.isoformat(), registry_version)
+            return CatalogSync(catalog, 0, 0, 0)
+
+        cur.execute("SELECT item, content_hash FROM forge_items")
+        stored: dict[int, str | None] = dict(cur.fetchall())
+        deleted = [item for item in stored if item not in hashes]
+        changed = [item for item, content_hash in hashes.items() if stored.get(item, "") != content_hash]
+        updated = [item for item in changed if item in stored]
+
+        # Removed items take their recipes and requirements with them through ON DELETE CASCADE
+        cur.execute("DELETE FROM forge_items WHERE item = ANY(%s)", (deleted,))
+        cur.execute("DELETE FROM forge_recipes WHERE item = ANY(%s)", (updated,))
+        cur.execute("DELETE FROM forge_requirements WHERE item = ANY(%s)", (updated,))
+        psycopg2.extras.execute_values(
+            cur,
+            """
+            INSERT INTO forge_items (item, duration_hours, content_hash) VALUES %s
+            ON CONFLICT (item) DO UPDATE
+                SET duration_hours = EXCLUDED.duration_hours, content_hash = EXCLUDED.content_hash
+            """,
+            [(item, by_id[item]["Duration"], hashes[item]) for item in changed],
+            page_size=1000,
+        )
+        psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO forge_recipes (item, material, quantity) VALUES %s",
+            [
+                (item, ids[material], quantity)
+                for item in changed
+                for material, quantity in by_id[item]["Recipe"].items()
+            ],
+            page_size=1000,
+        )
+        psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO forge_requirements (item, requirement, level) VALUES %s",
+            [
+                (item, requirement, level)
+                for item in changed
+                for requirement, level in by_id[item]["Requirements"].items()
+            ],
+            page_size=1000,
+        )
+        cur.execute(
+            """
+            UPDATE forge_catalog SET version = version + 1, content_hash = %s, last_scraped_at = NOW()
+            RETURNING version, last_scraped_at
+            """,
+            (new_catalog_hash,),
+        )
+        version, last_scraped_at = cur.fetchone()
     conn.commit()
+    return CatalogSync(
+        CatalogVersion(version, new_catalog_hash, last_scraped_at.isoformat(), registry_version),
+        len(changed) - len(updated),
+        len(updated),
+        len(deleted),
+    )
 
 
-def read_forge_items(conn: psycopg2.extensions.connection) -> dict[str, ForgeItemInfo]:
+def read_catalog_version(conn: psycopg2.extensions.connection) -> CatalogVersion:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT forge_catalog.version, content_hash, last_scraped_at, item_registry.version
+            FROM forge_catalog, item_registry
+        """)
+        version, content_hash, last_scraped_at, registry_version = cur.fetchone()
+        return CatalogVersion(
+            version, content_hash, last_scraped_at.isoformat() if last_scraped_at else None, registry_version
+        )
+
+
+def read_forge_items(
+    conn: psycopg2.extensions.connection,
+) -> tuple[dict[str, ForgeItemInfo], dict[str, int], CatalogVersion]:
+    """Read every forge item by its registry name, the item id of every item and material name used, and the
+    catalog version they belong to. The reads share one snapshot, so a concurrent sync is seen entirely or not at all.
+    """
     items: dict[str, ForgeItemInfo] = {}
+    ids: dict[str, int] = {}
+    names: dict[int, str] = {}
 
     with conn.cursor() as cur:
-        cur.execute("SELECT name, duration_hours FROM forge_items")
-        for row in cur.fetchall():
-            name: str = row[0]
-            duration: float = row[1]
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        catalog = read_catalog_version(conn)
+
+        cur.execute("SELECT item, name, duration_hours FROM forge_items JOIN items ON items.id = forge_items.item")
+        for item, name, duration in cur.fetchall():
+            names[item] = name
+            ids[name] = item
             items[name] = ForgeItemInfo({"Duration": duration, "Recipe": {}, "Requirements": {}})
 
-        cur.execute("SELECT item_name, material, quantity FROM forge_recipes")
-        for row in cur.fetchall():
-            items[row[0]]["Recipe"][row[1]] = row[2]
+        cur.execute("SELECT item, material, name, quantity FROM forge_recipes JOIN items ON items.id = material")
+        for item, material, material_name, quantity in cur.fetchall():
+            items[names[item]]["Recipe"][material_name] = quantity
+            ids[material_name] = material
 
-        cur.execute("SELECT item_name, requirement, level FROM forge_requirements")
-        for row in cur.fetchall():
-            items[row[0]]["Requirements"][row[1]] = row[2]
+        cur.execute("SELECT item, requirement, level FROM forge_requirements")
+        for item, requirement, level in cur.fetchall():
+            items[names[item]]["Requirements"][requirement] = level
 
-    return items
+    return items, ids, catalog
 
 
 def insert_ah_sale_batch(
     conn: psycopg2.extensions.connection,
-    sales: dict[str, int],
+    sales: dict[int, int],
 ) -> None:
+    """Add one batch of AH sales ({item: quantity}) to the current hourly buckets, keeping only forge items."""
+    global _last_ah_sales_prune
     with conn.cursor() as cur:
-        for item_name, quantity in sales.items():
-            cur.execute(
-                """
-                INSERT INTO ah_sale_batches (item_name, quantity)
-                SELECT %s, %s WHERE EXISTS (SELECT 1 FROM forge_items WHERE name = %s)
-                """,
-                (item_name, quantity, item_name),
-            )
-        # Prune rows older than 8 days to keep the table lean
-        cur.execute("DELETE FROM ah_sale_batches WHERE recorded_at < NOW() - INTERVAL '8 days'")
+        psycopg2.extras.execute_values(
+            cur,
+            """
+            INSERT INTO ah_sales_hourly (item, bucket, quantity, first_recorded_at)
+            SELECT batch.item, date_trunc('hour', NOW()), batch.quantity, NOW()
+            FROM (VALUES %s) AS batch (item, quantity)
+            JOIN forge_items ON forge_items.item = batch.item
+            ON CONFLICT (item, bucket) DO UPDATE SET quantity = ah_sales_hourly.quantity + EXCLUDED.quantity
+            """,
+            list(sales.items()),
+            page_size=1000,
+        )
+        # Retention is whole buckets older than 8 days, at most once per bucket
+        if _last_ah_sales_prune is None or time.monotonic() - _last_ah_sales_prune >= AH_SALES_PRUNE_INTERVAL:
+            cur.execute("DELETE FROM ah_sales_hourly WHERE bucket < NOW() - INTERVAL '8 days'")
+            _last_ah_sales_prune = time.monotonic()
     conn.commit()
 
 
-def read_ah_weekly_sales(conn: psycopg2.extensions.connection) -> dict[str, int]:
-    """Read 7-day AH sales totals by item.
-    Returns {item_name: total_quantity}.
+def read_ah_weekly_sales(conn: psycopg2.extensions.connection) -> dict[int, int]:
+    """Read 7-day AH sales totals by item from the hourly buckets.
+    The bucket straddling the start of the window counts pro rata, so totals slide smoothly instead of hourly.
+    Returns {item: total_quantity}.
     Estimation logic is handled by the calculator.
     """
     with conn.cursor() as cur:
         cur.execute("""
-            SELECT 
-                item_name,
-                SUM(quantity) as total
-            FROM ah_sale_batches
-            WHERE recorded_at > NOW() - INTERVAL '7 days'
-            GROUP BY item_name
+            SELECT
+                item,
+                ROUND(SUM(
+                    CASE WHEN bucket >= window_start THEN quantity
+                    ELSE quantity * EXTRACT(EPOCH FROM bucket + INTERVAL '1 hour' - window_start) / 3600
+                    END
+                ))::INT AS total
+            FROM ah_sales_hourly, (SELECT NOW() - INTERVAL '7 days' AS window_start) AS w
+            WHERE bucket > window_start - INTERVAL '1 hour'
+            GROUP BY item
         """)
-        result: dict[str, int] = {}
+        result: dict[int, int] = {}
         for row in cur.fetchall():
-            item_name, total = row
-            result[item_name] = total
+            item, total = row
+            result[item] = total
         return result
 
 
@@ -158,8 +714,102 @@ def read_ah_oldest_record_time(conn: psycopg2.extensions.connection) -> str | No
     Used by calculator to determine actual data collection span for accurate extrapolation.
     """
     with conn.cursor() as cur:
-        cur.execute("SELECT MIN(recorded_at) FROM ah_sale_batches")
+        cur.execute("SELECT MIN(first_recorded_at) FROM ah_sales_hourly")
         result = cur.fetchone()
         if result and result[0]:
             return result[0].isoformat()
         return None
+
+
+def _history_bucket(tier: HistoryTier, recorded_at: datetime) -> datetime:
+    if not tier.width:
+        return recorded_at
+    width = tier.width.total_seconds()
+    return datetime.fromtimestamp(recorded_at.timestamp() // width * width, timezone.utc)
+
+
+def insert_price_history(
+    conn: psycopg2.extensions.connection,
+    recorded_at: datetime,
+    samples: dict[int, PriceSample],
+) -> None:
+    """Fold one calculation cycle's per-item prices and profits into every history tier."""
+    global _last_history_prune
+    rows = []
+    for tier in HISTORY_TIERS:
+        bucket = _history_bucket(tier, recorded_at)
+        for item, sample in samples.items():
+            row: list[typing.Any] = [tier.name, item, bucket, 1]
+            for key in HISTORY_METRICS.values():
+                value = sample[key]  # type: ignore[literal-required]
+                row += [value, float(value) ** 2, value, value]
+            rows.append(tuple(row))
+    updates = ", ".join(
+        f"{metric}_{stat} = " + merge.format(column=f"{metric}_{stat}")
+        for metric in HISTORY_METRICS
+        for stat, merge in _HISTORY_STATS.items()
+    )
+    with conn.cursor() as cur:
+        psycopg2.extras.execute_values(
+            cur,
+            f"""
+            INSERT INTO price_history (tier, item, bucket, samples, {", ".join(_HISTORY_COLUMNS)}) VALUES %s
+            ON CONFLICT (tier, item, bucket) DO UPDATE
+                SET samples = price_history.samples + EXCLUDED.samples, {updates}
+            """,
+            rows,
+            page_size=1000,
+        )
+        if _last_history_prune is None or time.monotonic() - _last_history_prune >= HISTORY_PRUNE_INTERVAL:
+            for tier in HISTORY_TIERS:
+                cur.execute(
+                    "DELETE FROM price_history WHERE tier = %s AND bucket < NOW() - %s",
+                    (tier.name, tier.retention),
+                )
+            _last_history_prune = time.monotonic()
+    conn.commit()
+
+
+def choose_history_tier(since: datetime, until: datetime, max_points: int) -> HistoryTier:
+    """The finest tier that still holds data back to since and spans the range in at most max_points points."""
+    oldest_needed = datetime.now(timezone.utc) - since
+    for tier in HISTORY_TIERS:
+        if tier.retention >= oldest_needed and (until - since) / tier.nominal_width <= max_points:
+            return tier
+    return HISTORY_TIERS[-1]
+
+
+def read_price_history(
+    conn: psycopg2.extensions.connection,
+    item: int,
+    since: datetime,
+    until: datetime,
+    max_points: int,
+) -> tuple[str, list[dict[str, typing.Any]]]:
+    """Read an item's price and profit series from the tier that best fits the range.
+    Returns (tier_name, points); each point has the bucket start, sample count and avg/min/max/stddev per metric.
+    """
+    tier = choose_history_tier(since, until, max_points)
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT bucket, samples, {", ".join(_HISTORY_COLUMNS)} FROM price_history
+            WHERE tier = %s AND item = %s AND bucket >= %s AND bucket <= %s
+            ORDER BY bucket
+            """,
+            (tier.name, item, _history_bucket(tier, since), until),
+        )
+        points: list[dict[str, typing.Any]] = []
+        for bucket, samples, *stats in cur.fetchall():
+            point: dict[str, typing.Any] = {"bucket": bucket.isoformat(), "samples": samples}
+            for i, key in enumerate(HISTORY_METRICS.values()):
+                total, squares, low, high = stats[4 * i : 4 * i + 4]
+                mean = total / samples
+                point[key] = {
+                    "avg": round(mean),
+                    "min": low,
+                    "max": high,
+                    "stddev": round(max(squares / samples - mean * mean, 0.0) ** 0.5),
+                }
+            points.append(point)
+    return tier.name, points
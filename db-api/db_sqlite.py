@@ -0,0 +1,393 @@
+"""SQLite implementation of db.py's storage functions, for the single-process embedded mode.
+
+Every function takes a sqlite3 connection where db.py takes a psycopg2 one and returns the same values, so callers
+pick a backend module and otherwise do not care which one they hold. Hashes, history tiers and the result types
+are db.py's own, so both backends agree on catalog versions. Timestamps are stored as epoch seconds.
+"""
+
+import sqlite3
+import threading
+import time
+import typing
+from datetime import datetime, timezone
+
+import db
+from db import CatalogSync, CatalogVersion, RegistrySync, catalog_hash, item_hash
+
+from common.items import ItemRegistry, RegistryItem, display_name, normalize
+from common.types import ForgeItemInfo, PriceSample
+
+T = typing.TypeVar("T")
+
+_HOUR = 3600.0
+_WEEK = 7 * 86400.0
+_SALES_RETENTION = 8 * 86400.0
+_last_ah_sales_prune: float | None = None
+_last_history_prune: float | None = None
+
+# How a new sample merges into an existing history bucket, per aggregate column
+_HISTORY_MERGES = {
+    "sum": "{column} + excluded.{column}",
+    "sq_sum": "{column} + excluded.{column}",
+    "min": "MIN({column}, excluded.{column})",
+    "max": "MAX({column}, excluded.{column})",
+}
+_HISTORY_COLUMNS = [f"{metric}_{stat}" for metric in db.HISTORY_METRICS for stat in _HISTORY_MERGES]
+
+
+def _iso(timestamp: float | None) -> str | None:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp is not None else None
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open the database at path, shared by every thread of the process through ConnectionPool."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+class ConnectionPool:
+    """db.ConnectionPool's interface over one connection. SQLite serializes writers anyway, so operations simply
+    take turns; none of them does I/O other than the database's own.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+
+    def run(self, operation: typing.Callable[..., T], *args: typing.Any) -> T:
+        with db.OPERATION_SECONDS.labels(operation.__name__).time(), self._lock:
+            try:
+                return operation(self._conn, *args)
+            finally:
+                if self._conn.in_transaction:
+                    self._conn.rollback()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def init_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS items (
+            id      INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id TEXT UNIQUE,
+            name    TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS item_aliases (
+            alias TEXT PRIMARY KEY,
+            item  INTEGER NOT NULL REFERENCES items(id)
+        );
+        CREATE TABLE IF NOT EXISTS item_registry (
+            id      INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO item_registry (id) VALUES (1);
+        CREATE TABLE IF NOT EXISTS forge_items (
+            item           INTEGER PRIMARY KEY REFERENCES items(id),
+            duration_hours REAL NOT NULL,
+            content_hash   TEXT
+        );
+        CREATE TABLE IF NOT EXISTS forge_catalog (
+            id              INTEGER PRIMARY KEY CHECK (id = 1),
+            version         INTEGER NOT NULL DEFAULT 0,
+            content_hash    TEXT,
+            last_scraped_at REAL
+        );
+        INSERT OR IGNORE INTO forge_catalog (id) VALUES (1);
+        CREATE TABLE IF NOT EXISTS forge_recipes (
+            item     INTEGER NOT NULL REFERENCES forge_items(item) ON DELETE CASCADE,
+            material INTEGER NOT NULL REFERENCES items(id),
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (item, material)
+        );
+        CREATE TABLE IF NOT EXISTS forge_requirements (
+            item        INTEGER NOT NULL REFERENCES forge_items(item) ON DELETE CASCADE,
+            requirement TEXT NOT NULL,
+            level       INTEGER NOT NULL,
+            PRIMARY KEY (item, requirement)
+        );
+        CREATE TABLE IF NOT EXISTS ah_sales_hourly (
+            item              INTEGER NOT NULL,
+            bucket            REAL NOT NULL,
+            quantity          INTEGER NOT NULL,
+            first_recorded_at REAL NOT NULL,
+            PRIMARY KEY (item, bucket)
+        );
+        CREATE INDEX IF NOT EXISTS idx_ah_sales_hourly_bucket ON ah_sales_hourly (bucket);
+        CREATE TABLE IF NOT EXISTS price_history (
+            tier    TEXT NOT NULL,
+            item    INTEGER NOT NULL,
+            bucket  REAL NOT NULL,
+            samples INTEGER NOT NULL,
+            {", ".join(f"{column} {'REAL' if 'sum' in column else 'INTEGER'} NOT NULL" for column in _HISTORY_COLUMNS)},
+            PRIMARY KEY (tier, item, bucket)
+        );
+        CREATE INDEX IF NOT EXISTS idx_price_history_retention ON price_history (tier, bucket);
+    """)
+    conn.commit()
+
+
+def _read_item_registry(conn: sqlite3.Connection) -> ItemRegistry:
+    (version,) = conn.execute("SELECT version FROM item_registry").fetchone()
+    registered = [RegistryItem(*row) for row in conn.execute("SELECT id, item_id, name FROM items")]
+    aliases = dict(conn.execute("SELECT alias, item FROM item_aliases").fetchall())
+    return ItemRegistry(version, registered, aliases)
+
+
+def read_item_registry(conn: sqlite3.Connection) -> ItemRegistry:
+    return _read_item_registry(conn)
+
+
+def read_registry_version(conn: sqlite3.Connection) -> int:
+    version: int = conn.execute("SELECT version FROM item_registry").fetchone()[0]
+    return version
+
+
+def _register_names(conn: sqlite3.Connection, names: typing.Collection[str]) -> dict[str, int]:
+    """Item ids of names, adding an item for each name the registry cannot resolve."""
+    registry = _read_item_registry(conn)
+    ids: dict[str, int] = {}
+    added: dict[str, int] = {}  # Normalized name -> new item
+    for name in names:
+        item = registry.resolve(name)
+        if item is None and (item := added.get(normalize(name))) is None:
+            cursor = conn.execute("INSERT INTO items (name) VALUES (?)", (display_name(name),))
+            item = added[normalize(name)] = typing.cast(int, cursor.lastrowid)
+        ids[name] = item
+    if added:
+        conn.execute("UPDATE item_registry SET version = version + 1")
+    return ids
+
+
+def upsert_items(conn: sqlite3.Connection, listed: dict[str, str], aliases: dict[str, str]) -> RegistrySync:
+    """See db.upsert_items."""
+    registry = _read_item_registry(conn)
+    new: list[tuple[str, str]] = []
+    renamed: list[tuple[str, int]] = []
+    adopted: dict[int, tuple[str, str, int]] = {}
+    for item_id, listed_name in listed.items():
+        name = display_name(listed_name)
+        item = registry.by_item_id(item_id)
+        if item is not None:
+            if registry.name(item) != name:
+                renamed.append((name, item))
+            continue
+        item = registry.resolve(name)
+        if item is not None and registry.item_id(item) is None and item not in adopted:
+            adopted[item] = (item_id, name, item)
+        else:
+            new.append((item_id, name))
+    conn.executemany("UPDATE items SET name = ? WHERE id = ?", renamed)
+    conn.executemany("UPDATE items SET item_id = ?, name = ? WHERE id = ?", adopted.values())
+    conn.executemany("INSERT INTO items (item_id, name) VALUES (?, ?)", new)
+
+    by_item_id = dict(conn.execute("SELECT item_id, id FROM items WHERE item_id IS NOT NULL").fetchall())
+    stored = dict(conn.execute("SELECT alias, item FROM item_aliases").fetchall())
+    rebound: dict[str, int] = {}
+    for name, item_id in aliases.items():
+        item = by_item_id.get(item_id)
+        if item is not None and stored.get(normalize(name)) != item:
+            rebound[normalize(name)] = item
+    conn.executemany(
+        "INSERT INTO item_aliases (alias, item) VALUES (?, ?) ON CONFLICT (alias) DO UPDATE SET item = excluded.item",
+        rebound.items(),
+    )
+
+    updated = len(renamed) + len(adopted) + len(rebound)
+    version = registry.version
+    if new or updated:
+        (version,) = conn.execute("UPDATE item_registry SET version = version + 1 RETURNING version").fetchone()
+    conn.commit()
+    return RegistrySync(version, len(new), updated)
+
+
+def upsert_forge_items(conn: sqlite3.Connection, items: dict[str, ForgeItemInfo]) -> CatalogSync:
+    """See db.upsert_forge_items."""
+    version, current_hash = conn.execute("SELECT version, content_hash FROM forge_catalog").fetchone()
+    ids = _register_names(conn, {*items, *(material for info in items.values() for material in info["Recipe"])})
+    registry_version = read_registry_version(conn)
+    by_id = {ids[name]: info for name, info in items.items()}
+    hashes = {item: item_hash(info) for item, info in by_id.items()}
+    new_catalog_hash = catalog_hash(hashes)
+    now = time.time()
+    if current_hash == new_catalog_hash:
+        conn.execute("UPDATE forge_catalog SET last_scraped_at = ?", (now,))
+        conn.commit()
+        return CatalogSync(CatalogVersion(version, current_hash, _iso(now), registry_version), 0, 0, 0)
+
+    stored: dict[int, str | None] = dict(conn.execute("SELECT item, content_hash FROM forge_items").fetchall())
+    deleted = [item for item in stored if item not in hashes]
+    changed = [item for item, content_hash in hashes.items() if stored.get(item, "") != content_hash]
+    updated = [item for item in changed if item in stored]
+
+    conn.executemany("DELETE FROM forge_items WHERE item = ?", ((item,) for item in deleted))
+    conn.executemany("DELETE FROM forge_recipes WHERE item = ?", ((item,) for item in updated))
+    conn.executemany("DELETE FROM forge_requirements WHERE item = ?", ((item,) for item in updated))
+    conn.executemany(
+        """
+        INSERT INTO forge_items (item, duration_hours, content_hash) VALUES (?, ?, ?)
+        ON CONFLICT (item) DO UPDATE SET duration_hours = excluded.duration_hours, content_hash = excluded.content_hash
+        """,
+        ((item, by_id[item]["Duration"], hashes[item]) for item in changed),
+    )
+    conn.executemany(
+        "INSERT INTO forge_recipes (item, material, quantity) VALUES (?, ?, ?)",
+        ((item, ids[material], quantity) for item in changed for material, quantity in by_id[item]["Recipe"].items()),
+    )
+    conn.executemany(
+        "INSERT INTO forge_requirements (item, requirement, level) VALUES (?, ?, ?)",
+        ((item, requirement, level) for item in changed for requirement, level in by_id[item]["Requirements"].items()),
+    )
+    (version,) = conn.execute(
+        "UPDATE forge_catalog SET version = version + 1, content_hash = ?, last_scraped_at = ? RETURNING version",
+        (new_catalog_hash, now),
+    ).fetchone()
+    conn.commit()
+    return CatalogSync(
+        CatalogVersion(version, new_catalog_hash, _iso(now), registry_version),
+        len(changed) - len(updated),
+        len(updated),
+        len(deleted),
+    )
+
+
+def read_catalog_version(conn: sqlite3.Connection) -> CatalogVersion:
+    version, content_hash, last_scraped_at, registry_version = conn.execute("""
+        SELECT forge_catalog.version, content_hash, last_scraped_at, item_registry.version
+        FROM forge_catalog, item_registry
+    """).fetchone()
+    return CatalogVersion(version, content_hash, _iso(last_scraped_at), registry_version)
+
+
+def read_forge_items(conn: sqlite3.Connection) -> tuple[dict[str, ForgeItemInfo], dict[str, int], CatalogVersion]:
+    """See db.read_forge_items. Reads share the pool's connection, so no sync can interleave with them."""
+    items: dict[str, ForgeItemInfo] = {}
+    ids: dict[str, int] = {}
+    names: dict[int, str] = {}
+    catalog = read_catalog_version(conn)
+    for item, name, duration in conn.execute(
+        "SELECT item, name, duration_hours FROM forge_items JOIN items ON items.id = forge_items.item"
+    ):
+        names[item] = name
+        ids[name] = item
+        items[name] = ForgeItemInfo({"Duration": duration, "Recipe": {}, "Requirements": {}})
+    for item, material, material_name, quantity in conn.execute(
+        "SELECT item, material, name, quantity FROM forge_recipes JOIN items ON items.id = material"
+    ):
+        items[names[item]]["Recipe"][material_name] = quantity
+        ids[material_name] = material
+    for item, requirement, level in conn.execute("SELECT item, requirement, level FROM forge_requirements"):
+        items[names[item]]["Requirements"][requirement] = level
+    return items, ids, catalog
+
+
+def insert_ah_sale_batch(conn: sqlite3.Connection, sales: dict[int, int]) -> None:
+    """See db.insert_ah_sale_batch."""
+    global _last_ah_sales_prune
+    now = time.time()
+    bucket = now // _HOUR * _HOUR
+    conn.executemany(
+        """
+        INSERT INTO ah_sales_hourly (item, bucket, quantity, first_recorded_at)
+        SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM forge_items WHERE item = ?)
+        ON CONFLICT (item, bucket) DO UPDATE SET quantity = quantity + excluded.quantity
+        """,
+        ((item, bucket, quantity, now, item) for item, quantity in sales.items()),
+    )
+    if _last_ah_sales_prune is None or time.monotonic() - _last_ah_sales_prune >= db.AH_SALES_PRUNE_INTERVAL:
+        conn.execute("DELETE FROM ah_sales_hourly WHERE bucket < ?", (now - _SALES_RETENTION,))
+        _last_ah_sales_prune = time.monotonic()
+    conn.commit()
+
+
+def read_ah_weekly_sales(conn: sqlite3.Connection) -> dict[int, int]:
+    """See db.read_ah_weekly_sales."""
+    window_start = time.time() - _WEEK
+    rows = conn.execute(
+        """
+        SELECT item, CAST(ROUND(SUM(
+            CASE WHEN bucket >= :start THEN quantity ELSE quantity * (bucket + 3600 - :start) / 3600 END
+        )) AS INTEGER)
+        FROM ah_sales_hourly
+        WHERE bucket > :start - 3600
+        GROUP BY item
+        """,
+        {"start": window_start},
+    )
+    return dict(rows.fetchall())
+
+
+def read_ah_oldest_record_time(conn: sqlite3.Connection) -> str | None:
+    (oldest,) = conn.execute("SELECT MIN(first_recorded_at) FROM ah_sales_hourly").fetchone()
+    return _iso(oldest)
+
+
+def insert_price_history(conn: sqlite3.Connection, recorded_at: datetime, samples: dict[int, PriceSample]) -> None:
+    """See db.insert_price_history."""
+    global _last_history_prune
+    rows = []
+    for tier in db.HISTORY_TIERS:
+        bucket = db._history_bucket(tier, recorded_at).timestamp()
+        for item, sample in samples.items():
+            row: list[typing.Any] = [tier.name, item, bucket, 1]
+            for key in db.HISTORY_METRICS.values():
+                value = sample[key]  # type: ignore[literal-required]
+                row += [value, float(value) ** 2, value, value]
+            rows.append(row)
+    updates = ", ".join(
+        f"{metric}_{stat} = " + merge.format(column=f"{metric}_{stat}")
+        for metric in db.HISTORY_METRICS
+        for stat, merge in _HISTORY_MERGES.items()
+    )
+    conn.executemany(
+        f"""
+        INSERT INTO price_history (tier, item, bucket, samples, {", ".join(_HISTORY_COLUMNS)})
+        VALUES ({", ".join("?" * (4 + len(_HISTORY_COLUMNS)))})
+        ON CONFLICT (tier, item, bucket) DO UPDATE SET samples = samples + excluded.samples, {updates}
+        """,
+        rows,
+    )
+    if _last_history_prune is None or time.monotonic() - _last_history_prune >= db.HISTORY_PRUNE_INTERVAL:
+        now = time.time()
+        conn.executemany(
+            "DELETE FROM price_history WHERE tier = ? AND bucket < ?",
+            ((tier.name, now - tier.retention.total_seconds()) for tier in db.HISTORY_TIERS),
+        )
+        _last_history_prune = time.monotonic()
+    conn.commit()
+
+
+def read_price_history(
+    conn: sqlite3.Connection,
+    item: int,
+    since: datetime,
+    until: datetime,
+    max_points: int,
+) -> tuple[str, list[dict[str, typing.Any]]]:
+    """See db.read_price_history."""
+    tier = db.choose_history_tier(since, until, max_points)
+    rows = conn.execute(
+        f"""
+        SELECT bucket, samples, {", ".join(_HISTORY_COLUMNS)} FROM price_history
+        WHERE tier = ? AND item = ? AND bucket >= ? AND bucket <= ?
+        ORDER BY bucket
+        """,
+        (tier.name, item, db._history_bucket(tier, since).timestamp(), until.timestamp()),
+    )
+    points: list[dict[str, typing.Any]] = []
+    for bucket, samples, *stats in rows:
+        point: dict[str, typing.Any] = {"bucket": _iso(bucket), "samples": samples}
+        for i, key in enumerate(db.HISTORY_METRICS.values()):
+            total, squares, low, high = stats[4 * i : 4 * i + 4]
+            mean = total / samples
+            point[key] = {
+                "avg": round(mean),
+                "min": low,
+                "max": high,
+                "stddev": round(max(squares / samples - mean * mean, 0.0) ** 0.5),
+            }
+        points.append(point)
+    return tier.name, points
@@ -0,0 +1,29 @@
+import os
+
+from common import metrics
+
+bind = "0.0.0.0:5000"
+workers = int(os.getenv("DB_API_WORKERS", "4"))
+worker_class = "gthread"
+threads = int(os.getenv("DB_API_THREADS", "8"))
+timeout = 60
+metrics_dir = os.getenv("METRICS_DIR", "/tmp/db-api-metrics")
+
+
+def on_starting(server) -> None:  # type: ignore[no-untyped-def]
+    metrics.clear_shared(metrics_dir)  # Snapshots left by workers of a previous run
+    # Create the schema once, before any worker opens its connection pool
+    import db
+
+    server.log.info("Waiting for database...")
+    conn = db.wait_for_db()
+    try:
+        db.init_schema(conn)
+    finally:
+        conn.close()
+    server.log.info("Database ready.")
+
+
+def child_exit(server, worker) -> None:  # type: ignore[no-untyped-def]
+    # Drop the exited worker's metrics so its gauges stop counting; its counters restart from its replacement
+    metrics.clear_shared(metrics_dir, worker.pid)
@@ -1,13 +1,18 @@
+import hashlib
+import json
 import logging
+import os
 import sys
+import time
 import typing
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 import db
 import flask
-import psycopg2
 
-from common.types import ForgeItemInfo
+from common import metrics
+from common.items import ItemRegistry
+from common.types import ForgeItemInfo, PriceSample
 
 _formatter = logging.Formatter("%(asctime)s - db-api - %(levelname)s - %(message)s")
 _handler = logging.StreamHandler(sys.stdout)
@@ -17,50 +22,202 @@ logger.handlers.clear()
 logger.addHandler(_handler)
 logger.setLevel(logging.INFO)
 logger.propagate = False
-logger.info("Waiting for database...")
-conn: psycopg2.extensions.connection = db.wait_for_db()
-db.init_schema(conn)
-logger.info("Database ready.")
-last_scraped_at: datetime | None = None
+# Schema setup runs once in the gunicorn master (see gunicorn.conf.py); each worker only opens its own pool,
+# sized so every request thread can hold a connection at once
+pool = db.ConnectionPool(1, int(os.getenv("DB_API_THREADS", "8")))
+logger.info(f"Database pool ready in worker {os.getpid()}.")
+ah_sales_cache_ttl = float(os.getenv("AH_SALES_CACHE_TTL", "30"))
+# Every worker publishes its metrics here, so a scrape served by any one worker reports the whole server
+metrics.REGISTRY.share(os.getenv("METRICS_DIR", "/tmp/db-api-metrics"))
 app = flask.Flask(__name__)
 
+REQUEST_SECONDS = metrics.histogram("db_api_request_seconds", "Duration of HTTP requests", ("endpoint",))
+RESPONSES = metrics.counter("db_api_responses_total", "HTTP responses", ("endpoint", "status"))
+RESPONSE_CACHE = metrics.counter("db_api_response_cache_total", "Cached response lookups", ("cache", "outcome"))
+
+
+class CachedBody(typing.NamedTuple):
+    key: typing.Any  # What the body was built from; the cache entry is valid while this is unchanged
+    body: bytes
+    etag: str
+    built_at: float
+
+
+# Serialized responses, per worker
+_forge_items_cache: CachedBody | None = None
+_ah_sales_cache: CachedBody | None = None
+_items_cache: CachedBody | None = None
+_registry: ItemRegistry | None = None  # This worker's copy of the item registry
+
+
+def _serialize(key: typing.Any, data: typing.Any) -> CachedBody:
+    body = json.dumps(data, separators=(",", ":")).encode()
+    return CachedBody(key, body, hashlib.sha1(body).hexdigest(), time.monotonic())
+
+
+def _conditional_response(cached: CachedBody) -> flask.Response:
+    """Serve a cached body with its ETag, answering 304 Not Modified when the client already has it."""
+    response = flask.Response(cached.body, mimetype="application/json")
+    response.set_etag(cached.etag)
+    return response.make_conditional(flask.request)
+
+
+@app.before_request
+def _start_timer() -> None:
+    flask.g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response: flask.Response) -> flask.Response:
+    endpoint = flask.request.url_rule.rule if flask.request.url_rule else "unmatched"
+    REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - flask.g.request_start)
+    RESPONSES.labels(endpoint, response.status_code).inc()
+    return response
+
 
 @app.get("/health")
 def health() -> flask.Response:
     return flask.jsonify({"status": "ok"})
 
 
+@app.get("/metrics")
+def get_metrics() -> flask.Response:
+    return flask.Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def _item_registry() -> ItemRegistry:
+    """The item registry, reloaded whenever its version moved."""
+    global _registry
+    version = pool.run(db.read_registry_version)
+    if _registry is None or _registry.version != version:
+        _registry = pool.run(db.read_item_registry)
+    return _registry
+
+
+@app.get("/items")
+def get_items() -> flask.Response:
+    global _items_cache
+    registry = _item_registry()
+    cached = _items_cache
+    if cached is None or cached.key != registry.version:
+        RESPONSE_CACHE.labels("items", "miss").inc()
+        cached = _items_cache = _serialize(registry.version, registry.to_json())
+    else:
+        RESPONSE_CACHE.labels("items", "hit").inc()
+    return _conditional_response(cached)
+
+
+@app.put("/items")
+def put_items() -> flask.Response:
+    """Register Hypixel's item list and the item ids wiki pages give names.
+    Body: {"items": {item_id: name}, "aliases": {name: item_id}}; aliases are optional.
+    """
+    data = flask.request.get_json(force=True)
+    listed: dict[str, str] = {str(k): str(v) for k, v in data["items"].items()}
+    aliases: dict[str, str] = {str(k): str(v) for k, v in data.get("aliases", {}).items()}
+    sync = pool.run(db.upsert_items, listed, aliases)
+    if sync.inserted or sync.updated:
+        logger.info(f"Item registry now at version {sync.version}: {sync.inserted} inserted, {sync.updated} updated.")
+    return flask.jsonify(sync._asdict())
+
+
 @app.get("/forge-items")
 def get_forge_items() -> flask.Response:
-    items = db.read_forge_items(conn)
-    return flask.jsonify({"items": items, "last_scraped_at": last_scraped_at.isoformat() if last_scraped_at else None})
+    global _forge_items_cache
+    # A one-row version lookup decides whether the cached catalog is still current
+    catalog = pool.run(db.read_catalog_version)
+    cached = _forge_items_cache
+    if cached is None or cached.key != catalog:
+        RESPONSE_CACHE.labels("forge-items", "miss").inc()
+        items, ids, catalog = pool.run(db.read_forge_items)
+        cached = _forge_items_cache = _serialize(catalog, {"items": items, "ids": ids, **catalog._asdict()})
+    else:
+        RESPONSE_CACHE.labels("forge-items", "hit").inc()
+    return _conditional_response(cached)
+
+
+@app.get("/forge-items/version")
+def get_forge_items_version() -> flask.Response:
+    return flask.jsonify(pool.run(db.read_catalog_version)._asdict())
 
 
 @app.put("/forge-items")
 def put_forge_items() -> flask.Response:
-    global last_scraped_at
     data = flask.request.get_json(force=True)
     items: dict[str, ForgeItemInfo] = {name: typing.cast(ForgeItemInfo, info) for name, info in data["items"].items()}
-    db.upsert_forge_items(conn, items)
-    last_scraped_at = datetime.now()
-    return flask.jsonify({"upserted": len(items)})
+    sync = pool.run(db.upsert_forge_items, items)
+    if sync.inserted or sync.updated or sync.deleted:
+        logger.info(
+            f"Forge catalog now at version {sync.catalog.version}: "
+            f"{sync.inserted} inserted, {sync.updated} updated, {sync.deleted} deleted."
+        )
+    return flask.jsonify(
+        {
+            "upserted": len(items),
+            "inserted": sync.inserted,
+            "updated": sync.updated,
+            "deleted": sync.deleted,
+            **sync.catalog._asdict(),
+        }
+    )
 
 
 @app.post("/ah-sales")
 def post_ah_sales() -> flask.Response:
+    global _ah_sales_cache
     data = flask.request.get_json(force=True)
-    sales: dict[str, int] = {str(k): int(v) for k, v in data["sales"].items()}
-    db.insert_ah_sale_batch(conn, sales)
+    sales: dict[int, int] = {int(k): int(v) for k, v in data["sales"].items()}
+    pool.run(db.insert_ah_sale_batch, sales)
+    _ah_sales_cache = None
     return flask.jsonify({"recorded": len(sales)})
 
 
 @app.get("/ah-sales")
 def get_ah_sales() -> flask.Response:
-    sales = db.read_ah_weekly_sales(conn)
-    return flask.jsonify({"sales": sales})
+    global _ah_sales_cache
+    cached = _ah_sales_cache
+    if cached is None or time.monotonic() - cached.built_at >= ah_sales_cache_ttl:
+        RESPONSE_CACHE.labels("ah-sales", "miss").inc()
+        cached = _ah_sales_cache = _serialize(None, {"sales": pool.run(db.read_ah_weekly_sales)})
+    else:
+        RESPONSE_CACHE.labels("ah-sales", "hit").inc()
+    return _conditional_response(cached)
 
 
 @app.get("/ah-sales/oldest")
 def get_ah_sales_oldest() -> flask.Response:
-    oldest_at = db.read_ah_oldest_record_time(conn)
+    oldest_at = pool.run(db.read_ah_oldest_record_time)
     return flask.jsonify({"oldest_recorded_at": oldest_at})
+
+
+@app.post("/history")
+def post_history() -> flask.Response:
+    data = flask.request.get_json(force=True)
+    recorded_at = datetime.fromisoformat(data["recorded_at"])
+    samples: dict[int, PriceSample] = {int(item): typing.cast(PriceSample, s) for item, s in data["samples"].items()}
+    pool.run(db.insert_price_history, recorded_at, samples)
+    return flask.jsonify({"recorded": len(samples)})
+
+
+@app.get("/history/<item_name>")
+def get_history(item_name: str) -> flask.Response:
+    """Price and profit series for one item. Query parameters: since, until (ISO timestamps, default the last
+    7 days) and points (upper bound on the number of points, which picks the downsampling tier).
+    """
+    args = flask.request.args
+    try:
+        until = datetime.fromisoformat(args["until"]) if "until" in args else datetime.now(timezone.utc)
+        since = datetime.fromisoformat(args["since"]) if "since" in args else until - timedelta(days=7)
+    except ValueError:
+        flask.abort(400, description="since and until must be ISO timestamps")
+    if since.tzinfo is None or until.tzinfo is None or since >= until:
+        flask.abort(400, description="since and until must be timezone-aware with since < until")
+    try:
+        max_points = min(max(int(args.get("points", "500")), 1), 5000)
+    except ValueError:
+        flask.abort(400, description="points must be an integer")
+    item = _item_registry().resolve(item_name)
+    if item is None:
+        flask.abort(404, description=f"Unknown item {item_name}")
+    tier, points = pool.run(db.read_price_history, item, since, until, max_points)
+    return flask.jsonify({"item": item_name, "tier": tier, "points": points})
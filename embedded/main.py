@@ -0,0 +1,186 @@
+"""SkyForge in one process: the scraper, calculator, storage and web service share an asyncio process and reach
+each other over an in-process bus instead of HTTP, with SQLite (or Postgres) as storage.
+
+The calculator and scraper run their loops in threads as they do in their own containers; the web service runs on
+the event loop under uvicorn; storage answers db-api's calls in the calling thread.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import types
+import typing
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), *(str(ROOT / service) for service in ("calculator", "scraper", "db-api"))]
+
+import db  # noqa: E402
+import db_sqlite  # noqa: E402
+import uvicorn  # noqa: E402
+
+from calculator import main as calculator  # noqa: E402
+from common.bus import Bus  # noqa: E402
+from common.items import ItemRegistry  # noqa: E402
+from common.services import BusDbApi, BusWebApi  # noqa: E402
+from common.types import ForgeItemInfo, ForgeProfit, PriceSample  # noqa: E402
+from scraper import main as scraper  # noqa: E402
+from web import main as web  # noqa: E402
+
+WEB_PORT = 8000
+
+
+def _logger(name: str) -> logging.Logger:
+    logger = logging.getLogger(name)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(f"%(asctime)s - {name} - %(levelname)s - %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+class Storage:
+    """db-api's routes over a storage backend, db_sqlite or db for Postgres, and a pool of its connections.
+    Like db-api, it keeps the registry, catalog and sales totals it last read and hands out those same objects until
+    they are stale; their ETags are their versions.
+    """
+
+    def __init__(self, logger: logging.Logger, backend: types.ModuleType, pool: typing.Any, sales_ttl: float) -> None:
+        self._logger = logger
+        self._backend = backend
+        self._pool = pool
+        self._sales_ttl = sales_ttl
+        self._registry: ItemRegistry | None = None
+        self._catalog: tuple[db.CatalogVersion, dict[str, typing.Any]] | None = None
+        self._sales: tuple[float, dict[int, int]] | None = None  # (read at, totals)
+
+    def serve(self, bus: Bus) -> None:
+        for method in (
+            "get_items",
+            "put_items",
+            "get_forge_items",
+            "put_forge_items",
+            "post_ah_sales",
+            "get_ah_sales",
+            "get_ah_sales_oldest",
+            "post_history",
+        ):
+            bus.serve(f"db-api/{method}", getattr(self, method))
+
+    def get_items(self, etag: str | None) -> tuple[ItemRegistry, str | None] | None:
+        version = self._pool.run(self._backend.read_registry_version)
+        if self._registry is None or self._registry.version != version:
+            self._registry = self._pool.run(self._backend.read_item_registry)
+        registry = self._registry
+        return None if etag == str(registry.version) else (registry, str(registry.version))
+
+    def put_items(self, listed: dict[str, str], aliases: dict[str, str]) -> dict[str, typing.Any]:
+        sync = self._pool.run(self._backend.upsert_items, listed, aliases)
+        if sync.inserted or sync.updated:
+            self._logger.info(
+                f"Item registry now at version {sync.version}: {sync.inserted} inserted, {sync.updated} updated."
+            )
+        return sync._asdict()
+
+    def get_forge_items(self, etag: str | None) -> tuple[dict[str, typing.Any], str | None] | None:
+        catalog = self._pool.run(self._backend.read_catalog_version)
+        if self._catalog is None or self._catalog[0] != catalog:
+            items, ids, catalog = self._pool.run(self._backend.read_forge_items)
+            self._catalog = catalog, {"items": items, "ids": ids, **catalog._asdict()}
+        catalog, data = self._catalog
+        current = "/".join(map(str, catalog))
+        return None if etag == current else (data, current)
+
+    def put_forge_items(self, items: dict[str, ForgeItemInfo]) -> dict[str, typing.Any]:
+        sync = self._pool.run(self._backend.upsert_forge_items, items)
+        if sync.inserted or sync.updated or sync.deleted:
+            self._logger.info(
+                f"Forge catalog now at version {sync.catalog.version}: "
+                f"{sync.inserted} inserted, {sync.updated} updated, {sync.deleted} deleted."
+            )
+        return {
+            "upserted": len(items),
+            "inserted": sync.inserted,
+            "updated": sync.updated,
+            "deleted": sync.deleted,
+            **sync.catalog._asdict(),
+        }
+
+    def post_ah_sales(self, sales: dict[int, int]) -> None:
+        self._pool.run(self._backend.insert_ah_sale_batch, sales)
+        self._sales = None
+
+    def get_ah_sales(self, etag: str | None) -> tuple[dict[int, int], str | None] | None:
+        cached = self._sales
+        if cached is None or time.monotonic() - cached[0] >= self._sales_ttl:
+            cached = self._sales = time.monotonic(), self._pool.run(self._backend.read_ah_weekly_sales)
+        return None if etag == str(cached[0]) else (cached[1], str(cached[0]))
+
+    def get_ah_sales_oldest(self) -> str | None:
+        return self._pool.run(self._backend.read_ah_oldest_record_time)
+
+    def post_history(self, recorded_at: str, samples: dict[int, PriceSample]) -> None:
+        self._pool.run(self._backend.insert_price_history, datetime.fromisoformat(recorded_at), samples)
+
+
+def open_storage(logger: logging.Logger) -> Storage:
+    backend = os.getenv("EMBEDDED_STORAGE", "sqlite")
+    sales_ttl = float(os.getenv("AH_SALES_CACHE_TTL", "30"))
+    if backend == "postgres":
+        logger.info("Waiting for database...")
+        conn = db.wait_for_db()
+        try:
+            db.init_schema(conn)
+        finally:
+            conn.close()
+        return Storage(logger, db, db.ConnectionPool(1, int(os.getenv("DB_API_THREADS", "8"))), sales_ttl)
+    if backend != "sqlite":
+        raise ValueError(f"Unknown EMBEDDED_STORAGE {backend}")
+    path = os.getenv("SQLITE_PATH", "skyforge.db")
+    pool = db_sqlite.ConnectionPool(path)
+    pool.run(db_sqlite.init_schema)
+    logger.info(f"Storing data in SQLite database {path}.")
+    return Storage(logger, db_sqlite, pool, sales_ttl)
+
+
+async def publish_results(profits: list[ForgeProfit], calculated_at: str, uptime_seconds: int) -> None:
+    # The calculator's rows are already what web would validate, so they are taken as they are
+    payload = web.ResultsPayload.model_construct(
+        profits=profits, calculated_at=calculated_at, uptime_seconds=uptime_seconds
+    )
+    await web.post_results(payload)
+
+
+async def serve() -> None:
+    logger = _logger("embedded")
+    storage = open_storage(_logger("storage"))
+    bus = Bus(asyncio.get_running_loop())
+    storage.serve(bus)
+    bus.serve("web/results", publish_results)
+    server = uvicorn.Server(uvicorn.Config(web.app, host="0.0.0.0", port=WEB_PORT))
+
+    def component(name: str, target: typing.Callable[..., None], *args: typing.Any) -> None:
+        """Run a component's loop; if it ever ends, stop the process so it is restarted as a whole."""
+        try:
+            target(*args)
+        except Exception:
+            logger.exception(f"{name} stopped.")
+        server.should_exit = True
+
+    # The calculator and scraper share one client, and with it the Hypixel rate limit
+    client = calculator.create_client(_logger("calculator"))
+    for name, target, args in (
+        ("scraper", scraper.run, (_logger("scraper"), client, BusDbApi(bus))),
+        ("calculator", calculator.run, (logging.getLogger("calculator"), client, BusDbApi(bus), BusWebApi(bus))),
+    ):
+        threading.Thread(target=component, args=(name, target, *args), daemon=True, name=name).start()
+    logger.info(f"Started the scraper and calculator; serving the web UI on port {WEB_PORT}.")
+    await server.serve()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve())
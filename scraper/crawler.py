@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from curl_cffi import requests as cffi_requests
+
+from common import metrics
+
+# MediaWiki renders the article inside mw-parser-output; the skin around it changes on every request
+ARTICLE_START = b'class="mw-parser-output"'
+ARTICLE_END = b'class="printfooter"'
+
+CRAWL_PAGES = metrics.counter("scraper_crawl_pages_total", "Item wiki page fetches by outcome", ("outcome",))
+
+
+def article_body(content: bytes) -> bytes:
+    """The rendered article of a wiki page, or the whole page if it has no recognisable article region."""
+    start = content.find(ARTICLE_START)
+    end = content.find(ARTICLE_END, start)
+    return content[start:end] if start != -1 and end != -1 else content
+
+
+class CachedPage(typing.NamedTuple):
+    url: str
+    article: bytes
+    content_hash: str
+    etag: str | None
+    last_modified: str | None
+
+
+class PageCache:
+    """Wiki articles on disk, one gzipped body plus a JSON header file per URL, kept across restarts."""
+
+    def __init__(self, directory: str | Path) -> None:
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        stem = hashlib.sha256(url.encode()).hexdigest()[:32]
+        return self._directory / f"{stem}.json", self._directory / f"{stem}.html.gz"
+
+    def get(self, url: str) -> CachedPage | None:
+        header_path, body_path = self._paths(url)
+        try:
+            header = json.loads(header_path.read_text())
+            article = gzip.decompress(body_path.read_bytes())
+        except (OSError, ValueError, EOFError):
+            return None
+        if hashlib.sha256(article).hexdigest() != header["content_hash"]:
+            return None  # Body and header from different writes
+        return CachedPage(url, article, header["content_hash"], header["etag"], header["last_modified"])
+
+    def put(self, url: str, article: bytes, etag: str | None, last_modified: str | None) -> CachedPage:
+        page = CachedPage(url, article, hashlib.sha256(article).hexdigest(), etag, last_modified)
+        header_path, body_path = self._paths(url)
+        for path, data in (
+            (body_path, gzip.compress(article)),
+            (header_path, json.dumps({"url": url, **page._asdict(), "article": None}).encode()),
+        ):
+            partial = path.with_suffix(".partial")
+            partial.write_bytes(data)
+            partial.replace(path)
+        return page
+
+
+class RateLimiter:
+    """Spaces request starts at least 1 / rate seconds apart across all threads."""
+
+    def __init__(self, rate: float) -> None:
+        self._interval = 1 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self._interval
+        time.sleep(start - now)
+
+
+class WikiCrawler:
+    """Fetches wiki pages with a bounded number of workers and a shared request rate.
+    Every page is revalidated against the on-disk cache with a conditional request, so a recrawl only downloads
+    pages the wiki reports as modified; those are compared by article hash to tell real changes from re-renders.
+    """
+
+    TIMEOUT = 30
+
+    def __init__(self, logger: logging.Logger, cache_dir: str | Path, workers: int = 4, rate: float = 2.0) -> None:
+        self._logger = logger
+        self._cache = PageCache(cache_dir)
+        self._workers = workers
+        self._limiter = RateLimiter(rate)
+
+    def crawl(self, urls: typing.Iterable[str]) -> dict[str, CachedPage]:
+        """Current article of every reachable URL. Pages that fail to fetch fall back to their cached copy."""
+        urls = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="wiki-crawl") as executor:
+            pages = dict(zip(urls, executor.map(self._fetch, urls)))
+        return {url: page for url, page in pages.items() if page is not None}
+
+    def _fetch(self, url: str) -> CachedPage | None:
+        cached = self._cache.get(url)
+        headers: dict[str, str] = {}
+        if cached is not None and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached is not None and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+        self._limiter.wait()
+        try:
+            response = cffi_requests.get(url, impersonate="firefox", headers=headers, timeout=self.TIMEOUT)
+            if response.status_code == 304 and cached is not None:
+                CRAWL_PAGES.labels("not_modified").inc()
+                return cached
+            response.raise_for_status()
+        except Exception as e:
+            CRAWL_PAGES.labels("failed").inc()
+            self._logger.warning(f"Could not fetch {url}{', using cached copy' if cached else ''}: {e}")
+            return cached
+        page = self._cache.put(
+            url, article_body(response.content), response.headers.get("ETag"), response.headers.get("Last-Modified")
+        )
+        changed = cached is None or cached.content_hash != page.content_hash
+        CRAWL_PAGES.labels("changed" if changed else "unchanged").inc()
+        return page
@@ -1,23 +1,40 @@
+import hashlib
 import logging
 import os
+import re
 import sys
 import time
-from typing import cast
+import urllib.parse
+from typing import NamedTuple, cast
 
 import bs4
 import requests
 import roman
+from crawler import WikiCrawler, article_body
 from curl_cffi import requests as cffi_requests
 
+from common import metrics
+from common.http_client import HttpClient, TokenBucket
+from common.items import display_name
+from common.services import DbApi, HttpDbApi
 from common.types import ForgeItemInfo, ForgePageItem
 
 DB_API_URL = "http://db-api:5000"
+HYPIXEL_API_URL = "https://api.hypixel.net"
 
+SCRAPE_SECONDS = metrics.histogram(
+    "scraper_scrape_seconds", "Duration of wiki scrapes, fetch and parse", buckets=(0.5, 1, 2, 5, 10, 30, 60)
+)
+SCRAPES = metrics.counter("scraper_scrapes_total", "Wiki scrape and sync attempts by outcome", ("outcome",))
+FORGE_ITEMS = metrics.gauge("scraper_forge_items", "Forge items parsed by the last successful scrape")
+CATALOG_CHANGES = metrics.counter("scraper_catalog_changes_total", "Catalog items changed by syncs", ("change",))
+ITEM_SYNCS = metrics.counter("scraper_item_syncs_total", "Item registry sync attempts by outcome", ("outcome",))
 
-def wait_for_api(logger: logging.Logger, retries: int = 10, delay: int = 3) -> None:
+
+def wait_for_api(logger: logging.Logger, client: HttpClient, retries: int = 10, delay: int = 3) -> None:
     for attempt in range(retries):
         try:
-            requests.get(f"{DB_API_URL}/health", timeout=5)
+            client.get(f"{DB_API_URL}/health", timeout=5)
             return
         except requests.exceptions.ConnectionError:
             if attempt < retries - 1:
@@ -27,29 +44,232 @@ def wait_for_api(logger: logging.Logger, retries: int = 10, delay: int = 3) -> N
                 raise RuntimeError(f"Could not connect to db-api after {retries} attempts")
 
 
+class ItemListSync:
+    """Keeps db-api's item registry in step with Hypixel's item list and the item IDs crawled wiki pages give."""
+
+    ITEMS_URL = f"{HYPIXEL_API_URL}/v2/resources/skyblock/items"
+    RETRIES = 2
+
+    def __init__(self, logger: logging.Logger, client: HttpClient, db_api: DbApi) -> None:
+        self._logger = logger
+        self._client = client
+        self._db_api = db_api
+        self._synced: tuple[int, dict[str, str]] | None = None  # (list lastUpdated, aliases) last registered
+
+    def sync(self, aliases: dict[str, str]) -> bool | None:
+        """Register the item list and aliases ({wiki name: item ID}) unless neither changed since the last sync.
+        Returns whether the registry changed, or None if nothing was sent.
+        """
+        response = self._client.get(self.ITEMS_URL, timeout=30, retries=self.RETRIES)
+        response.raise_for_status()
+        data = response.json()
+        state = (data["lastUpdated"], dict(aliases))
+        if state == self._synced:
+            return None
+        listed = {item["id"]: display_name(item["name"]) for item in data["items"]}
+        sync = self._db_api.put_items(listed, aliases)
+        self._synced = state
+        self._logger.info(
+            f"Registered {len(listed)} items and {len(aliases)} wiki aliases (registry version {sync['version']}: "
+            f"{sync['inserted']} inserted, {sync['updated']} updated)."
+        )
+        return bool(sync["inserted"] or sync["updated"])
+
+
+class WikiRevision(NamedTuple):
+    fingerprint: str  # Hash of the article body, without the per-request markup around it
+    etag: str | None
+    last_modified: str | None
+    pages_fingerprint: str | None = None  # Hash of every crawled item page, in crawl mode
+
+
+class ItemPageInfo(NamedTuple):
+    """What an item's own wiki page says; None where the page has no recognisable value."""
+
+    item_id: str | None
+    duration: float | None
+    recipe: dict[str, int] | None
+    requirements: dict[str, int] | None
+
+
 class ForgeWikiParser:
     FORGE_URL = "https://wiki.hypixel.net/The_Forge"
     WIKI_INDEXES = range(1, 10)
+    # Infobox row labels on item pages, lowercased
+    ITEM_ID_LABELS = {"item id", "id", "internal id", "skyblock id"}
+    DURATION_LABELS = {"forge time", "forging time", "forge duration", "duration"}
+    REQUIREMENT_LABELS = {"forge requirements", "forging requirements", "requirements"}
+    LEVEL_REQUIREMENT = re.compile(r"^(.*\S)\s+(\d+|[IVXLCDM]+)$")
 
-    def __init__(self, logger: logging.Logger) -> None:
+    def __init__(self, logger: logging.Logger, crawler: WikiCrawler | None = None) -> None:
         self._logger = logger
+        self._crawler = crawler
+        self._synced: WikiRevision | None = None
+        self._summary: list[ForgePageItem] = []  # Last parsed Forge page
+        self._item_pages: dict[str, ItemPageInfo] = {}  # Parsed item pages by article hash
+        self._item_ids: dict[str, str] = {}
 
-    def get_forge_info(self) -> dict[str, ForgeItemInfo]:
-        return {
+    @property
+    def item_ids(self) -> dict[str, str]:
+        """SkyBlock item IDs of forge items, by name, as found by the last crawl."""
+        return self._item_ids
+
+    def get_forge_info(self) -> tuple[dict[str, ForgeItemInfo], WikiRevision] | None:
+        """Forge items from the wiki and the revision they were parsed from, or None if nothing changed since
+        the revision last passed to mark_synced. In crawl mode each item's own page refines its entry.
+        """
+        fetched = self._fetch_page()
+        if fetched is not None:
+            article, revision = fetched
+            self._summary = self._parse_page(article)
+        elif self._crawler is None or self._synced is None:
+            return None
+        else:
+            revision = self._synced  # The Forge page is unchanged, but item pages may not be
+
+        forge_info: dict[str, ForgeItemInfo] = {
             self._parse_name(forge_item["Name & Rarity"]): {
                 "Duration": self._parse_crafting_time(forge_item["Duration"]),
                 "Recipe": self._parse_recipe(forge_item["Recipe Tree"]),
                 "Requirements": self._parse_requirements(forge_item["Requirements"]),
             }
-            for forge_item in self._parse_page()
+            for forge_item in self._summary
         }
+        if self._crawler is not None:
+            revision = revision._replace(pages_fingerprint=self._merge_item_pages(self._crawler, forge_info))
+            if fetched is None and revision == self._synced:
+                self._logger.info("Forge item pages unchanged since last sync.")
+                return None
+        return forge_info, revision
+
+    def mark_synced(self, revision: WikiRevision | None) -> None:
+        """Record that revision reached the database; until then every scrape parses and syncs again.
+        None forgets the last synced revision, so the next scrape syncs even if the wiki is unchanged.
+        """
+        self._synced = revision
+
+    def _merge_item_pages(self, crawler: WikiCrawler, forge_info: dict[str, ForgeItemInfo]) -> str:
+        """Crawl every item's page and let what it states override the Forge page's summary.
+        Returns a fingerprint of the crawled pages.
+        """
+        urls = {
+            self._parse_name(forge_item["Name & Rarity"]): urllib.parse.urljoin(self.FORGE_URL, forge_item["Page"])
+            for forge_item in self._summary
+            if forge_item["Page"]
+        }
+        pages = crawler.crawl(urls.values())
+        refined = 0
+        for name, url in urls.items():
+            page = pages.get(url)
+            if page is None or name not in forge_info:
+                continue
+            info = self._item_pages.get(page.content_hash)
+            if info is None:
+                info = self._item_pages[page.content_hash] = self._parse_item_page(page.article)
+            if info.item_id:
+                self._item_ids[name] = info.item_id
+            if info.duration is not None:
+                forge_info[name]["Duration"] = info.duration
+            if info.recipe:
+                forge_info[name]["Recipe"] = info.recipe
+            if info.requirements:
+                forge_info[name]["Requirements"] = info.requirements
+            if info.duration is not None or info.recipe or info.requirements:
+                refined += 1
+        # Parses of pages that are no longer crawled are not needed again
+        current = {page.content_hash for page in pages.values()}
+        self._item_pages = {key: info for key, info in self._item_pages.items() if key in current}
+        self._logger.info(
+            f"Crawled {len(pages)}/{len(urls)} item pages: {refined} items refined, {len(self._item_ids)} item IDs."
+        )
+        listing = "".join(f"{url}\0{pages[url].content_hash}\n" for url in sorted(pages))
+        return hashlib.sha256(listing.encode()).hexdigest()
+
+    def _parse_item_page(self, article: bytes) -> ItemPageInfo:
+        soup = bs4.BeautifulSoup(article, "lxml")
+        item_id: str | None = None
+        duration: float | None = None
+        requirements: dict[str, int] | None = None
+        infobox = soup.select_one(".infobox, .portable-infobox")
+        for row in infobox.select("tr, .pi-data") if infobox else ():
+            label = row.select_one("th, .pi-data-label")
+            value = row.select_one("td, .pi-data-value")
+            if label is None or value is None:
+                continue
+            key = label.get_text(" ", strip=True).rstrip(":").lower()
+            text = value.get_text(" ", strip=True)
+            if key in self.ITEM_ID_LABELS and re.fullmatch(r"[A-Z0-9_:;\-]+", text):
+                item_id = text
+            elif key in self.DURATION_LABELS:
+                try:
+                    duration = self._parse_crafting_time(text)
+                except ValueError:
+                    pass
+            elif key in self.REQUIREMENT_LABELS:
+                requirements = self._parse_level_requirements(value)
 
-    def _parse_page(self) -> list[ForgePageItem]:
-        response = cffi_requests.get(self.FORGE_URL, impersonate="firefox")
+        recipe: dict[str, int] | None = None
+        heading = next((h for h in soup.find_all(["h2", "h3", "h4"]) if "Forg" in self._section_title(h)), None)
+        tree = heading.find_next("div", {"class": "mw-hp-tree-container"}) if heading else None
+        ul_element = tree.find("ul") if tree else None
+        if ul_element is not None:
+            try:
+                recipe = self._parse_recipe([li.get_text() for li in ul_element.find_all("li", recursive=False)])
+            except (ValueError, IndexError):
+                pass
+        return ItemPageInfo(item_id, duration, recipe, requirements)
+
+    def _section_title(self, heading: bs4.Tag) -> str:
+        """A section heading's title, or "" for headings that are not sections, like infobox labels. MediaWiki
+        before 1.43 nests the title in a mw-headline span next to the edit-section links.
+        """
+        if heading.find_parent(class_=["infobox", "portable-infobox"]) is not None:
+            return ""
+        return (heading.select_one(".mw-headline") or heading).get_text(" ", strip=True)
+
+    def _parse_level_requirements(self, value: bs4.Tag) -> dict[str, int]:
+        """Requirements listed one per line or list item as "<name> <level>". Entries without a level (quests,
+        NPC conversations) are not forge requirements and are skipped, so no per-name filter is needed.
+        """
+        entries = [li.get_text(" ", strip=True) for li in value.find_all("li")] or value.get_text("\n").splitlines()
+        requirements: dict[str, int] = {}
+        for entry in entries:
+            match = self.LEVEL_REQUIREMENT.match(entry.strip())
+            if match is None:
+                continue
+            name, level = match.groups()
+            requirements[name] = int(level) if level.isnumeric() else roman.fromRoman(level)
+        return requirements
+
+    def _fetch_page(self) -> tuple[bytes, WikiRevision] | None:
+        """Fetch the page unless it is unchanged, returning the article HTML and its revision."""
+        headers: dict[str, str] = {}
+        if self._synced is not None and self._synced.etag:
+            headers["If-None-Match"] = self._synced.etag
+        if self._synced is not None and self._synced.last_modified:
+            headers["If-Modified-Since"] = self._synced.last_modified
+        response = cffi_requests.get(self.FORGE_URL, impersonate="firefox", headers=headers, timeout=30)
+        if response.status_code == 304:
+            self._logger.info("Forge wiki page not modified.")
+            return None
         response.raise_for_status()
+
+        article = article_body(response.content)
+        revision = WikiRevision(
+            hashlib.sha256(article).hexdigest(), response.headers.get("ETag"), response.headers.get("Last-Modified")
+        )
+        if self._synced is not None and revision.fingerprint == self._synced.fingerprint:
+            self._logger.info("Forge wiki page unchanged since last sync.")
+            # Newer validators for the same content
+            self._synced = self._synced._replace(etag=revision.etag, last_modified=revision.last_modified)
+            return None
         self._logger.info("Fetched forge data from wiki.")
+        return article, revision
 
-        tables = bs4.BeautifulSoup(response.content, "html.parser").find_all("table", {"class": "wikitable"})
+    def _parse_page(self, article: bytes) -> list[ForgePageItem]:
+        # Only tables are built into a tree; lxml tokenizes the rest of the article without keeping it
+        only_tables = bs4.SoupStrainer("table")
+        tables = bs4.BeautifulSoup(article, "lxml", parse_only=only_tables).find_all("table", {"class": "wikitable"})
 
         item_list: list[ForgePageItem] = []
         for i in self.WIKI_INDEXES:
@@ -60,7 +280,7 @@ class ForgeWikiParser:
                 columns = row.find_all("td")[1:]
                 columns_text = [column.get_text() for column in columns]
                 if len(columns_text) == len(headers):
-                    row_data: ForgePageItem = cast(ForgePageItem, {})
+                    row_data: ForgePageItem = cast(ForgePageItem, {"Page": None})
                     for j in range(len(headers)):
                         if headers[j] == "Recipe Tree":
                             tree_container = cast(bs4.Tag, columns[3].find("div", {"class": "mw-hp-tree-container"}))
@@ -70,10 +290,20 @@ class ForgeWikiParser:
                             ]
                         else:
                             row_data[headers[j]] = columns_text[j]
+                        if headers[j] == "Name & Rarity":
+                            row_data["Page"] = self._page_link(columns[j])
                     table_data.append(row_data)
             item_list.extend(table_data)
         return item_list
 
+    def _page_link(self, column: bs4.Tag) -> str | None:
+        """The article an item's name links to; file, category and other namespaced links are skipped."""
+        for link in column.find_all("a", href=True):
+            path = urllib.parse.urlsplit(link["href"]).path
+            if path.startswith("/") and ":" not in path:
+                return path
+        return None
+
     def _parse_name(self, wiki_name: str) -> str:
         return wiki_name.split("  ")[0]
 
@@ -120,6 +350,57 @@ class ForgeWikiParser:
         }
 
 
+def run(logger: logging.Logger, client: HttpClient, db_api: DbApi) -> None:
+    """Sync the item registry and scrape the forge catalog into db-api, forever."""
+    wiki_scrape_interval = int(os.getenv("WIKI_SCRAPE_INTERVAL", "3600"))
+    crawler = None
+    if os.getenv("WIKI_CRAWL", "0") == "1":
+        crawler = WikiCrawler(
+            logger,
+            os.getenv("WIKI_CACHE_DIR", "wiki-cache"),
+            workers=int(os.getenv("WIKI_CRAWL_WORKERS", "4")),
+            rate=float(os.getenv("WIKI_CRAWL_RATE", "2")),
+        )
+        logger.info("Crawl mode: item pages refine the Forge page's recipes and requirements.")
+    parser = ForgeWikiParser(logger, crawler)
+    item_list = ItemListSync(logger, client, db_api)
+
+    while True:
+        try:
+            registry_changed = item_list.sync(parser.item_ids)
+            if registry_changed:
+                parser.mark_synced(None)  # Catalog names may resolve to other items now
+            ITEM_SYNCS.labels("unchanged" if registry_changed is None else "synced").inc()
+        except Exception as e:
+            ITEM_SYNCS.labels("failed").inc()
+            logger.warning(f"Failed to sync item registry: {e}")
+
+        logger.info("Fetching forge data...")
+        try:
+            with SCRAPE_SECONDS.time():
+                scraped = parser.get_forge_info()
+            if scraped is None:
+                SCRAPES.labels("unchanged").inc()  # Nothing to parse or send
+            else:
+                forge_info, revision = scraped
+                sync = db_api.put_forge_items(forge_info)
+                parser.mark_synced(revision)
+                FORGE_ITEMS.set(len(forge_info))
+                for change in ("inserted", "updated", "deleted"):
+                    CATALOG_CHANGES.labels(change).inc(sync[change])
+                SCRAPES.labels("synced").inc()
+                logger.info(
+                    f"Synced {len(forge_info)} forge items (catalog version {sync['version']}: "
+                    f"{sync['inserted']} inserted, {sync['updated']} updated, {sync['deleted']} deleted)."
+                )
+        except Exception as e:
+            SCRAPES.labels("failed").inc()
+            logger.error(f"Failed to fetch/store forge data: {e}")
+
+        logger.info(f"Sleeping {wiki_scrape_interval}s...")
+        time.sleep(wiki_scrape_interval)
+
+
 def main() -> None:
     formatter = logging.Formatter("%(asctime)s - scraper - %(levelname)s - %(message)s")
     logger = logging.getLogger("scraper")
@@ -128,25 +409,21 @@ def main() -> None:
     logger.addHandler(handler)
     logger.setLevel(logging.INFO)
 
-    wiki_scrape_interval = int(os.getenv("WIKI_SCRAPE_INTERVAL", "3600"))
-    parser = ForgeWikiParser(logger)
+    metrics_port = int(os.getenv("METRICS_PORT", "9100"))
+    hypixel_rate_limit = float(os.getenv("HYPIXEL_RATE_LIMIT", "20"))
+    hypixel_rate_burst = float(os.getenv("HYPIXEL_RATE_BURST", "60"))
+    client = HttpClient(pool_size=2)
+    if hypixel_rate_limit:
+        client.govern(HYPIXEL_API_URL, TokenBucket(hypixel_rate_limit, hypixel_rate_burst))
+
+    if metrics_port:
+        metrics.serve(metrics_port)
+        logger.info(f"Serving metrics on port {metrics_port}.")
 
     logger.info("Waiting for db-api...")
-    wait_for_api(logger)
+    wait_for_api(logger, client)
     logger.info("db-api ready.")
-
-    while True:
-        logger.info("Fetching forge data...")
-        try:
-            forge_info = parser.get_forge_info()
-            response = requests.put(f"{DB_API_URL}/forge-items", json={"items": forge_info}, timeout=30)
-            response.raise_for_status()
-            logger.info(f"Upserted {len(forge_info)} forge items.")
-        except Exception as e:
-            logger.error(f"Failed to fetch/store forge data: {e}")
-
-        logger.info(f"Sleeping {wiki_scrape_interval}s...")
-        time.sleep(wiki_scrape_interval)
+    run(logger, client, HttpDbApi(client, DB_API_URL))
 
 
 if __name__ == "__main__":
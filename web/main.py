@@ -1,13 +1,17 @@
 import asyncio
+import bisect
 import contextlib
 import json
 import logging
 import sys
+import time
 import typing
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Response, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, ValidationError
+
+from common import metrics
 
 formatter = logging.Formatter("%(asctime)s - web - %(levelname)s - %(message)s")
 handler = logging.StreamHandler(sys.stdout)
@@ -16,18 +20,25 @@ logger = logging.getLogger("web")
 logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
+RESULTS_SECONDS = metrics.histogram("web_results_seconds", "Time to index, encode and queue each results version")
+PROFITS_QUERY_SECONDS = metrics.histogram("web_profits_query_seconds", "Duration of /profits queries")
+WS_CLIENTS = metrics.gauge("web_ws_clients", "Connected WebSocket clients")
+WS_OVERFLOWS = metrics.counter("web_ws_overflows_total", "Broadcasts coalesced because a client's queue was full")
+WS_DROPPED = metrics.counter("web_ws_dropped_total", "Clients dropped for falling behind on broadcasts")
+
 
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI):
     yield
     logger.info(f"Shutting down: notifying {len(_clients)} client(s)...")
     shutdown_payload = json.dumps({"type": "shutdown"})
-    for ws in list(_clients):
+    for channel in list(_clients.values()):
         try:
-            await ws.send_text(shutdown_payload)
-            await ws.close()
+            await channel.ws.send_text(shutdown_payload)
+            await channel.ws.close()
         except Exception:
             pass
+        channel.stop()
     _clients.clear()
 
 
@@ -37,48 +48,354 @@ class ResultsPayload(BaseModel):
     uptime_seconds: int | None = None
 
 
+class ProfitsQuery(BaseModel):
+    levels: dict[str, int] = {}  # Requirement -> highest level the player has
+    max_cost: int | None = None
+    min_volume: int = 0
+    sort: typing.Literal[
+        "Rank", "Cost", "Sell Value", "Profit", "Chained Duration", "Profit per Hour", "Weekly Volume"
+    ] = "Profit per Hour"
+    order: typing.Literal["asc", "desc"] = "desc"
+    offset: int = Field(0, ge=0)
+    limit: int = Field(10, ge=1, le=500)
+
+    def key(self) -> tuple[typing.Any, ...]:
+        return (
+            tuple(sorted(self.levels.items())),
+            self.max_cost,
+            self.min_volume,
+            self.sort,
+            self.order,
+            self.offset,
+            self.limit,
+        )
+
+
+class ResultsIndex:
+    """One results version indexed for filtered top-N queries.
+    Rows are kept as bitmasks (bit i = row i in rank order): one mask per requirement level threshold and
+    prefix/suffix masks over cost and volume, so a filter is a handful of ANDs. Every sortable column has a
+    pre-sorted ordering in both directions, and answers, as full pages and as patches against the previous
+    version's page, are cached for the lifetime of the version.
+    """
+
+    CACHE_SIZE = 256
+
+    def __init__(self, version: int, payload: ResultsPayload) -> None:
+        self.version = version
+        self._payload = payload
+        rows = self._rows = sorted(payload.profits, key=lambda row: row["Rank"])
+        # Rows by item name without their Rank, which patches carry apart so a rank shift resends no rows
+        self.unranked = {row["Name"]: {key: value for key, value in row.items() if key != "Rank"} for row in rows}
+        everything = (1 << len(rows)) - 1
+
+        # Stable sorts, so ties keep rank order in both directions like the table does
+        self._orders: dict[tuple[str, str], list[int]] = {}
+        for column in typing.get_args(ProfitsQuery.model_fields["sort"].annotation):
+            values = [row.get(column) or 0 for row in rows]
+            self._orders[(column, "asc")] = sorted(range(len(rows)), key=values.__getitem__)
+            self._orders[(column, "desc")] = sorted(range(len(rows)), key=values.__getitem__, reverse=True)
+
+        # requirement -> (ascending levels, mask of rows needing at most that level)
+        self._requirements: dict[str, tuple[list[int], list[int]]] = {}
+        for requirement in {requirement for row in rows for requirement in row.get("Requirements", {})}:
+            needed = [row.get("Requirements", {}).get(requirement, 0) for row in rows]
+            levels = sorted(set(needed) | {0})
+            masks = [sum(1 << i for i, level in enumerate(needed) if level <= threshold) for threshold in levels]
+            self._requirements[requirement] = (levels, masks)
+
+        self._costs, self._cost_masks = self._cumulative_masks("Cost")
+        self._volumes, self._volume_masks = self._cumulative_masks("Weekly Volume")
+        self._everything = everything
+        self._cache: dict[tuple[typing.Any, ...], tuple[dict[str, typing.Any], str]] = {}
+        self._patches: dict[tuple[typing.Any, ...], str] = {}
+
+    def _cumulative_masks(self, column: str) -> tuple[list[int], list[int]]:
+        """Ascending column values and masks[k] = rows holding the k smallest values."""
+        order = self._orders[(column, "asc")]
+        masks = [0]
+        for i in order:
+            masks.append(masks[-1] | 1 << i)
+        return [self._rows[i].get(column) or 0 for i in order], masks
+
+    def _matching(self, query: ProfitsQuery) -> int:
+        mask = self._everything
+        for requirement, level in query.levels.items():
+            if requirement in self._requirements:
+                levels, masks = self._requirements[requirement]
+                position = bisect.bisect_right(levels, level)
+                mask &= masks[position - 1] if position else 0
+        if query.max_cost is not None and query.max_cost >= 0:
+            mask &= self._cost_masks[bisect.bisect_right(self._costs, query.max_cost)]
+        if query.min_volume > 0:
+            mask &= self._everything ^ self._volume_masks[bisect.bisect_left(self._volumes, query.min_volume)]
+        return mask
+
+    def query(self, query: ProfitsQuery) -> tuple[dict[str, typing.Any], str]:
+        """Returns the matching page and the same page encoded as a WebSocket view message."""
+        key = query.key()
+        cached = self._cache.get(key)
+        if cached is None:
+            mask = self._matching(query)
+            page: list[dict[str, typing.Any]] = []
+            skipped = 0
+            for i in self._orders[(query.sort, query.order)]:
+                if mask >> i & 1:
+                    if skipped < query.offset:
+                        skipped += 1
+                    elif len(page) < query.limit:
+                        page.append(self._rows[i])
+                    else:
+                        break
+            result = {
+                "version": self.version,
+                "calculated_at": self._payload.calculated_at,
+                "uptime_seconds": self._payload.uptime_seconds,
+                "total": mask.bit_count(),
+                "rows": page,
+            }
+            if len(self._cache) >= self.CACHE_SIZE:
+                self._cache.clear()
+            cached = self._cache[key] = (result, json.dumps({"type": "view", **result}))
+        return cached
+
+    def snapshot_patch(self, previous: "ResultsIndex") -> str:
+        """Rows that changed since the previous version, plus the new ranking as an ordered list of names."""
+        return json.dumps(
+            {
+                "type": "patch",
+                "base_version": previous.version,
+                "version": self.version,
+                "calculated_at": self._payload.calculated_at,
+                "uptime_seconds": self._payload.uptime_seconds,
+                "upserts": [row for name, row in self.unranked.items() if previous.unranked.get(name) != row],
+                "removed": [name for name in previous.unranked if name not in self.unranked],
+                "order": list(self.unranked),
+            }
+        )
+
+    def patch(self, previous: "ResultsIndex", query: ProfitsQuery) -> str:
+        """The query's page encoded as a patch against the same query's page in the previous version: the rows
+        that changed or entered the page, the names that left it, and the new page as ordered names and ranks.
+        """
+        key = query.key()
+        cached = self._patches.get(key)
+        if cached is None:
+            page = self.query(query)[0]
+            base = {row["Name"] for row in previous.query(query)[0]["rows"]}
+            names = [row["Name"] for row in page["rows"]]
+            message = {
+                "type": "patch",
+                "base_version": previous.version,
+                "version": self.version,
+                "calculated_at": page["calculated_at"],
+                "uptime_seconds": page["uptime_seconds"],
+                "total": page["total"],
+                "upserts": [
+                    self.unranked[name]
+                    for name in names
+                    if name not in base or previous.unranked[name] != self.unranked[name]
+                ],
+                "removed": sorted(base.difference(names)),
+                "order": names,
+                "ranks": [row["Rank"] for row in page["rows"]],
+            }
+            if len(self._patches) >= self.CACHE_SIZE:
+                self._patches.clear()
+            cached = self._patches[key] = json.dumps(message)
+        return cached
+
+
 app = FastAPI(lifespan=lifespan)
 
-# Active browser connections
-_clients: set[WebSocket] = set()
-_latest: ResultsPayload | None = None
 
+class ClientChannel:
+    """Outbound side of one browser connection: a bounded queue drained by the client's own sender task,
+    so a slow browser only ever delays itself.
+    """
+
+    QUEUE_SIZE = 4
+    SEND_TIMEOUT = 10
+    MAX_OVERFLOWS = 3  # Consecutive overflows before a client is considered dead and dropped
 
-async def _broadcast(payload: ResultsPayload) -> None:
-    data = json.dumps(payload.model_dump())
-    dead: set[WebSocket] = set()
-    for ws in _clients:
+    def __init__(self, ws: WebSocket) -> None:
+        self.ws = ws
+        self.version: int | None = None  # Version of the last results message queued for this client
+        self.confirmed: int | None = None  # Last version the client acknowledged
+        self.query: ProfitsQuery | None = None  # Set while subscribed to a filtered view instead of full results
+        self._queue: asyncio.Queue[str] = asyncio.Queue(self.QUEUE_SIZE)
+        self._overflows = 0
+        self._sender = asyncio.create_task(self._send_loop())
+        self._closer: asyncio.Task[None] | None = None  # Held so the close of a dropped client is not collected
+
+    def offer(self, message: str, version: int | None = None) -> None:
+        """Queue a message without waiting. If the client has fallen behind, its backlog is replaced by the
+        latest snapshot (latest wins), and a client that keeps falling behind is disconnected.
+        """
+        # Clients that ack are also behind when their acks trail what has been sent to them
+        unconfirmed = version is not None and self.confirmed is not None and version - self.confirmed > self.QUEUE_SIZE
+        if not self._queue.full() and not unconfirmed:
+            self._queue.put_nowait(message)
+        elif version is None:
+            return  # Pings are not worth coalescing for
+        else:
+            self._overflows += 1
+            WS_OVERFLOWS.inc()
+            if self._overflows > self.MAX_OVERFLOWS:
+                WS_DROPPED.inc()
+                logger.info("Dropping client that stopped keeping up with broadcasts.")
+                self.stop()
+                self._closer = asyncio.create_task(self._close(1013))
+                return
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(self.latest())
+        if version is not None:
+            self.version = version
+
+    async def _send_loop(self) -> None:
         try:
-            await ws.send_text(data)
+            while True:
+                message = await self._queue.get()
+                await asyncio.wait_for(self.ws.send_text(message), self.SEND_TIMEOUT)
+                if self._queue.empty():
+                    self._overflows = 0
+        except asyncio.CancelledError:
+            raise
         except Exception:
-            dead.add(ws)
-    _clients.difference_update(dead)
+            # The sender ends here; closing lets the browser reconnect instead of waiting on a silent connection
+            await self._close(1011)
+
+    async def _close(self, code: int) -> None:
+        _clients.pop(self.ws, None)
+        with contextlib.suppress(Exception):
+            await self.ws.close(code=code)
+
+    def latest(self) -> str:
+        """The full current state for this client: its view if subscribed, otherwise the snapshot."""
+        if self.query is not None and _index is not None:
+            return _index.query(self.query)[1]
+        return _snapshot_message
+
+    def stop(self) -> None:
+        _clients.pop(self.ws, None)
+        self._sender.cancel()
+
+
+# Active browser connections
+_clients: dict[WebSocket, ClientChannel] = {}
+_latest: ResultsPayload | None = None
+_index: ResultsIndex | None = None
+_version = 0
+_snapshot_message = ""
+WS_CLIENTS.set_function(lambda: len(_clients))
+
+
+def _snapshot(payload: ResultsPayload) -> str:
+    return json.dumps({"type": "snapshot", "version": _version, **payload.model_dump()})
+
+
+def _broadcast(previous: ResultsIndex | None) -> None:
+    """Queue the new version for every client. A client that acked the previous version, which is also the last
+    one queued for it, gets a patch against it: of the snapshot, or of its view. Anyone else gets the full state.
+    """
+    snapshot_patch: str | None = None
+    for channel in list(_clients.values()):
+        if previous is None or not (channel.confirmed == channel.version == previous.version):
+            channel.offer(channel.latest(), _version)
+        elif channel.query is not None:
+            channel.offer(_index.patch(previous, channel.query), _version)
+        else:
+            snapshot_patch = snapshot_patch or _index.snapshot_patch(previous)
+            channel.offer(snapshot_patch, _version)
 
 
 @app.post("/results")
 async def post_results(payload: ResultsPayload) -> dict[str, int]:
-    global _latest
-    _latest = payload
-    await _broadcast(payload)
-    logger.info(f"Broadcast {len(payload.profits)} profit entries to {len(_clients)} client(s).")
+    global _latest, _index, _version, _snapshot_message
+    start = time.perf_counter()
+    _version += 1
+    previous = _index
+    _latest, _snapshot_message = payload, _snapshot(payload)
+    _index = ResultsIndex(_version, payload)
+    _broadcast(previous)
+    RESULTS_SECONDS.observe(time.perf_counter() - start)
+    logger.info(f"Broadcast results version {_version} ({len(payload.profits)} entries) to {len(_clients)} client(s).")
     return {"broadcast_to": len(_clients)}
 
 
+@app.get("/profits")
+async def get_profits(
+    sort: str = "Profit per Hour",
+    order: str = "desc",
+    offset: int = 0,
+    limit: int = 10,
+    max_cost: int | None = None,
+    min_volume: int = 0,
+    levels: str = "{}",
+) -> Response:
+    """Filtered, sorted page of the latest results. levels is a JSON object of requirement -> level."""
+    if _index is None:
+        raise HTTPException(status_code=503, detail="No results yet")
+    try:
+        query = ProfitsQuery(
+            levels=json.loads(levels),
+            max_cost=max_cost,
+            min_volume=min_volume,
+            sort=sort,
+            order=order,
+            offset=offset,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    with PROFITS_QUERY_SECONDS.time():
+        body = json.dumps(_index.query(query)[0])
+    return Response(body, media_type="application/json")
+
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket) -> None:
     await ws.accept()
-    _clients.add(ws)
+    channel = _clients[ws] = ClientChannel(ws)
     logger.info(f"Browser connected. Total clients: {len(_clients)}")
-    if _latest:
-        await ws.send_text(json.dumps(_latest.model_dump()))
+    # Clients connecting with ?view=1 subscribe to a filtered view first, so skip the full snapshot
+    if _latest and "view" not in ws.query_params:
+        channel.offer(_snapshot_message, _version)
     try:
         while True:
             try:
-                await asyncio.wait_for(ws.receive_text(), timeout=30)
+                message = await asyncio.wait_for(ws.receive_text(), timeout=30)
             except asyncio.TimeoutError:
-                await ws.send_text(json.dumps({"ping": True}))
+                channel.offer(json.dumps({"ping": True}))
+                continue
+            with contextlib.suppress(ValueError, TypeError, AttributeError, KeyError):
+                data = json.loads(message)
+                if data.get("type") == "ack":
+                    channel.confirmed = int(data["version"])
+                elif data.get("type") == "resync" and _latest:
+                    channel.offer(channel.latest(), _version)
+                elif data.get("type") == "subscribe":
+                    try:
+                        query = ProfitsQuery.model_validate(data.get("query", {}))
+                    except ValidationError as e:
+                        # Keep the previous view, and tell the client why this one was refused
+                        channel.offer(json.dumps({"type": "error", "message": str(e)}))
+                        continue
+                    channel.query = query
+                    if _latest:
+                        channel.offer(channel.latest(), _version)
+                elif data.get("type") == "unsubscribe":
+                    channel.query = None
+                    if _latest:
+                        channel.offer(_snapshot_message, _version)
     except (WebSocketDisconnect, asyncio.CancelledError) as exc:
-        _clients.discard(ws)
+        channel.stop()
         logger.info(f"Browser disconnected. Total clients: {len(_clients)}")
         if isinstance(exc, asyncio.CancelledError):
             raise